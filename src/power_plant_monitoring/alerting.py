@@ -0,0 +1,410 @@
+"""Debounced, grouped delivery of alerts.
+
+Alerts are handed to :meth:`AlertNotifier.notify` from the acquisition loop,
+which only puts them into a queue. Everything else happens on the notifier's own
+thread, an asyncio loop which
+
+* deduplicates alerts by key (and suppresses repeats for ``repeat_sec``),
+* debounces them: an alert is only reported if it is still active after
+  ``debounce_sec``, a flapping condition that resolves earlier is dropped,
+* groups everything that became ready within ``digest_window_sec`` into a single
+  digest message, sent at most every ``min_interval_sec``,
+* delivers digests through a pluggable :class:`AlertTransport` with retries.
+"""
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+
+from power_plant_monitoring.anomaly import Severity
+from power_plant_monitoring.metrics import REGISTRY
+from power_plant_monitoring.program_thread import ProgramThread
+
+_logger = logging.getLogger(__name__)
+
+_QUEUE_DEPTH = REGISTRY.gauge("alert_queue_depth", "Alerts waiting in the intake")
+_SUPPRESSED = REGISTRY.counter("alerts_suppressed", "Deduplicated/debounced alerts")
+_RETRIES = REGISTRY.counter("alert_delivery_retries", "Failed alert delivery attempts")
+_DROPPED = REGISTRY.counter("alert_digests_dropped", "Digests dropped after retries")
+
+
+@dataclass(frozen=True)
+class Alert:
+    """A condition that should be reported."""
+
+    #: key (str): identifies the condition, used for deduplication
+    key: str
+    #: message (str): human readable description
+    message: str
+    #: severity (Severity): ...
+    severity: Severity = Severity.WARNING
+    #: resolved (bool): True if the condition is over
+    resolved: bool = False
+    #: timestamp (float): time the condition was observed
+    timestamp: float = field(default_factory=time.time)
+
+    @classmethod
+    def from_anomaly(cls, event) -> "Alert":
+        return cls(
+            key=event.kind,
+            message=event.message,
+            severity=event.severity,
+            resolved=not event.active,
+            timestamp=event.timestamp,
+        )
+
+
+class StatusAlertSource:
+    """Turns ``StatusCode``/``FaultCode`` transitions of the samples into alerts."""
+
+    #: StatusCode of the inverter fault state
+    FAULT_STATUS = 3
+
+    def __init__(self):
+        self._status: int = None
+        self._fault: int = None
+
+    def update(self, info: dict) -> list[Alert]:
+        alerts = []
+
+        status = info.get("StatusCode")
+        if status is not None and status != self._status:
+            if status == self.FAULT_STATUS:
+                alerts.append(
+                    Alert(
+                        "inverter_status",
+                        f"Inverter status: {info.get('Status', status)}",
+                        Severity.CRITICAL,
+                    )
+                )
+            elif self._status == self.FAULT_STATUS:
+                alerts.append(
+                    Alert(
+                        "inverter_status",
+                        f"Inverter status: {info.get('Status', status)}",
+                        resolved=True,
+                    )
+                )
+            self._status = status
+
+        fault = info.get("FaultCode")
+        if fault is not None and fault != self._fault:
+            if self._fault:
+                alerts.append(
+                    Alert(
+                        f"fault_{self._fault}",
+                        f"Fault {self._fault} cleared",
+                        resolved=True,
+                    )
+                )
+            if fault:
+                alerts.append(
+                    Alert(
+                        f"fault_{fault}",
+                        f"Inverter fault: {info.get('Fault', fault)}",
+                        Severity.CRITICAL,
+                    )
+                )
+            self._fault = fault
+
+        return alerts
+
+
+class HealthAlertSource:
+    """Reports pipeline components (serial port, InfluxDB, ...) going up or down."""
+
+    def __init__(self):
+        self._failing: set = set()
+
+    def update(self, component: str, ok: bool, message: str = "") -> list[Alert]:
+        if ok == (component not in self._failing):
+            return []
+
+        key = f"{component}_unavailable"
+        if ok:
+            self._failing.discard(component)
+            return [Alert(key, f"{component} is available again", resolved=True)]
+
+        self._failing.add(component)
+        return [Alert(key, f"{component} unavailable: {message}", Severity.CRITICAL)]
+
+    def update_backlog(
+        self, component: str, subscription, max_lag: float, max_fill: float = 0.9
+    ) -> list[Alert]:
+        """Report the consumer of a sample bus subscription falling behind.
+
+        Args:
+          component (str): ...
+          subscription (Subscription): e.g. the one of the InfluxDB writer
+          max_lag (float): seconds the oldest pending sample may wait
+          max_fill (float): share of the queue that may be pending, a full
+              queue drops the oldest samples
+        """
+        pending, lag = subscription.pending, subscription.lag
+        ok = lag <= max_lag and pending <= max_fill * subscription.capacity
+        return self.update(
+            component, ok, f"{pending} samples pending, the oldest for {lag:.0f} s"
+        )
+
+
+class AlertTransport(ABC):
+    """Delivers digest messages."""
+
+    @abstractmethod
+    async def send(self, text: str):
+        pass
+
+
+class LogTransport(AlertTransport):
+    """Writes the digests to the log, used when no bot is configured."""
+
+    def __init__(self, config=None):
+        pass
+
+    async def send(self, text: str):
+        _logger.warning("Alert: %s", text)
+
+
+class HttpTransport(AlertTransport):
+    """POSTs ``{"text": ...}`` as JSON to ``url``."""
+
+    def __init__(self, config):
+        #: ...
+        self._url: str = config["url"].get(str)
+        #: ...
+        self._timeout: float = 5.0
+
+    def _payload(self, text: str) -> dict:
+        return {"text": text}
+
+    def _post(self, text: str):
+        request = urllib.request.Request(
+            self._url,
+            data=json.dumps(self._payload(text)).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self._timeout) as response:
+            response.read()
+
+    async def send(self, text: str):
+        # urllib blocks, keep the event loop responsive
+        await asyncio.get_running_loop().run_in_executor(None, self._post, text)
+
+
+class TelegramTransport(HttpTransport):
+    """Sends the digests to ``bot.developer_chat_id`` using the Telegram bot API."""
+
+    def __init__(self, config):
+        base_url = (
+            config["url"].get(str)
+            if config["url"].exists()
+            else "https://api.telegram.org"
+        )
+        #: ...
+        self._url: str = f"{base_url}/bot{config['token'].get(str)}/sendMessage"
+        #: ...
+        self._chat_id: str = config["developer_chat_id"].get(str)
+        #: ...
+        self._timeout: float = 5.0
+
+    def _payload(self, text: str) -> dict:
+        return {"chat_id": self._chat_id, "text": text}
+
+
+class AlertNotifier(ProgramThread):
+    """Background worker delivering alerts, see the module documentation.
+
+    Args:
+      transport (AlertTransport): ...
+      debounce_sec (float): time an alert must stay active before it is reported
+      repeat_sec (float): an alert reported within this time is not reported again
+      digest_window_sec (float): ready alerts are collected this long into a digest
+      min_interval_sec (float): minimum time between two messages
+      max_retries (int): delivery attempts of a digest before it is dropped
+      retry_delay_sec (float): initial retry delay, doubled on every attempt
+      clock: monotonic time source
+    """
+
+    def __init__(
+        self,
+        transport: AlertTransport,
+        debounce_sec: float = 30.0,
+        repeat_sec: float = 3600.0,
+        digest_window_sec: float = 10.0,
+        min_interval_sec: float = 60.0,
+        max_retries: int = 5,
+        retry_delay_sec: float = 2.0,
+        clock=time.monotonic,
+    ):
+        ProgramThread.__init__(self, "AlertNotifier")
+
+        self._transport: AlertTransport = transport
+        self._debounce_sec: float = debounce_sec
+        self._repeat_sec: float = repeat_sec
+        self._digest_window_sec: float = digest_window_sec
+        self._min_interval_sec: float = min_interval_sec
+        self._max_retries: int = max_retries
+        self._retry_delay_sec: float = retry_delay_sec
+        self._clock = clock
+        #: how often the worker wakes up to process the intake
+        self._tick_sec: float = 0.25
+
+        #: alerts handed over by other threads
+        self._intake: queue.SimpleQueue = queue.SimpleQueue()
+        _QUEUE_DEPTH.set_function(self._intake.qsize)
+        #: key -> (first seen, alert) of alerts waiting for the debounce time
+        self._pending: dict = {}
+        #: keys of reported alerts which did not resolve yet
+        self._firing: set = set()
+        #: key -> time the alert was last reported
+        self._last_reported: dict = {}
+        #: alerts to put into the next digest
+        self._ready: list = []
+        self._digest_started: float = None
+        self._last_message: float = None
+
+        #: number of digests delivered
+        self.sent: int = 0
+        #: number of alerts suppressed by deduplication or debouncing
+        self.suppressed: int = 0
+        #: number of digests dropped after ``max_retries``
+        self.failed: int = 0
+
+    @property
+    def transport(self) -> AlertTransport:
+        return self._transport
+
+    @transport.setter
+    def transport(self, transport: AlertTransport):
+        """Deliver the next digests with ``transport`` (a configuration
+        reload), the queued alerts are kept"""
+        self._transport = transport
+
+    def notify(self, alert: Alert):
+        """Queue ``alert``, never blocks (safe to call from any thread)."""
+        self._intake.put(alert)
+
+    def notify_all(self, alerts):
+        for alert in alerts:
+            self._intake.put(alert)
+
+    def _accept(self, alert: Alert, now: float):
+        key = alert.key
+
+        if alert.resolved:
+            if key in self._pending:
+                # resolved within the debounce time
+                del self._pending[key]
+                self.suppressed += 1
+                _SUPPRESSED.inc()
+            elif key in self._firing:
+                self._firing.discard(key)
+                self._add_ready(alert, now)
+            return
+
+        if key in self._pending or key in self._firing:
+            self.suppressed += 1
+            _SUPPRESSED.inc()
+            return
+
+        last = self._last_reported.get(key)
+        if last is not None and now - last < self._repeat_sec:
+            self.suppressed += 1
+            _SUPPRESSED.inc()
+            return
+
+        self._pending[key] = (now, alert)
+
+    def _add_ready(self, alert: Alert, now: float):
+        if not self._ready:
+            self._digest_started = now
+        self._ready.append(alert)
+
+    def _process(self, now: float) -> list[str]:
+        """Advance the state machine to ``now`` and return the digests to send."""
+        while True:
+            try:
+                alert = self._intake.get_nowait()
+            except queue.Empty:
+                break
+            self._accept(alert, now)
+
+        for key, (first_seen, alert) in list(self._pending.items()):
+            if now - first_seen >= self._debounce_sec:
+                del self._pending[key]
+                self._firing.add(key)
+                self._last_reported[key] = now
+                self._add_ready(alert, now)
+
+        if not self._ready or now - self._digest_started < self._digest_window_sec:
+            return []
+        if (
+            self._last_message is not None
+            and now - self._last_message < self._min_interval_sec
+        ):
+            return []
+
+        digest = self._format(self._ready)
+        self._ready = []
+        self._last_message = now
+        return [digest]
+
+    @staticmethod
+    def _format(alerts: list) -> str:
+        def line(alert):
+            state = "RESOLVED" if alert.resolved else alert.severity.name
+            return f"[{state}] {alert.message}"
+
+        if len(alerts) == 1:
+            return line(alerts[0])
+
+        return f"{len(alerts)} alerts:\n" + "\n".join(f"- {line(a)}" for a in alerts)
+
+    async def _deliver(self, text: str):
+        delay = self._retry_delay_sec
+        for attempt in range(1, self._max_retries + 1):
+            try:
+                await self._transport.send(text)
+                self.sent += 1
+                return
+            except Exception as ex:
+                _RETRIES.inc()
+                _logger.warning(
+                    "(%s) Delivery failed (%d/%d): %s",
+                    self.name,
+                    attempt,
+                    self._max_retries,
+                    ex,
+                )
+                if attempt < self._max_retries:
+                    await asyncio.sleep(delay)
+                    delay *= 2
+
+        self.failed += 1
+        _DROPPED.inc()
+        _logger.error("(%s) Alert dropped: %s", self.name, text)
+
+    async def _sender(self, outbox: asyncio.Queue):
+        while True:
+            text = await outbox.get()
+            await self._deliver(text)
+
+    async def _worker(self, ct: threading.Event):
+        outbox = asyncio.Queue()
+        sender = asyncio.create_task(self._sender(outbox))
+        try:
+            while not ct.is_set():
+                for digest in self._process(self._clock()):
+                    outbox.put_nowait(digest)
+                await asyncio.sleep(self._tick_sec)
+        finally:
+            sender.cancel()
+
+    def _run_internal(self, ct: threading.Event):
+        asyncio.run(self._worker(ct))
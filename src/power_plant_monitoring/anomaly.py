@@ -0,0 +1,329 @@
+"""Online anomaly detection on the acquisition stream.
+
+All statistics are updated incrementally: :class:`RollingStats` keeps a fixed
+window in a ring buffer and updates mean/variance when a value enters and leaves
+the window, :class:`Ewma` keeps exponentially weighted mean/variance. Nothing
+scans the sample history, so a detection costs a handful of float operations per
+rule and sample.
+"""
+import logging
+import math
+from dataclasses import dataclass
+from enum import Enum
+
+_logger = logging.getLogger(__name__)
+
+
+class Severity(Enum):
+    INFO = 1
+    WARNING = 2
+    CRITICAL = 3
+
+
+@dataclass(frozen=True)
+class AnomalyEvent:
+    """A detected (or cleared) anomaly."""
+
+    #: timestamp (float): sample time in seconds
+    timestamp: float
+    #: kind (str): the rule which fired, e.g. ``string_imbalance``
+    kind: str
+    #: severity (Severity): ...
+    severity: Severity
+    #: active (bool): True when the anomaly starts, False when it cleared
+    active: bool
+    #: value (float): the value which triggered the rule
+    value: float
+    #: message (str): human readable description
+    message: str
+
+
+class RollingStats:
+    """Mean and variance over the last ``window`` values in O(1) per value."""
+
+    __slots__ = ("_values", "_window", "_index", "count", "mean", "_m2")
+
+    def __init__(self, window: int):
+        self._values: list = [0.0] * window
+        self._window: int = window
+        self._index: int = 0
+        self.count: int = 0
+        self.mean: float = 0.0
+        self._m2: float = 0.0
+
+    def add(self, value: float):
+        if self.count < self._window:
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self._m2 += delta * (value - self.mean)
+        else:
+            # sliding window Welford update: replace the oldest value
+            oldest = self._values[self._index]
+            old_mean = self.mean
+            self.mean += (value - oldest) / self._window
+            self._m2 += (value - oldest) * (value - self.mean + oldest - old_mean)
+
+        self._values[self._index] = value
+        self._index = (self._index + 1) % self._window
+
+    @property
+    def variance(self) -> float:
+        return max(self._m2, 0.0) / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class Ewma:
+    """Exponentially weighted moving mean and variance."""
+
+    __slots__ = ("_alpha", "count", "mean", "variance")
+
+    def __init__(self, alpha: float):
+        self._alpha: float = alpha
+        self.count: int = 0
+        self.mean: float = 0.0
+        self.variance: float = 0.0
+
+    def add(self, value: float):
+        if self.count == 0:
+            self.mean = value
+        else:
+            delta = value - self.mean
+            increment = self._alpha * delta
+            self.mean += increment
+            self.variance = (1 - self._alpha) * (self.variance + delta * increment)
+        self.count += 1
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class AnomalyDetector:
+    """Detects string imbalance, fast temperature rise, grid drift and faults.
+
+    Listeners registered with :meth:`subscribe` are called with every
+    :class:`AnomalyEvent`. An event is published once when a condition becomes
+    active and once (with :attr:`Severity.INFO`) when it clears.
+
+    Args:
+      window (int): number of samples of the rolling baselines
+      z_threshold (float): deviation from the baseline, in standard deviations,
+          which is considered abnormal
+      min_string_power (float): strings are only compared above this input power (W)
+      min_imbalance (float): minimum relative difference between the strings
+      min_temp_rate (float): minimum temperature rise (°C/min) to report
+      grid_limits (dict): trip limits per field as ``(low, high)`` tuples
+      grid_margin (float): fraction of the allowed band treated as "near the limit"
+    """
+
+    def __init__(
+        self,
+        window: int = 300,
+        z_threshold: float = 4.0,
+        min_string_power: float = 200.0,
+        min_imbalance: float = 0.15,
+        min_temp_rate: float = 1.0,
+        grid_limits: dict = None,
+        grid_margin: float = 0.1,
+    ):
+        self._z_threshold: float = z_threshold
+        self._min_string_power: float = min_string_power
+        self._min_imbalance: float = min_imbalance
+        self._min_temp_rate: float = min_temp_rate
+        self._grid_limits: dict = (
+            grid_limits
+            if grid_limits is not None
+            else {
+                "Fac": (47.5, 51.5),
+                "Vac1": (184.0, 264.0),
+                "Vac2": (184.0, 264.0),
+                "Vac3": (184.0, 264.0),
+            }
+        )
+        self._grid_margin: float = grid_margin
+        #: samples a baseline needs before it is used for detection
+        self._warmup: int = min(window, 30)
+
+        self._power_imbalance: RollingStats = RollingStats(window)
+        self._voltage_imbalance: RollingStats = RollingStats(window)
+        self._temp_rate: Ewma = Ewma(2.0 / (window + 1))
+        self._grid: dict = {field: Ewma(0.2) for field in self._grid_limits}
+
+        self._last_temp: float = None
+        self._last_temp_timestamp: float = None
+        self._fault_code: int = None
+
+        #: kind -> severity of the currently active anomalies
+        self._active: dict = {}
+        self._listeners: list = []
+
+    @property
+    def active(self) -> dict:
+        return dict(self._active)
+
+    def subscribe(self, listener):
+        """Register ``listener(event: AnomalyEvent)``"""
+        self._listeners.append(listener)
+
+    def update(self, timestamp: float, info: dict) -> list[AnomalyEvent]:
+        """Feed one sample and return the events it caused (usually none)."""
+        events = []
+
+        self._check_strings(timestamp, info, events)
+        self._check_temperature(timestamp, info, events)
+        self._check_grid(timestamp, info, events)
+        self._check_fault(timestamp, info, events)
+
+        for event in events:
+            for listener in self._listeners:
+                listener(event)
+
+        return events
+
+    def _set(self, events, timestamp, kind, severity, value, message):
+        """Publish ``kind`` as active with ``severity`` or, if None, as cleared."""
+        current = self._active.get(kind)
+        if current == severity:
+            return
+
+        if severity is None:
+            del self._active[kind]
+            events.append(
+                AnomalyEvent(timestamp, kind, Severity.INFO, False, value, message)
+            )
+        else:
+            self._active[kind] = severity
+            events.append(AnomalyEvent(timestamp, kind, severity, True, value, message))
+
+    def _check_imbalance(self, events, timestamp, kind, stats, a, b):
+        imbalance = (a - b) / (a + b)
+        deviation = abs(imbalance - stats.mean)
+        std = stats.std
+
+        abnormal = (
+            stats.count >= self._warmup
+            and deviation > self._min_imbalance
+            and deviation > self._z_threshold * std
+        )
+        if not abnormal:
+            # only normal values feed the baseline, a failing string must not
+            # become the new normal
+            stats.add(imbalance)
+
+        if abnormal or kind in self._active:
+            self._set(
+                events,
+                timestamp,
+                kind,
+                Severity.WARNING if abnormal else None,
+                imbalance,
+                f"{kind}: {imbalance:+.1%} (baseline {stats.mean:+.1%})",
+            )
+
+    def _check_strings(self, timestamp, info, events):
+        pv1 = info.get("PV1Watt")
+        pv2 = info.get("PV2Watt")
+        if pv1 is None or pv2 is None or pv1 + pv2 < self._min_string_power:
+            return
+
+        self._check_imbalance(
+            events, timestamp, "string_imbalance", self._power_imbalance, pv1, pv2
+        )
+
+        vpv1 = info.get("Vpv1")
+        vpv2 = info.get("Vpv2")
+        if vpv1 is not None and vpv2 is not None and vpv1 + vpv2 > 0:
+            self._check_imbalance(
+                events,
+                timestamp,
+                "string_voltage_imbalance",
+                self._voltage_imbalance,
+                vpv1,
+                vpv2,
+            )
+
+    def _check_temperature(self, timestamp, info, events):
+        temp = info.get("Temp")
+        if temp is None:
+            return
+
+        last_temp = self._last_temp
+        last_timestamp = self._last_temp_timestamp
+        self._last_temp = temp
+        self._last_temp_timestamp = timestamp
+
+        if last_temp is None or timestamp <= last_timestamp:
+            return
+
+        rate = (temp - last_temp) * 60.0 / (timestamp - last_timestamp)
+        stats = self._temp_rate
+        abnormal = (
+            stats.count >= self._warmup
+            and rate > self._min_temp_rate
+            and rate - stats.mean > self._z_threshold * stats.std
+        )
+        stats.add(rate)
+
+        if abnormal or "temperature_rise" in self._active:
+            self._set(
+                events,
+                timestamp,
+                "temperature_rise",
+                Severity.WARNING if abnormal else None,
+                rate,
+                f"temperature_rise: {rate:.2f} °C/min at {temp:.1f} °C",
+            )
+
+    def _check_grid(self, timestamp, info, events):
+        for field, (low, high) in self._grid_limits.items():
+            value = info.get(field)
+            if not value:
+                # missing or 0 (phase not connected / inverter off)
+                continue
+
+            smoothed = self._grid[field]
+            smoothed.add(value)
+            margin = (high - low) * self._grid_margin
+
+            if value < low or value > high:
+                severity = Severity.CRITICAL
+            elif smoothed.mean < low + margin or smoothed.mean > high - margin:
+                severity = Severity.WARNING
+            else:
+                severity = None
+
+            kind = f"grid_{field}"
+            if severity is not None or kind in self._active:
+                self._set(
+                    events,
+                    timestamp,
+                    kind,
+                    severity,
+                    value,
+                    f"{kind}: {value} (limits {low} .. {high})",
+                )
+
+    def _check_fault(self, timestamp, info, events):
+        code = info.get("FaultCode")
+        if code is None:
+            return
+
+        previous = self._fault_code
+        self._fault_code = code
+        if code != 0 and previous not in (None, 0, code):
+            # a different fault replaced the active one
+            self._set(events, timestamp, "fault", None, previous, "fault: changed")
+
+        if code != 0 or "fault" in self._active:
+            self._set(
+                events,
+                timestamp,
+                "fault",
+                Severity.CRITICAL if code != 0 else None,
+                code,
+                f"fault: {info.get('Fault', code)}",
+            )
@@ -21,22 +21,18 @@ References:
 """
 
 import argparse
+import datetime
 import logging
-import sys, os, time, datetime
-from logging.handlers import RotatingFileHandler
+import sys, os, time
+from dataclasses import dataclass
 
-import confuse
+import power_plant_monitoring
+from power_plant_monitoring.metrics import REGISTRY
+from power_plant_monitoring.profiling import span
+from power_plant_monitoring.registry import drivers, sinks, transports
 
-import influxdb_client, os, time
-from influxdb_client import InfluxDBClient, Point, WritePrecision
-from influxdb_client.client.write_api import SYNCHRONOUS
-
-from pymodbus.client.sync import ModbusSerialClient as ModbusClient
-from pymodbus.exceptions import ModbusIOException
-
-from growatt import Growatt
-
-from power_plant_monitoring import __version__
+# NOTE: confuse, pymodbus and influxdb_client (via the sink registry) are
+# imported inside ``main`` so that ``--help``/``--version`` start instantly.
 
 __author__ = "dennis-off"
 __copyright__ = "dennis-off"
@@ -44,6 +40,11 @@ __license__ = "MIT"
 
 _logger = logging.getLogger(__name__)
 
+_POLL_TIME = REGISTRY.histogram("poll_cycle_seconds", "Duration of one poll cycle")
+_ACQUISITION_ERRORS = REGISTRY.counter(
+    "acquisition_errors", "Failed poll cycles", ["kind"]
+)
+
 
 # ---- Python API ----
 # The functions defined in this section can be imported by users in their
@@ -71,7 +72,7 @@ def parse_args(args):
     parser.add_argument(
         "--version",
         action="version",
-        version="harvester {ver}".format(ver=__version__),
+        version="harvester {ver}".format(ver=power_plant_monitoring.__version__),
     )
     parser.add_argument(
         "-v",
@@ -89,28 +90,575 @@ def parse_args(args):
         action="store_const",
         const=logging.DEBUG,
     )
+    parser.add_argument(
+        "--verify-influxdb",
+        action="store_true",
+        help="check the InfluxDB buckets and tasks against influxdb.tiers and exit",
+    )
+    parser.add_argument(
+        "--report",
+        choices=("daily", "monthly"),
+        help="write the yield report of the journal and exit",
+    )
+    parser.add_argument(
+        "--from",
+        dest="report_from",
+        type=datetime.date.fromisoformat,
+        metavar="YYYY-MM-DD",
+        help="first day of the report (default: the 1st of the month)",
+    )
+    parser.add_argument(
+        "--to",
+        dest="report_to",
+        type=datetime.date.fromisoformat,
+        metavar="YYYY-MM-DD",
+        help="last day of the report (default: today, UTC)",
+    )
+    parser.add_argument(
+        "--output",
+        metavar="FILE",
+        help="report file, JSON if it ends with .json, CSV otherwise (default: stdout)",
+    )
     return parser.parse_args(args)
 
 
-def setup_logging(loglevel):
-    """Setup basic logging
+def setup_logging(loglevel, settings=None):
+    """Setup asynchronous logging to stdout and ``log/power_plant_monitoring.log``
 
     Args:
       loglevel (int): minimum loglevel for emitting messages
+      settings (confuse.ConfigView): the optional ``logging`` section
+          (``json``, ``rate_limit_period_sec``, ``rate_limit_burst``)
     """
-    logformat = (
-        "%(asctime)s.%(msecs)03d %(levelname)s {%(module)s} [%(funcName)s] %(message)s"
+    from power_plant_monitoring.logs import configure_logging
+
+    json_format, period, burst = False, 60.0, 5
+    if settings is not None and settings.exists():
+        json_format = _option(settings, "json", bool, False)
+        period = _option(settings, "rate_limit_period_sec", float, 60.0)
+        burst = _option(settings, "rate_limit_burst", int, 5)
+
+    configure_logging(
+        loglevel or logging.WARNING,
+        json_format=json_format,
+        rate_limit=(period, burst) if burst > 0 else None,
     )
-    logging.basicConfig(
-        level=loglevel, stream=sys.stdout, format=logformat, datefmt="%Y-%m-%d %H:%M:%S"
+
+
+def log_anomaly(event):
+    """Log an :class:`~power_plant_monitoring.anomaly.AnomalyEvent`"""
+    if event.active:
+        _logger.warning("Anomaly (%s): %s", event.severity.name, event.message)
+    else:
+        _logger.info("Anomaly cleared: %s", event.message)
+
+
+def _option(view, key, template, default):
+    """``view[key].get(template)`` or ``default`` if the key is missing"""
+    return view[key].get(template) if view[key].exists() else default
+
+
+def load_config(filename: str = "config.yml"):
+    """Read the configuration file (``confuse.Configuration``)"""
+    import confuse
+
+    config = confuse.Configuration("harvester", __name__)
+    config.set_file(filename)
+    return config
+
+
+def create_transport(config):
+    """Create the alert transport of the ``bot`` section (log only without one)"""
+    bot = config["bot"]
+    if bot.exists():
+        return transports.create(_option(bot, "transport", str, "telegram"), bot)
+    return transports.create("log")
+
+
+def create_notifier(config):
+    """Create the alert notifier for the ``bot`` section (log only without one)"""
+    from power_plant_monitoring.alerting import AlertNotifier
+
+    return AlertNotifier(create_transport(config))
+
+
+def create_http_api(config):
+    """Create the HTTP server and live view buffer, (None, None) if not configured"""
+    section = config["http_api"]
+    if not section.exists():
+        return None, None
+
+    from power_plant_monitoring.http_api import HttpApiServer, add_live_routes
+    from power_plant_monitoring.ringbuffer import SampleRingBuffer
+
+    server = HttpApiServer(
+        _option(section, "host", str, "127.0.0.1"), _option(section, "port", int, 8080)
+    )
+    buffer = SampleRingBuffer(_option(section, "capacity", int, 86400))
+    add_live_routes(server, buffer)
+
+    return server, buffer
+
+
+def create_metrics_server(config):
+    """Create the Prometheus ``/metrics`` server, None if not configured"""
+    section = config["metrics"]
+    if not section.exists():
+        return None
+
+    from power_plant_monitoring.http_api import HttpApiServer
+    from power_plant_monitoring.metrics import add_metrics_route
+
+    server = HttpApiServer(
+        _option(section, "host", str, "127.0.0.1"),
+        _option(section, "port", int, 9100),
+        name="MetricsServer",
+    )
+    add_metrics_route(server)
+
+    return server
+
+
+def create_journal(config):
+    """Create the raw register journal, None if not configured"""
+    section = config["journal"]
+    if not section.exists():
+        return None
+
+    from power_plant_monitoring.journal import FrameJournal
+
+    return FrameJournal(
+        _option(section, "directory", str, "journal"),
+        _option(section, "flush_interval_sec", float, 10.0),
+        keepalive=_option(section, "keepalive_sec", float, 60.0),
     )
-    file_handler = RotatingFileHandler(
-        "log/power_plant_monitoring.log", maxBytes=10000 * 1000, backupCount=10
+
+
+def create_event_log(config):
+    """Create the local log of the state and fault events, None if not
+    configured"""
+    section = config["events"]
+    if not section.exists():
+        return None
+
+    from power_plant_monitoring.events import EventLog
+
+    return EventLog(_option(section, "database", str, "events.sqlite"))
+
+
+def create_sink(config, influxdb_breaker=None):
+    """Create the InfluxDB sink, provisioning its tiers unless
+    ``influxdb.provision`` is false"""
+    sink = sinks.create("influxdb", config["influxdb"])
+    if getattr(sink, "tiers", None) and _option(
+        config["influxdb"], "provision", bool, True
+    ):
+        try:
+            if influxdb_breaker is not None:
+                influxdb_breaker.call(sink.provision)
+            else:
+                sink.provision()
+        except Exception as err:
+            # the writes work without, the tiers are provisioned on the next start
+            _logger.error("Provisioning the InfluxDB tiers failed: %s", err)
+    return sink
+
+
+def verify_influxdb(config) -> int:
+    """Compare the deployed InfluxDB tiers with ``influxdb.tiers``, prints the
+    differences
+
+    Returns:
+      int: exit code, 0 if the deployment matches
+    """
+    sink = sinks.create("influxdb", config["influxdb"])
+    try:
+        if not getattr(sink, "tiers", None):
+            print("influxdb.tiers is not configured")
+            return 1
+        problems = sink.verify()
+    finally:
+        sink.close()
+
+    for problem in problems:
+        print(problem)
+    if problems:
+        return 1
+    print(f"{len(sink.tiers)} tiers match the configuration")
+    return 0
+
+
+def write_report(config, period: str, start=None, end=None, output=None) -> int:
+    """Write the daily or monthly report (see
+    :mod:`~power_plant_monitoring.reports`) of the journal
+
+    Args:
+      period (str): ``daily`` or ``monthly``
+      start (datetime.date): first day, the 1st of the month of ``end`` if None
+      end (datetime.date): last day, today (UTC) if None
+      output (str): file, ``.json`` for JSON, CSV otherwise, None for stdout
+
+    Returns:
+      int: exit code
+    """
+    from power_plant_monitoring.base import ConfigError
+    from power_plant_monitoring.journal import JournalReader
+    from power_plant_monitoring.reports import ReportEngine, write_csv, write_json
+
+    section = config["reports"]
+    directory = _option(config["journal"], "directory", str, "journal")
+    kwp, expected, max_gap = None, None, 300.0
+    if section.exists():
+        directory = _option(section, "journal", str, directory)
+        kwp = _option(section, "peak_power_kwp", None, None)
+        expected = _option(section, "expected_yield", list, None)
+        max_gap = _option(section, "max_gap_sec", float, 300.0)
+    if isinstance(kwp, dict):
+        kwp = {int(unit): float(value) for unit, value in kwp.items()}
+    elif kwp is not None:
+        kwp = float(kwp)
+
+    try:
+        engine = ReportEngine(JournalReader(directory), kwp, expected, max_gap)
+    except ValueError as err:
+        raise ConfigError(f"reports: {err}") from err
+
+    end = end or datetime.datetime.now(datetime.timezone.utc).date()
+    start = start or end.replace(day=1)
+    report = engine.daily(start, end)
+    if period == "monthly":
+        report = engine.monthly(report)
+
+    write = write_json if output and output.endswith(".json") else write_csv
+    if output is None:
+        write(report, sys.stdout)
+    else:
+        with open(output, "w", newline="") as f:
+            write(report, f)
+    return 0
+
+
+def breaker_settings(config):
+    """Arguments of the circuit breakers (see
+    :class:`~power_plant_monitoring.resilience.CircuitBreaker`) from the
+    optional ``circuit_breaker`` section"""
+    section = config["circuit_breaker"]
+    if not section.exists():
+        return {}
+    return {
+        "failure_threshold": _option(section, "failure_threshold", int, 3),
+        "max_reset_timeout": _option(section, "max_reset_timeout_sec", float, 600.0),
+        "retry_ratio": _option(section, "retry_ratio", float, 0.2),
+    }
+
+
+def create_devices(config, client, bus_breaker=None):
+    """Create the further Modbus devices on the inverter's bus
+    (``grid_inverter_service.devices``), None if there are none
+
+    Args:
+      bus_breaker (CircuitBreaker): the breaker of the bus, the parent of the
+          breakers of the devices (not registered, see
+          :meth:`PortAcquisition.register_breakers`)
+
+    Returns:
+      BusScheduler: polling every device at its ``interval_sec``
+    """
+    section = config["grid_inverter_service"]
+    # the section may be empty
+    if not section.exists() or section.get() is None:
+        return None
+    if not section["devices"].exists():
+        return None
+
+    from power_plant_monitoring.base import ConfigError
+    from power_plant_monitoring.devices.scheduler import BusScheduler
+    from power_plant_monitoring.resilience import CircuitBreaker
+
+    settings = breaker_settings(config)
+    offline_interval = config["growatt"]["offline_interval_sec"].get(int)
+    scheduler = BusScheduler()
+    for i, entry in enumerate(section["devices"].get(list)):
+        options = dict(entry)
+        driver = options.pop("driver", "modbus")
+        name = options.pop("name", f"device{i}")
+        unit = options.pop("unit", 1)
+        interval = options.pop("interval_sec", 5)
+        if "map" in options:
+            options["register_map"] = options.pop("map")
+
+        try:
+            device = drivers.create(driver, client, name, unit, **options)
+        except TypeError as err:
+            raise ConfigError(f"grid_inverter_service device {name}: {err}") from None
+        scheduler.add(
+            device,
+            interval,
+            CircuitBreaker(
+                f"device {name}",
+                parent=bus_breaker,
+                reset_timeout=offline_interval,
+                **settings,
+            ),
+        )
+        _logger.debug(
+            "Device %s (%s, unit %s) every %s s", name, driver, unit, interval
+        )
+
+    return scheduler
+
+
+def create_validation(config, bus):
+    """Create the data-quality stage between ``raw/*`` and ``valid/*`` of
+    ``bus``, the Growatt samples are checked unless ``validation.enabled`` is
+    false"""
+    from power_plant_monitoring.devices.register_map import load_register_map
+    from power_plant_monitoring.validation import ValidationStage
+
+    section = config["validation"]
+    enabled, overrides, persistence, share = True, {}, 3, 0.5
+    if section.exists():
+        enabled = _option(section, "enabled", bool, True)
+        overrides = _option(section, "limits", dict, {})
+        persistence = _option(section, "spike_persistence", int, 3)
+        share = _option(section, "max_rejected_share", float, 0.5)
+
+    stage = ValidationStage(bus, overrides, persistence, share)
+    if enabled:
+        stage.add("growatt", load_register_map("growatt").fields)
+    return stage
+
+
+#: settings of :class:`PollTiming`
+TIMING_SETTINGS = (
+    "growatt.interval_sec",
+    "growatt.error_interval_sec",
+    "growatt.night_interval_sec",
+    "growatt.sunrise_lead_sec",
+    "growatt.sunset_lag_sec",
+    "forecast_service.latitude",
+    "forecast_service.longitude",
+)
+
+#: settings of :class:`PortAcquisition`, ``offline_interval_sec`` is the reset
+#: timeout of its circuit breakers
+PORT_SETTINGS = (
+    "growatt.port",
+    "growatt.offline_interval_sec",
+    "growatt.timeout_sec",
+    "growatt.adaptive_timeout",
+    "growatt.hotplug",
+    "grid_inverter_service",
+)
+
+
+@dataclass(frozen=True)
+class PollTiming:
+    """The poll intervals of the single-port mode (seconds)."""
+
+    #: interval (int): ...
+    interval: int
+    #: error_interval (int): delay after a failed poll cycle
+    error_interval: int
+    #: night_interval (int): probe interval outside the acquisition window
+    night_interval: int = 600
+    #: calendar (AcquisitionCalendar): None to poll around the clock
+    calendar: object = None
+
+
+def create_timing(config) -> PollTiming:
+    """The :class:`PollTiming` of the ``growatt`` section"""
+    section = config["growatt"]
+    calendar = None
+    settings = calendar_settings(config)
+    if settings is not None:
+        from power_plant_monitoring.solar import AcquisitionCalendar
+
+        calendar = AcquisitionCalendar(**settings)
+    return PollTiming(
+        section["interval_sec"].get(int),
+        section["error_interval_sec"].get(int),
+        _option(section, "night_interval_sec", int, 600),
+        calendar,
     )
-    formatter = logging.Formatter(logformat)
-    file_handler.setFormatter(formatter)
 
-    _logger.addHandler(file_handler)
+
+class PortAcquisition:
+    """The inverter and the further devices on the port of the single-port
+    mode. Nothing is opened before :meth:`start`, so a reload can build one to
+    validate the settings. Its circuit breakers are new as well, they replace
+    the registered ones of the acquisition before in :meth:`register_breakers`.
+
+    Args:
+      config (confuse.Configuration): ...
+      journal (FrameJournal): raw register journal of the inverter
+    """
+
+    def __init__(self, config, journal=None):
+        from power_plant_monitoring.base import ExchangeNotAvailable
+        from power_plant_monitoring.growatt import Growatt
+        from power_plant_monitoring.resilience import CircuitBreaker, read_device
+        from power_plant_monitoring.sharding import create_modbus_client
+
+        section = config["growatt"]
+        #: port (str): ...
+        self.port: str = section["port"].get(str)
+        _logger.debug("Growatt (Port): %s", self.port)
+        self.client = create_modbus_client(
+            self.port,
+            timeout=_option(section, "timeout_sec", float, 1.0),
+            adaptive=_option(section, "adaptive_timeout", bool, True),
+        )
+
+        endpoint = dict(
+            breaker_settings(config),
+            reset_timeout=section["offline_interval_sec"].get(int),
+        )
+        #: serial (CircuitBreaker): breaker of the bus
+        self.serial = CircuitBreaker(
+            f"serial {self.port}", trips_on=(ExchangeNotAvailable,), **endpoint
+        )
+        #: inverter (CircuitBreaker): breaker of the inverter
+        self.inverter = CircuitBreaker(
+            f"serial {self.port} unit 1", parent=self.serial, **endpoint
+        )
+        #: read: ``read(device)`` of the inverter's samples
+        self.read = read_device
+        self._serial_port = None
+        self._hotplug: bool = False
+        if not self.port.startswith("tcp://"):
+            from power_plant_monitoring.devices.serialport import SerialPort
+
+            # re-opened when lost, following the adapter's by-id link
+            self._serial_port = SerialPort(self.client, self.port, self.serial)
+            self.read = self._serial_port.read
+            self._hotplug = _option(section, "hotplug", bool, True)
+        self._monitor = None
+
+        self.growatt = Growatt(self.client, "Growatt", 1, journal=journal)
+        #: devices (BusScheduler): None without further devices
+        self.devices = create_devices(config, self.client, self.serial)
+
+    def register_breakers(self):
+        """Register the breakers (``/breakers``, metrics) once the acquisition
+        is live, a reload rejected after building it leaves the live ones"""
+        from power_plant_monitoring.resilience import register
+
+        devices = self.devices.breakers if self.devices is not None else []
+        register(self.serial, self.inverter, *devices)
+
+    def start(self):
+        if self._hotplug:
+            from power_plant_monitoring.devices.serialport import (
+                create_hotplug_monitor,
+            )
+
+            self._monitor = create_hotplug_monitor([self._serial_port])
+            if self._monitor is not None:
+                self._monitor.start()
+        self.client.connect()
+        _logger.debug("Growatt connected.")
+
+    def close(self):
+        if self._monitor is not None:
+            self._monitor.stop()
+            self._monitor = None
+        self.client.close()
+
+
+def calendar_settings(config):
+    """Arguments of the sunrise/sunset
+    :class:`~power_plant_monitoring.solar.AcquisitionCalendar` for the
+    ``forecast_service`` location, None unless ``growatt.night_interval_sec``
+    is configured"""
+    section = config["growatt"]
+    if not section["night_interval_sec"].exists():
+        return None
+
+    location = config["forecast_service"]
+    return {
+        "latitude": location["latitude"].as_number(),
+        "longitude": location["longitude"].as_number(),
+        "lead": _option(section, "sunrise_lead_sec", float, 1800.0),
+        "lag": _option(section, "sunset_lag_sec", float, 1800.0),
+    }
+
+
+def create_sharded_acquisition(config, loglevel=None):
+    """Create the per-port acquisition processes, None unless ``growatt.mode``
+    is ``sharded``"""
+    section = config["growatt"]
+    if _option(section, "mode", str, "single") != "sharded":
+        return None
+
+    from power_plant_monitoring.sharding import ShardedAcquisition
+
+    if section["ports"].exists():
+        ports = section["ports"].get(list)
+    else:
+        ports = [{"port": section["port"].get(str)}]
+
+    journal = config["journal"]
+    shards = []
+    for entry in ports:
+        shard = {
+            "units": [1],
+            "baudrate": 9600,
+            "interval": section["interval_sec"].get(int),
+            "offline_interval": section["offline_interval_sec"].get(int),
+            "calendar": calendar_settings(config),
+            "night_interval": _option(section, "night_interval_sec", int, 600),
+            "timeout": _option(section, "timeout_sec", float, 1.0),
+            "adaptive_timeout": _option(section, "adaptive_timeout", bool, True),
+            "breaker": breaker_settings(config),
+            "loglevel": loglevel,
+        }
+        shard.update(entry)
+        if journal.exists():
+            # one journal per port, the files are not shared between processes
+            shard["journal"] = os.path.join(
+                _option(journal, "directory", str, "journal"),
+                os.path.basename(shard["port"]),
+            )
+            shard["journal_keepalive"] = _option(journal, "keepalive_sec", float, 60.0)
+        shards.append(shard)
+
+    return ShardedAcquisition(shards, _option(section, "ring_capacity", int, 4096))
+
+
+def aggregate(sharded, bus, notifier, health_alerts, error_interval):
+    """The aggregator loop of the sharded mode, publishes the samples of all
+    ports to ``bus``, runs until interrupted"""
+    #: when the processes which died are started again
+    restart_at = None
+    while True:
+        for port, timestamp, unit, info in sharded.poll():
+            component = f"serial {port} unit {unit}"
+            if info is None:
+                _ACQUISITION_ERRORS.labels("modbus").inc()
+                notifier.notify_all(
+                    health_alerts.update(component, False, "no response")
+                )
+                continue
+
+            notifier.notify_all(health_alerts.update(component, True))
+            bus.publish(
+                "raw/growatt",
+                timestamp,
+                info,
+                {"location": "home", "port": port, "unit": str(unit)},
+            )
+
+        if restart_at is None and not all(sharded.alive):
+            # the other ports are read on meanwhile
+            _logger.error(
+                "An acquisition process died, restart in %s s", error_interval
+            )
+            restart_at = time.monotonic() + error_interval
+        elif restart_at is not None and time.monotonic() >= restart_at:
+            for port in sharded.restart():
+                _logger.info("Restarted the acquisition of %s", port)
+            restart_at = None
 
 
 def main(args):
@@ -125,74 +673,407 @@ def main(args):
     """
     args = parse_args(args)
 
-    # assure log folder exists
-    os.makedirs("log", exist_ok=True)
-    setup_logging(args.loglevel)
+    import threading
+
+    from power_plant_monitoring.alerting import (
+        Alert,
+        AlertNotifier,
+        HealthAlertSource,
+        StatusAlertSource,
+    )
+    from power_plant_monitoring.anomaly import AnomalyDetector
+    from power_plant_monitoring.base import BaseError, CircuitOpen
+    from power_plant_monitoring.devices.register_map import load_register_map
+    from power_plant_monitoring.energy import EnergyIntegrator
+    from power_plant_monitoring.profiling import (
+        Profiler,
+        add_profiling_routes,
+        install_signal_handlers,
+    )
+    from power_plant_monitoring.reload import ConfigReloader, install_reload_signal
+    from power_plant_monitoring.resilience import add_breaker_route, breaker
+    from power_plant_monitoring.samplebus import (
+        Policy,
+        SampleBus,
+        SubscriberThread,
+        add_bus_route,
+    )
 
-    _logger.debug("Starting power_plant_monitoring.app {ver} ...".format(ver=__version__))
-    
     # load configuration
     filename = "config.yml"
-    config = confuse.Configuration("harvester", __name__)
-    config.set_file(filename)
+    config = load_config(filename)
+
+    # assure log folder exists
+    os.makedirs("log", exist_ok=True)
+    setup_logging(args.loglevel, config["logging"])
+
+    if args.verify_influxdb:
+        return verify_influxdb(config)
+    if args.report:
+        return write_report(
+            config, args.report, args.report_from, args.report_to, args.output
+        )
+
+    _logger.debug(
+        "Starting power_plant_monitoring.app %s ...", power_plant_monitoring.__version__
+    )
 
-    interval = config["growatt"]["interval_sec"].get(int)
-    offline_interval = config["growatt"]["offline_interval_sec"].get(int)
     error_interval = config["growatt"]["error_interval_sec"].get(int)
 
-    port = config["growatt"]["port"].get(str)
-    _logger.debug(f"Growatt (Port): {port}")
-    client = ModbusClient(method='rtu', port=port, baudrate=9600, stopbits=1, parity='N', bytesize=8, timeout=1)
-    client.connect()
+    # a failing endpoint is shed by its circuit breaker and probed again after
+    # the reset timeout, instead of holding up the loop with its timeouts
+    influxdb = breaker(
+        "influxdb", reset_timeout=error_interval, **breaker_settings(config)
+    )
 
-    growatt = Growatt(client, "Growatt", 1)
+    # the components built by ``reloader.watch`` are rebuilt when their
+    # settings change (SIGHUP, or the file if reload.watch_interval_sec is set)
+    reloader = ConfigReloader(
+        lambda: load_config(filename),
+        config,
+        filename,
+        _option(config["reload"], "watch_interval_sec", float, None),
+    )
 
-    _logger.debug(f"Growatt connected.")
+    def pause(timing, acquisition, delay):
+        """Sleep ``delay`` seconds, outside the acquisition window until the
+        next night probe (or the start of the window); the further devices on
+        the bus are polled meanwhile"""
+        if timing.calendar is not None:
+            now = time.time()
+            if not timing.calendar.is_active(now):
+                delay = timing.calendar.delay(now, delay, timing.night_interval)
+        if acquisition.devices is not None:
+            acquisition.devices.wait(delay, write_device)
+        else:
+            time.sleep(delay)
 
-    url = config["influxdb"]["url"].get(str)
-    org = config["influxdb"]["org"].get(str)
-    token = config["influxdb"]["token"].get(str)
+    def replace_acquisition(old, new):
+        # the old port is closed by the acquisition loop, between two reads
+        new.register_breakers()
+        if http_api is not None and hasattr(new.client, "timing"):
+            from power_plant_monitoring.devices.rtu import add_timing_route
 
-    _logger.debug(f"InfluxDB: {url}, Organization: {org}")
-    influx = influxdb_client.InfluxDBClient(url=url, token=token, org=org)
-    _logger.debug(f"InfluxDB client created.")
+            add_timing_route(http_api, new.client.timing)
 
-    bucket="monitoring"
+    sharded = create_sharded_acquisition(config, args.loglevel)
+    journal = None
+    if sharded is None:
+        journal = create_journal(config)
+        reloader.watch("timing", TIMING_SETTINGS, lambda c, _: create_timing(c))
+        reloader.watch(
+            "acquisition",
+            PORT_SETTINGS,
+            lambda c, _: PortAcquisition(c, journal),
+            replace_acquisition,
+        )
+        reloader.components["acquisition"].register_breakers()
 
-    while True:
-        now = time.time()
+    #: held while writing, a sink replaced by a reload is closed in between
+    sink_lock = threading.Lock()
 
-        try:
-            info = growatt.read()
+    def replace_sink(old, new):
+        with sink_lock:
+            old.close()
+        # the back-off applied to the old target
+        influxdb.reset()
 
-            if info is not None:
-                _logger.debug(f"Data received from inverter")
-            else:
-                _logger.error(f"An error occured receiving data from inverter")
-                time.sleep(interval)
+    reloader.watch(
+        "sink", ("influxdb",), lambda c, _: create_sink(c, influxdb), replace_sink
+    )
+
+    def replace_transport(old, new):
+        # the queued and pending alerts are delivered with the new transport
+        notifier.transport = new
+
+    notifier = AlertNotifier(
+        reloader.watch(
+            "transport", ("bot",), lambda c, _: create_transport(c), replace_transport
+        )
+    )
+    health_alerts = HealthAlertSource()
+    energy_max_gap = _option(config["growatt"], "energy_max_gap_sec", int, 120)
+
+    # status and fault changes are written as events, not with every sample
+    event_log = create_event_log(config)
+
+    #: (port, unit) -> energy integrator, anomaly detector, status alerts and
+    #: transition tracker
+    pipelines = {}
+
+    def pipeline(key):
+        if key not in pipelines:
+            anomalies = AnomalyDetector()
+            anomalies.subscribe(log_anomaly)
+            anomalies.subscribe(
+                lambda event: notifier.notify(Alert.from_anomaly(event))
+            )
+            transitions = None
+            if event_log is not None:
+                from power_plant_monitoring.events import TransitionTracker
+
+                port, unit = key[0], int(key[1]) if key[1] is not None else None
+                transitions = TransitionTracker(
+                    port, unit, event_log.last_states(port, unit)
+                )
+            pipelines[key] = (
+                EnergyIntegrator(max_gap_sec=energy_max_gap),
+                anomalies,
+                StatusAlertSource(),
+                transitions,
+            )
+        return pipelines[key]
+
+    http_api, live_buffer = create_http_api(config)
+
+    # every sample is published once, the consumers subscribe to the topics:
+    # raw/growatt (acquisition) -> validation -> valid/growatt -> derive
+    #     -> growatt -> live view, InfluxDB
+    # raw/device/<name> (further devices) -> validation -> valid/device/<name>
+    #     -> InfluxDB
+    # rejected values -> quarantine/<topic> -> InfluxDB (measurement quarantine)
+    bus = SampleBus()
+
+    def build_validation(config, components):
+        validation = create_validation(config, bus)
+        acquisition = components.get("acquisition")
+        if acquisition is not None and acquisition.devices is not None:
+            for device in acquisition.devices.devices:
+                register_map = getattr(device, "register_map", None)
+                if register_map is None:
+                    register_map = load_register_map("growatt")
+                validation.add(f"device/{device.name}", register_map.fields)
+        return validation
+
+    reloader.watch(
+        "validation", ("validation", "grid_inverter_service"), build_validation
+    )
+    bus.subscribe(
+        "validation",
+        "raw/*",
+        policy=Policy.INLINE,
+        callback=lambda sample: reloader.components["validation"](sample),
+    )
+
+    def derive(sample):
+        """Add the derived fields and check for anomalies and alerts"""
+        key = (sample.tags.get("port"), sample.tags.get("unit"))
+        energy, anomalies, status_alerts, transitions = pipeline(key)
+        info = dict(sample.fields)
+
+        with span("derive"):
+            info.update(energy.update(sample.timestamp, info))
+            anomalies.update(sample.timestamp, info)
+            notifier.notify_all(status_alerts.update(info))
+        bus.publish("growatt", sample.timestamp, info, sample.tags)
+
+        if transitions is not None:
+            for event in transitions.update(sample.timestamp, info):
+                bus.publish(
+                    "events",
+                    event.timestamp,
+                    event.fields(),
+                    dict(sample.tags, kind=event.kind),
+                )
+
+    bus.subscribe("derive", "valid/growatt", policy=Policy.INLINE, callback=derive)
+
+    if live_buffer is not None:
+
+        def show(sample):
+            # the live view shows the first unit
+            key = (sample.tags.get("port"), sample.tags.get("unit"))
+            if key == next(iter(pipelines)):
+                live_buffer.append(sample.timestamp, sample.fields)
+
+        bus.subscribe("live_view", "growatt", policy=Policy.INLINE, callback=show)
+
+    #: topic -> InfluxDB measurement
+    measurements = {"growatt": "growattd", "events": "events"}
+    #: fields of the growatt samples not written to InfluxDB
+    omitted = frozenset()
+    if event_log is not None:
+        from power_plant_monitoring.events import TEXT_FIELDS
+
+        omitted = TEXT_FIELDS
+
+    def write(sample):
+        """Write a sample to InfluxDB, on the writer thread"""
+        measurement, tags = measurements.get(sample.topic, "growattd"), sample.tags
+        fields = sample.fields
+        if sample.topic.startswith("quarantine/"):
+            measurement = "quarantine"
+            tags = dict(tags, source=sample.topic[len("quarantine/") :])
+        elif sample.topic == "growatt" and omitted:
+            fields = {k: v for k, v in fields.items() if k not in omitted}
+
+        with span("write"), sink_lock:
+            try:
+                influxdb.call(
+                    reloader.components["sink"].write,
+                    fields,
+                    measurement=measurement,
+                    tags=tags,
+                    timestamp=datetime.datetime.fromtimestamp(sample.timestamp),
+                )
+            except CircuitOpen:
+                # dropped without waiting for the timeout of the database
+                return
+            except Exception as err:
+                notifier.notify_all(health_alerts.update("influxdb", False, err))
+                raise
+        notifier.notify_all(health_alerts.update("influxdb", True))
+
+    # a slow or unreachable database only delays (or drops) the writes, never
+    # the acquisition
+    pending_writes = bus.subscribe(
+        "influxdb",
+        ("growatt", "events", "valid/device/*", "quarantine/*"),
+        maxlen=3600,
+    )
+    writer = SubscriberThread(pending_writes, write)
+    subscribers = [writer]
+
+    reloader.watch(
+        "influxdb_max_lag",
+        ("influxdb.max_lag_sec",),
+        lambda c, _: _option(c["influxdb"], "max_lag_sec", float, 300.0),
+    )
+
+    def check_backlog(sample):
+        """Alert before the writer falls so far behind that samples are dropped"""
+        max_lag = reloader.components["influxdb_max_lag"]
+        notifier.notify_all(
+            health_alerts.update_backlog("influxdb_backlog", pending_writes, max_lag)
+        )
+
+    bus.subscribe(
+        "influxdb_backlog", "growatt", policy=Policy.INLINE, callback=check_backlog
+    )
+    if event_log is not None:
+        from power_plant_monitoring.events import StateEvent
+
+        subscribers.append(
+            SubscriberThread(
+                bus.subscribe("event_log", "events", maxlen=3600),
+                lambda sample: event_log.append(StateEvent.from_sample(sample)),
+            )
+        )
+
+    def write_device(device, timestamp, info):
+        """Publish a sample of a further device on the bus"""
+        component = f"device {device.name}"
+        if info is None:
+            _ACQUISITION_ERRORS.labels("modbus").inc()
+            notifier.notify_all(health_alerts.update(component, False, "no response"))
+            return
+
+        notifier.notify_all(health_alerts.update(component, True))
+        topic = f"device/{device.name}"
+        measurements[f"valid/{topic}"] = getattr(device, "measurement", "growattd")
+        bus.publish(
+            f"raw/{topic}", timestamp, info, {"location": "home", "device": device.name}
+        )
+
+    profiler = Profiler("log")
+    install_signal_handlers(profiler)
+    install_reload_signal(reloader)
+    if http_api is not None:
+        add_profiling_routes(http_api, profiler)
+        add_bus_route(http_api, bus)
+        add_breaker_route(http_api)
+        if event_log is not None:
+            from power_plant_monitoring.events import add_event_routes
+
+            add_event_routes(http_api, event_log)
+        if "acquisition" in reloader.components:
+            replace_acquisition(None, reloader.components["acquisition"])
+
+    servers = [
+        server
+        for server in (http_api, create_metrics_server(config), reloader)
+        if server
+    ]
+
+    acquisition = None
+    notifier.start()
+    for subscriber in subscribers:
+        subscriber.start()
+    for server in servers:
+        server.start()
+    try:
+        if sharded is not None:
+            sharded.start()
+            aggregate(sharded, bus, notifier, health_alerts, error_interval)
+
+        while sharded is None:
+            live = reloader.components
+            if live["acquisition"] is not acquisition:
+                # a reload changed the port
+                if acquisition is not None:
+                    acquisition.close()
+                acquisition = live["acquisition"]
+                acquisition.start()
+            timing = live["timing"]
+            now = time.time()
+
+            try:
+                with span("read"):
+                    info = acquisition.inverter.call(
+                        acquisition.read, acquisition.growatt
+                    )
+
+            except CircuitOpen:
+                # shed until the next probe, the devices keep their rate
+                pause(timing, acquisition, timing.interval)
                 continue
 
-            point = influxdb_client.Point.from_dict(
-                {
-                    'measurement': 'growattd',
-                    'tags': {'location': 'home'},
-                    'fields': info,
-                    'time': datetime.datetime.now(),
-                },
-                influxdb_client.WritePrecision.MS)
+            except BaseError as err:
+                if timing.calendar is not None and not timing.calendar.is_active(now):
+                    # the inverter is off at night, the probe is expected to fail
+                    _logger.debug("Inverter not reachable at night: %s", err)
+                else:
+                    _ACQUISITION_ERRORS.labels("modbus").inc()
+                    _logger.error("Inverter not reachable: %s", err)
+                    notifier.notify_all(health_alerts.update("serial", False, err))
+                pause(timing, acquisition, timing.interval)
+                continue
 
-            write_api = influx.write_api(write_options=SYNCHRONOUS)
-            write_api.write(bucket=bucket, org="home", record=point)
+            except Exception as err:
+                _ACQUISITION_ERRORS.labels(type(err).__name__).inc()
+                _logger.error("Poll cycle failed: %s", err)
+                # the further devices on the bus keep their rate meanwhile
+                pause(timing, acquisition, timing.error_interval)
+                continue
 
-            time.sleep(interval)
+            _logger.debug("Data received from inverter")
+            notifier.notify_all(health_alerts.update("serial", True))
 
-        except ModbusIOException as err:
-            _logger.error(err)
-            time.sleep(offline_interval)
+            bus.publish("raw/growatt", now, info, {"location": "home"})
 
-        except Exception as err:
-            _logger.error(err)
-            time.sleep(error_interval)
+            _POLL_TIME.observe(time.time() - now)
+            pause(timing, acquisition, timing.interval)
+    finally:
+        if sharded is not None:
+            sharded.stop()
+        for subscriber in subscribers:
+            subscriber.stop()
+        notifier.stop()
+        for server in servers:
+            server.stop()
+        # no reload replaces the sink while the InfluxDB writer drains into it
+        reloader.join()
+        # the subscribers drain what was published before the stop, the event
+        # log and the sink are closed once they are done
+        for subscriber in subscribers:
+            subscriber.join()
+        if acquisition is not None:
+            acquisition.close()
+        if journal is not None:
+            journal.close()
+        if event_log is not None:
+            event_log.close()
+        reloader.components["sink"].close()
 
     _logger.info("power_plant_monitoring.app has finished")
 
@@ -202,7 +1083,7 @@ def run():
 
     This function can be used as entry point to create console scripts with setuptools.
     """
-    main(sys.argv[1:])
+    sys.exit(main(sys.argv[1:]))
 
 
 if __name__ == "__main__":
@@ -41,6 +41,7 @@ error_hierarchy = {
             },
             "ExchangeNotAvailable": {
                 "OnMaintenance": {},
+                "CircuitOpen": {},
             },
             "InvalidNonce": {},
             "RequestTimeout": {},
@@ -181,6 +182,10 @@ class OnMaintenance(ExchangeNotAvailable):
     pass
 
 
+class CircuitOpen(ExchangeNotAvailable):
+    pass
+
+
 class InvalidNonce(NetworkError):
     pass
 
@@ -223,6 +228,7 @@ __all__ = [
     "RateLimitExceeded",
     "ExchangeNotAvailable",
     "OnMaintenance",
+    "CircuitOpen",
     "InvalidNonce",
     "RequestTimeout",
 ]
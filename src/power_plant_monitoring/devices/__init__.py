@@ -0,0 +1,13 @@
+"""Generic Modbus device drivers described by register-map files.
+
+A register map (``maps/<name>.yml`` or any YAML file) lists the fields of a
+device: address, data type, scale and optional enumeration texts. From it
+:mod:`~power_plant_monitoring.devices.register_map` plans as few read
+transactions as possible (adjacent fields are coalesced into blocks) and
+compiles one decoder function per block. :class:`~.driver.ModbusDriver` reads a
+device with them, :class:`~.scheduler.BusScheduler` polls all devices sharing a
+bus at their own intervals.
+
+Drivers are looked up by name in
+:data:`power_plant_monitoring.registry.drivers`.
+"""
@@ -0,0 +1,109 @@
+import logging
+import time
+
+from power_plant_monitoring.devices.register_map import (
+    RegisterMap,
+    compile_decoder,
+    load_register_map,
+)
+from power_plant_monitoring.metrics import REGISTRY
+
+_logger = logging.getLogger(__name__)
+
+# the same metrics as the Growatt driver, the labels tell the devices apart
+_MODBUS_RTT = REGISTRY.histogram(
+    "modbus_rtt_seconds", "Round-trip time of a Modbus transaction", ["unit", "block"]
+)
+_MODBUS_ERRORS = REGISTRY.counter(
+    "modbus_errors", "Failed Modbus transactions", ["unit", "block"]
+)
+_DECODE_TIME = REGISTRY.histogram(
+    "driver_decode_seconds", "Time spent decoding in ModbusDriver.read()", ["device"]
+)
+
+
+class ModbusDriver:
+    """Reads a device described by a register map.
+
+    The read plan and the decoders are built once, a :meth:`read` is one
+    transaction per block of the plan.
+
+    Args:
+      client: pymodbus client of the bus
+      name (str): name of the device, used as tag
+      unit (int): Modbus unit id
+      register_map (str | RegisterMap): name or path of the map file
+      journal (FrameJournal): records the raw input registers of every read
+    """
+
+    def __init__(
+        self, client, name: str, unit: int, register_map="growatt", journal=None
+    ):
+        if not isinstance(register_map, RegisterMap):
+            register_map = load_register_map(register_map)
+
+        self.client = client
+        self.name: str = name
+        self.unit: int = unit
+        self.register_map: RegisterMap = register_map
+        self.journal = journal
+
+        #: (block, decoder, function reading the block, metric label)
+        self._plan: tuple = tuple(
+            (
+                block,
+                compile_decoder(block, register_map.word_order),
+                getattr(client, f"read_{block.table}_registers"),
+                f"{block.table}_{block.address}_{block.count}",
+            )
+            for block in register_map.blocks()
+        )
+        _logger.debug(
+            "%s: %s fields in %s transactions",
+            name,
+            len(register_map.fields),
+            len(self._plan),
+        )
+
+    @property
+    def measurement(self) -> str:
+        return self.register_map.measurement
+
+    def read(self):
+        """Read and decode all fields of the map
+
+        Returns:
+          dict: field -> value, None if a transaction failed
+        """
+        start = time.perf_counter()
+        timestamp = time.time()
+        transaction_time = 0.0
+        info = {}
+
+        for block, decode, read_registers, label in self._plan:
+            sent = time.perf_counter()
+            row = read_registers(block.address, block.count, unit=self.unit)
+            elapsed = time.perf_counter() - sent
+            transaction_time += elapsed
+            _MODBUS_RTT.labels(self.unit, label).observe(elapsed)
+
+            failed = row.isError()
+            if self.journal is not None and block.table == "input":
+                self.journal.record(
+                    timestamp,
+                    self.unit,
+                    block.address,
+                    block.count,
+                    None if failed else row.registers,
+                )
+            if failed:
+                _MODBUS_ERRORS.labels(self.unit, label).inc()
+                _logger.debug("%s: reading %s failed: %s", self.name, label, row)
+                return None
+
+            info.update(decode(row.registers))
+
+        _DECODE_TIME.labels(self.name).observe(
+            time.perf_counter() - start - transaction_time
+        )
+        return info
@@ -0,0 +1,303 @@
+"""Register-map files and the read plans and decoders compiled from them.
+
+A register map is a YAML file::
+
+    name: sdm630
+    measurement: energy_meter   # InfluxDB measurement, default: the name
+    table: input                # register table of fields without "table"
+    word_order: big             # of the 32 bit types: big (high word first)
+    max_gap: 8                  # unused registers read to save a transaction
+    max_count: 100              # registers per transaction (Modbus: 125)
+    fields:
+      - {name: Voltage1, address: 0, type: f32}
+      - {name: Pac, address: 11, type: u32, scale: 10}
+      - {name: StatusCode, address: 0, text: Status, enum: {0: Waiting}}
+
+Types are ``u16`` (default), ``s16``, ``u32``, ``s32`` and ``f32``. A field
+with ``scale`` is decoded as float ``raw / scale``, without it keeps the raw
+value. ``enum`` maps raw values to texts, the text is added as field ``text``
+(unknown values as ``"Unknown (<value>)"``). ``min``, ``max``, ``max_rate``
+(per second) and ``counter`` (never decreases) are the limits checked by
+:mod:`~power_plant_monitoring.validation`.
+
+The fields of a table are coalesced into blocks (:func:`plan_blocks`): reading
+a few unused registers costs far less than another transaction with its
+request, response and inter-frame gaps. Each block gets a decoder generated as
+Python source, one dict display with the index arithmetic inlined
+(:func:`compile_decoder`), so decoding does no per-field lookups or calls.
+"""
+import logging
+import os
+import struct
+from dataclasses import dataclass
+
+from power_plant_monitoring.base import ConfigError
+
+_logger = logging.getLogger(__name__)
+
+#: the register maps shipped with the package
+MAPS_DIRECTORY = os.path.join(os.path.dirname(__file__), "maps")
+
+#: data type -> number of registers
+TYPES = {"u16": 1, "s16": 1, "u32": 2, "s32": 2, "f32": 2}
+
+TABLES = ("input", "holding")
+
+_WORDS = struct.Struct(">HH")
+_FLOAT = struct.Struct(">f")
+
+
+@dataclass(frozen=True)
+class MapField:
+    """A field of a register map, see the module documentation."""
+
+    name: str
+    address: int
+    type: str = "u16"
+    #: the physical value is ``raw / scale``, None keeps the raw value
+    scale: float = None
+    table: str = "input"
+    #: name of the field receiving the enumeration text
+    text: str = None
+    #: raw value -> text
+    enum: dict = None
+    #: physical range of the value, checked by the validation
+    min: float = None
+    max: float = None
+    #: largest plausible change per second, faster changes are spikes
+    max_rate: float = None
+    #: the value never decreases (energy and time totals)
+    counter: bool = False
+
+    @property
+    def words(self) -> int:
+        return TYPES[self.type]
+
+
+@dataclass(frozen=True)
+class Block:
+    """Registers read in one transaction and the fields decoded from them."""
+
+    table: str
+    address: int
+    count: int
+    fields: tuple
+
+
+@dataclass(frozen=True)
+class RegisterMap:
+    """A parsed register-map file, see the module documentation."""
+
+    name: str
+    fields: tuple
+    measurement: str
+    word_order: str = "big"
+    max_gap: int = 8
+    max_count: int = 125
+
+    def blocks(self) -> tuple:
+        """The read plan, see :func:`plan_blocks`"""
+        return plan_blocks(self.fields, self.max_gap, self.max_count)
+
+
+def plan_blocks(fields, max_gap: int = 8, max_count: int = 125) -> tuple:
+    """Coalesce the fields into as few blocks as possible.
+
+    Fields of the same table end up in one block as long as at most
+    ``max_gap`` unused registers lie between them and the block does not
+    exceed ``max_count`` registers.
+
+    Returns:
+      tuple[Block]: ordered by table and address
+    """
+    blocks = []
+    for table in TABLES:
+        current, start, end = [], 0, 0
+        for field in sorted(
+            (f for f in fields if f.table == table), key=lambda f: f.address
+        ):
+            field_end = field.address + field.words
+            if current and (
+                field.address - end > max_gap
+                or max(end, field_end) - start > max_count
+            ):
+                blocks.append(Block(table, start, end - start, tuple(current)))
+                current = []
+            if not current:
+                start, end = field.address, field_end
+            current.append(field)
+            end = max(end, field_end)
+        if current:
+            blocks.append(Block(table, start, end - start, tuple(current)))
+    return tuple(blocks)
+
+
+def _float32(high: int, low: int) -> float:
+    return _FLOAT.unpack(_WORDS.pack(high, low))[0]
+
+
+def _text(texts: dict, value) -> str:
+    text = texts.get(value)
+    return text if text is not None else f"Unknown ({value})"
+
+
+def compile_decoder(block: Block, word_order: str = "big"):
+    """Generate the decoder of a block.
+
+    Returns:
+      callable: ``decode(registers) -> dict`` for the registers of the block,
+      the generated code is in its ``source`` attribute
+    """
+    namespace = {"_float32": _float32, "_text": _text}
+    items = []
+    for i, field in enumerate(block.fields):
+        offset = field.address - block.address
+        high, low = offset, offset + 1
+        if word_order == "little":
+            high, low = low, high
+
+        raw = {
+            "u16": f"r[{offset}]",
+            "s16": f"((r[{offset}] ^ 0x8000) - 0x8000)",
+            "u32": f"(r[{high}] << 16 | r[{low}])",
+            "s32": f"(((r[{high}] << 16 | r[{low}]) ^ 0x80000000) - 0x80000000)",
+            "f32": f"_float32(r[{high}], r[{low}])",
+        }[field.type]
+        value = raw if field.scale is None else f"{raw} / {float(field.scale)!r}"
+        items.append(f"        {field.name!r}: {value},")
+        if field.enum is not None:
+            namespace[f"_enum{i}"] = dict(field.enum)
+            items.append(f"        {field.text!r}: _text(_enum{i}, {raw}),")
+
+    source = "def decode(r):\n    return {\n" + "\n".join(items) + "\n    }\n"
+    exec(compile(source, f"<decoder {block.table} {block.address}>", "exec"), namespace)
+    decode = namespace["decode"]
+    decode.source = source
+    return decode
+
+
+_FIELD_KEYS = {
+    "name",
+    "address",
+    "type",
+    "scale",
+    "table",
+    "text",
+    "enum",
+    "min",
+    "max",
+    "max_rate",
+    "counter",
+}
+
+
+def _parse_field(data, defaults: dict, source: str) -> MapField:
+    if not isinstance(data, dict) or "name" not in data or "address" not in data:
+        raise ConfigError(f"{source}: a field needs a name and an address: {data}")
+
+    values = dict(defaults)
+    values.update(data)
+    unknown = set(values) - _FIELD_KEYS
+    if unknown:
+        raise ConfigError(f"{source}: unknown keys {sorted(unknown)} in {data}")
+
+    field = MapField(
+        name=str(values["name"]),
+        address=int(values["address"]),
+        type=values.get("type", "u16"),
+        scale=values.get("scale"),
+        table=values.get("table", "input"),
+        text=values.get("text"),
+        enum=values.get("enum"),
+        min=values.get("min"),
+        max=values.get("max"),
+        max_rate=values.get("max_rate"),
+        counter=bool(values.get("counter", False)),
+    )
+    if field.type not in TYPES:
+        raise ConfigError(f"{source}: {field.name}: unknown type {field.type}")
+    if field.table not in TABLES:
+        raise ConfigError(f"{source}: {field.name}: unknown table {field.table}")
+    if not 0 <= field.address <= 0xFFFF - field.words + 1:
+        raise ConfigError(f"{source}: {field.name}: invalid address")
+    if field.scale is not None and not field.scale:
+        raise ConfigError(f"{source}: {field.name}: scale must not be 0")
+    if (field.enum is None) != (field.text is None):
+        raise ConfigError(f"{source}: {field.name}: enum and text go together")
+    return field
+
+
+def parse_register_map(data: dict, source: str = "register map") -> RegisterMap:
+    """Build a :class:`RegisterMap` from the content of a map file
+
+    Raises:
+      ConfigError: if the map is invalid
+    """
+    if not isinstance(data, dict) or not data.get("fields"):
+        raise ConfigError(f"{source}: a register map needs fields")
+
+    defaults = {"table": data["table"]} if "table" in data else {}
+    fields = tuple(_parse_field(field, defaults, source) for field in data["fields"])
+
+    names = [field.name for field in fields]
+    names += [field.text for field in fields if field.text is not None]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ConfigError(f"{source}: duplicate fields {duplicates}")
+
+    word_order = data.get("word_order", "big")
+    if word_order not in ("big", "little"):
+        raise ConfigError(f"{source}: word_order must be big or little")
+    max_count = int(data.get("max_count", 125))
+    if not 1 <= max_count <= 125 or max_count < max(f.words for f in fields):
+        raise ConfigError(
+            f"{source}: max_count must be between 1 and 125 and at least the "
+            "widest field"
+        )
+
+    name = str(data.get("name", os.path.splitext(os.path.basename(source))[0]))
+    return RegisterMap(
+        name=name,
+        fields=fields,
+        measurement=str(data.get("measurement", name)),
+        word_order=word_order,
+        max_gap=int(data.get("max_gap", 8)),
+        max_count=max_count,
+    )
+
+
+#: name or path -> loaded register map
+_maps: dict = {}
+
+
+def load_register_map(name: str) -> RegisterMap:
+    """Load a register map by name (``maps/<name>.yml`` of this package) or
+    from a path to a YAML file, maps are only parsed once
+
+    Raises:
+      ConfigError: if the map does not exist or is invalid
+    """
+    if name in _maps:
+        return _maps[name]
+
+    import yaml
+
+    if name.endswith((".yml", ".yaml")) or os.sep in name:
+        path = name
+    else:
+        path = os.path.join(MAPS_DIRECTORY, f"{name}.yml")
+
+    try:
+        with open(path) as f:
+            data = yaml.safe_load(f)
+    except FileNotFoundError:
+        available = sorted(
+            os.path.splitext(entry)[0] for entry in os.listdir(MAPS_DIRECTORY)
+        )
+        raise ConfigError(
+            f"Unknown register map '{name}', available: {', '.join(available)}"
+        ) from None
+
+    _logger.debug("Loaded register map %s", path)
+    _maps[name] = parse_register_map(data, path)
+    return _maps[name]
@@ -0,0 +1,290 @@
+"""Modbus RTU client with timing adapted to the measured link.
+
+A fixed timeout has to cover the slowest device on the worst day, so a lost
+frame costs the full second while a healthy unit answers in tens of
+milliseconds. :class:`LinkTiming` learns the round-trip times per unit and
+register block (a rolling window) and sets the timeout of a transaction to
+``multiplier`` times their p99, within ``[min_timeout, max_timeout]``. A
+transaction that is not answered doubles the timeout of its block until the
+next answer, so a device getting slower is not locked out by its own
+calibration. Until a block has ``warmup`` round trips the configured
+(maximum) timeout applies.
+
+The character time of the link is measured while a response streams in
+(pymodbus reads the first bytes of an RTU response and then the rest), it is
+never shorter than the nominal one of the baud rate: an adapter buffering the
+response delivers it faster than the line. The inter-frame gap of 3.5
+characters (at least 1.75 ms, as the Modbus specification demands above
+19200 baud) follows the measured character time.
+
+:class:`AdaptiveRtuClient` applies the timing to a pymodbus serial client.
+A response that arrives truncated or corrupted (the unit is alive, the frame
+was damaged) is retried at once, a unit that does not answer at all is left
+to the circuit breakers of :mod:`~power_plant_monitoring.resilience`.
+"""
+import collections
+import logging
+import time
+
+from pymodbus.client.sync import ModbusSerialClient
+from pymodbus.exceptions import ModbusIOException
+
+from power_plant_monitoring.metrics import REGISTRY
+
+_logger = logging.getLogger(__name__)
+
+_TIMEOUT = REGISTRY.gauge(
+    "modbus_timeout_seconds", "Adaptive timeout of a Modbus block", ["unit", "block"]
+)
+_FAST_RETRIES = REGISTRY.counter(
+    "modbus_fast_retries", "Truncated or corrupted responses retried", ["unit"]
+)
+
+#: bits of a character (start, 8 data, stop)
+CHARACTER_BITS = 10
+
+#: Modbus RTU: fixed inter-frame gap above 19200 baud
+MIN_FRAME_GAP = 0.00175
+
+
+class _Block:
+    """Round-trip times and timeout of a unit's register block"""
+
+    __slots__ = ("rtts", "p50", "p99", "backoff", "since_update")
+
+    def __init__(self, window: int):
+        self.rtts: collections.deque = collections.deque(maxlen=window)
+        self.p50: float = None
+        self.p99: float = None
+        #: doubled for every unanswered transaction, reset by an answer
+        self.backoff: float = 1.0
+        self.since_update: int = 0
+
+    def update(self):
+        ordered = sorted(self.rtts)
+        self.p50 = ordered[len(ordered) // 2]
+        self.p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        self.since_update = 0
+
+
+class LinkTiming:
+    """Calibration of a serial link, see the module documentation.
+
+    Args:
+      baudrate (int): configured baud rate of the port
+      max_timeout (float): seconds, the configured timeout
+      min_timeout (float): seconds
+      multiplier (float): timeout in multiples of the p99 round-trip time
+      warmup (int): round trips of a block before its timeout adapts
+      window (int): round trips per block the percentiles are taken from
+    """
+
+    def __init__(
+        self,
+        baudrate: int = 9600,
+        max_timeout: float = 1.0,
+        min_timeout: float = 0.05,
+        multiplier: float = 3.0,
+        warmup: int = 10,
+        window: int = 200,
+    ):
+        self.baudrate: int = baudrate
+        self._max_timeout: float = max_timeout
+        self._min_timeout: float = min(min_timeout, max_timeout)
+        self._multiplier: float = multiplier
+        self._warmup: int = warmup
+        self._window: int = window
+        #: (unit, block) -> _Block
+        self._blocks: dict = {}
+        #: seconds per byte of the streaming responses (rolling window)
+        self._byte_times: collections.deque = collections.deque(maxlen=window)
+        self._char_time: float = self.nominal_char_time
+
+        #: transactions without any answer
+        self.timeouts: int = 0
+        #: truncated or corrupted responses
+        self.damaged: int = 0
+
+    @property
+    def nominal_char_time(self) -> float:
+        return CHARACTER_BITS / self.baudrate
+
+    @property
+    def char_time(self) -> float:
+        """Measured seconds per character"""
+        return self._char_time
+
+    @property
+    def frame_gap(self) -> float:
+        """Silence between frames: 3.5 measured characters"""
+        return max(3.5 * self._char_time, MIN_FRAME_GAP)
+
+    def _block(self, unit: int, block: str) -> _Block:
+        key = (unit, block)
+        entry = self._blocks.get(key)
+        if entry is None:
+            entry = self._blocks[key] = _Block(self._window)
+            _TIMEOUT.labels(unit, block).set_function(
+                lambda: self.timeout(unit, block)
+            )
+        return entry
+
+    def timeout(self, unit: int, block: str, frame_bytes: int = 0) -> float:
+        """Timeout of the next transaction of a block
+
+        Args:
+          frame_bytes (int): size of request plus response, their transfer
+              time is the lower limit
+        """
+        entry = self._blocks.get((unit, block))
+        if entry is None or entry.p99 is None:
+            return self._max_timeout
+
+        timeout = max(
+            self._multiplier * entry.p99 * entry.backoff,
+            self._min_timeout + frame_bytes * self._char_time,
+        )
+        return min(timeout, self._max_timeout)
+
+    def observe(self, unit: int, block: str, rtt: float):
+        """Record the round-trip time of an answered transaction"""
+        entry = self._block(unit, block)
+        entry.rtts.append(rtt)
+        entry.backoff = 1.0
+        entry.since_update += 1
+        # the percentiles are refreshed every tenth round trip
+        if len(entry.rtts) >= self._warmup and (
+            entry.p99 is None or entry.since_update >= 10
+        ):
+            entry.update()
+
+    def observe_timeout(self, unit: int, block: str):
+        """Record a transaction that was not answered"""
+        self.timeouts += 1
+        entry = self._block(unit, block)
+        if entry.p99 is not None:
+            entry.backoff = min(entry.backoff * 2, 64.0)
+
+    def observe_stream(self, size: int, elapsed: float):
+        """Record the time ``size`` bytes of a response took to arrive"""
+        self._byte_times.append(elapsed / size)
+        if len(self._byte_times) >= self._warmup:
+            ordered = sorted(self._byte_times)
+            # faster than the line means the bytes were buffered already
+            self._char_time = max(
+                ordered[len(ordered) // 2], self.nominal_char_time
+            )
+
+    def stats(self) -> dict:
+        """The calibration, served on ``/modbus_timing``"""
+        return {
+            "baudrate": self.baudrate,
+            "measured_baudrate": round(CHARACTER_BITS / self._char_time),
+            "frame_gap": self.frame_gap,
+            "timeouts": self.timeouts,
+            "damaged": self.damaged,
+            "blocks": [
+                {
+                    "unit": unit,
+                    "block": block,
+                    "samples": len(entry.rtts),
+                    "p50": entry.p50,
+                    "p99": entry.p99,
+                    "timeout": self.timeout(unit, block),
+                }
+                for (unit, block), entry in sorted(self._blocks.items())
+            ],
+        }
+
+
+class AdaptiveRtuClient(ModbusSerialClient):
+    """pymodbus RTU client using :class:`LinkTiming`.
+
+    Args:
+      port (str): serial device
+      baudrate (int): ...
+      timeout (float): the maximum timeout in seconds
+      fast_retries (int): retries of a truncated or corrupted response
+      timing (LinkTiming): the calibration, by default one for ``baudrate``
+          and ``timeout``
+    """
+
+    def __init__(
+        self,
+        port: str,
+        baudrate: int = 9600,
+        timeout: float = 1.0,
+        fast_retries: int = 1,
+        timing: LinkTiming = None,
+        **kwargs,
+    ):
+        ModbusSerialClient.__init__(
+            self,
+            method="rtu",
+            port=port,
+            baudrate=baudrate,
+            stopbits=1,
+            parity="N",
+            bytesize=8,
+            timeout=timeout,
+            **kwargs,
+        )
+        self.timing: LinkTiming = timing or LinkTiming(baudrate, max_timeout=timeout)
+        self._fast_retries: int = fast_retries
+        #: bytes received in the current transaction
+        self._received: int = 0
+
+    def _apply_timeout(self, timeout: float):
+        if timeout != self.timeout:
+            self.timeout = timeout
+            if self.socket is not None:
+                self.socket.timeout = timeout
+
+    def execute(self, request=None):
+        unit = request.unit_id
+        count = getattr(request, "count", 0)
+        block = f"{request.function_code}_{getattr(request, 'address', 0)}_{count}"
+        # unit, function code, CRC and the registers of request and response
+        frame_bytes = 8 + 5 + 2 * count
+
+        self._apply_timeout(self.timing.timeout(unit, block, frame_bytes))
+        self.silent_interval = self.timing.frame_gap
+
+        for attempt in range(self._fast_retries + 1):
+            self._received = 0
+            start = time.perf_counter()
+            response = ModbusSerialClient.execute(self, request)
+            elapsed = time.perf_counter() - start
+
+            if not isinstance(response, ModbusIOException):
+                self.timing.observe(unit, block, elapsed)
+                return response
+            if not self._received:
+                self.timing.observe_timeout(unit, block)
+                return response
+
+            self.timing.damaged += 1
+            if attempt < self._fast_retries:
+                _FAST_RETRIES.labels(unit).inc()
+                _logger.debug("Unit %s: damaged response, retrying", unit)
+        return response
+
+    def _recv(self, size):
+        start = time.perf_counter()
+        result = ModbusSerialClient._recv(self, size)
+        if self._received and size and len(result) == size >= 8:
+            # the rest of a response after its first bytes: streaming time
+            self.timing.observe_stream(size, time.perf_counter() - start)
+        self._received += len(result)
+        return result
+
+
+def add_timing_route(server, timing: LinkTiming):
+    """Register ``/modbus_timing`` (:meth:`LinkTiming.stats`) on an
+    :class:`~power_plant_monitoring.http_api.HttpApiServer`"""
+    from power_plant_monitoring.http_api import json_response
+
+    def calibration(query):
+        return json_response(timing.stats())
+
+    server.add_route("/modbus_timing", calibration)
@@ -0,0 +1,102 @@
+import logging
+import time
+
+from power_plant_monitoring.base import CircuitOpen
+from power_plant_monitoring.resilience import read_device
+
+_logger = logging.getLogger(__name__)
+
+
+class BusScheduler:
+    """Polls the devices sharing a bus, each at its own interval.
+
+    The transactions of a bus are serialized anyway, so the devices are read
+    one after the other from the thread that owns the bus. A device which
+    missed its time (the bus was busy) is read once and keeps its rhythm, the
+    missed polls are not caught up. A device with a circuit breaker is not
+    read while its breaker (or the one of the bus) is open, a silent device
+    does not hold up the others with its timeouts.
+
+    Args:
+      clock: returns monotonic seconds
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        #: [next poll, interval, device, breaker], ordered as added
+        self._entries: list = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def devices(self) -> list:
+        return [entry[2] for entry in self._entries]
+
+    @property
+    def breakers(self) -> list:
+        return [entry[3] for entry in self._entries if entry[3] is not None]
+
+    def add(self, device, interval: float, breaker=None):
+        """Poll ``device`` (anything with ``read()``) every ``interval`` seconds,
+        the first time at the next :meth:`poll`
+
+        Args:
+          breaker (CircuitBreaker): guards the reads of the device
+        """
+        self._entries.append([self._clock(), interval, device, breaker])
+
+    def next_due(self) -> float:
+        """Seconds until the next device is due (0 if one is due now)"""
+        if not self._entries:
+            return float("inf")
+        return max(0.0, min(entry[0] for entry in self._entries) - self._clock())
+
+    def poll(self) -> list:
+        """Read the devices which are due
+
+        Returns:
+          list[tuple]: (device, timestamp, info), info is None if the read
+          failed; shed devices are left out
+        """
+        results = []
+        for entry in self._entries:
+            now = self._clock()
+            if entry[0] > now:
+                continue
+
+            entry[0] += entry[1]
+            if entry[0] <= now:
+                entry[0] = now + entry[1]
+
+            device, breaker = entry[2], entry[3]
+            timestamp = time.time()
+            try:
+                if breaker is None:
+                    info = device.read()
+                else:
+                    info = breaker.call(read_device, device)
+            except CircuitOpen:
+                continue
+            except Exception as err:
+                _logger.error("Reading %s failed: %s", device.name, err)
+                info = None
+            results.append((device, timestamp, info))
+        return results
+
+    def wait(self, delay: float, on_result=None):
+        """Sleep ``delay`` seconds, polling the devices which become due meanwhile
+
+        Args:
+          delay (float): seconds
+          on_result: called with ``(device, timestamp, info)`` of every read
+        """
+        end = self._clock() + delay
+        while True:
+            for result in self.poll():
+                if on_result is not None:
+                    on_result(*result)
+            remaining = end - self._clock()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, self.next_due()))
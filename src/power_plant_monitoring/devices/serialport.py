@@ -0,0 +1,206 @@
+"""Recovery of serial ports: re-opening, stable device paths and hotplug.
+
+A USB-RS485 adapter that resets or is plugged in again gets a new device node,
+often under a new name (``/dev/ttyUSB0`` becomes ``/dev/ttyUSB1``). pymodbus
+closes its port after a failed transaction and opens the configured path again
+with the next one, which fails from then on. :class:`SerialPort` follows the
+adapter through its ``/dev/serial/by-id`` link (stable across re-enumeration,
+resolved from the configured path at startup) and checks the port before every
+read: a port whose device node is gone is closed and opened again. A port that
+cannot be opened fails the read with ``ExchangeNotAvailable``, so the bus
+breaker (:mod:`~power_plant_monitoring.resilience`) sheds the bus and probes
+it again with a doubling open time: the back-off of the re-opening.
+
+On Linux the :class:`HotplugMonitor` receives the kernel's uevents of tty
+devices (a netlink socket, no udev library needed). A tty plugged in resets
+the bus breaker, the port is probed after ``settle`` seconds (udev creates the
+by-id link shortly after the kernel event) instead of at the end of a long
+open time.
+"""
+import logging
+import os
+import socket
+import threading
+
+from power_plant_monitoring.base import ExchangeNotAvailable
+from power_plant_monitoring.metrics import REGISTRY
+from power_plant_monitoring.program_thread import ProgramThread
+from power_plant_monitoring.resilience import read_device
+
+_logger = logging.getLogger(__name__)
+
+_REOPENED = REGISTRY.counter(
+    "serial_port_reopened", "Serial ports opened again after a loss", ["port"]
+)
+
+#: links named after the adapters (vendor, model, serial number)
+BY_ID = "/dev/serial/by-id"
+
+#: netlink protocol of the kernel uevents
+NETLINK_KOBJECT_UEVENT = 15
+
+
+def stable_path(port: str, by_id: str = BY_ID) -> str:
+    """The ``/dev/serial/by-id`` link of ``port``, ``port`` if it has none"""
+    if os.path.dirname(port) == by_id:
+        return port
+    target = os.path.realpath(port)
+    try:
+        names = sorted(os.listdir(by_id))
+    except OSError:
+        return port
+    for name in names:
+        link = os.path.join(by_id, name)
+        if os.path.realpath(link) == target:
+            return link
+    return port
+
+
+class SerialPort:
+    """Keeps the port of a pymodbus serial client usable, see the module
+    documentation.
+
+    Args:
+      client: pymodbus serial client
+      port (str): the configured device
+      breaker (CircuitBreaker): the breaker of the bus, reset by hotplug events
+      settle (float): seconds from a hotplug event to the probe
+      by_id (str): directory of the stable links
+    """
+
+    def __init__(
+        self, client, port: str, breaker=None, settle: float = 1.0, by_id=BY_ID
+    ):
+        self._client = client
+        self.port: str = port
+        #: the path opened, the by-id link if there is one
+        self.path: str = stable_path(port, by_id)
+        self._breaker = breaker
+        self._settle: float = settle
+        #: set by a hotplug event removing the device
+        self._removed: threading.Event = threading.Event()
+        #: the port was lost and not opened again yet
+        self.lost: bool = False
+
+        if self.path != port:
+            _logger.info("%s: following %s", port, self.path)
+        client.port = self.path
+
+    def ensure(self):
+        """Open the port if it is closed or its device is gone
+
+        Raises:
+          ExchangeNotAvailable: the port cannot be opened
+        """
+        client = self._client
+        if client.socket is not None:
+            if not self._removed.is_set() and os.path.exists(self.path):
+                return
+            # the file descriptor refers to a device that is gone
+            client.close()
+            if not self.lost:
+                _logger.warning("%s: device removed", self.port)
+            self.lost = True
+        self._removed.clear()
+
+        if not client.connect():
+            self.lost = True
+            raise ExchangeNotAvailable(f"{self.port}: cannot open {self.path}")
+        if self.lost:
+            self.lost = False
+            _REOPENED.labels(self.port).inc()
+            _logger.warning("%s: opened again", self.port)
+
+    def read(self, device):
+        """:func:`~power_plant_monitoring.resilience.read_device` on the
+        ensured port, use as ``breaker.call(port.read, device)``"""
+        self.ensure()
+        return read_device(device)
+
+    def hotplug(self, event: dict):
+        """Handle a uevent of a tty (see :class:`HotplugMonitor`)"""
+        action, name = event.get("ACTION"), event.get("DEVNAME", "")
+        if action == "remove":
+            current = os.path.realpath(self.path)
+            if os.path.basename(current) == os.path.basename(name):
+                self._removed.set()
+        elif action == "add":
+            _logger.info("%s: %s plugged in", self.port, name)
+            if self._breaker is not None:
+                self._breaker.reset(self._settle)
+
+
+def parse_uevent(data: bytes) -> dict:
+    """A kernel uevent (``action@devpath`` and ``KEY=value`` strings)"""
+    event = {}
+    for field in data.split(b"\0")[1:]:
+        key, _, value = field.decode(errors="replace").partition("=")
+        if key:
+            event[key] = value
+    return event
+
+
+def open_uevent_socket():
+    """The netlink socket of the kernel uevents, None where there is none"""
+    try:
+        sock = socket.socket(
+            socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT
+        )
+    except (AttributeError, OSError) as err:
+        _logger.info("No hotplug events: %s", err)
+        return None
+    try:
+        # multicast group 1: the events of the kernel
+        sock.bind((0, 1))
+    except OSError as err:
+        sock.close()
+        _logger.info("No hotplug events: %s", err)
+        return None
+    return sock
+
+
+class HotplugMonitor(ProgramThread):
+    """Passes the uevents of tty devices to the subscribed callbacks.
+
+    Args:
+      sock (socket.socket): see :func:`open_uevent_socket`
+    """
+
+    def __init__(self, sock: socket.socket, name: str = "HotplugMonitor"):
+        ProgramThread.__init__(self, name)
+
+        self._socket: socket.socket = sock
+        self._callbacks: list = []
+
+    def subscribe(self, callback):
+        """``callback(event)`` for every tty event, see :func:`parse_uevent`"""
+        self._callbacks.append(callback)
+
+    def _run_internal(self, ct: threading.Event):
+        self._socket.settimeout(0.5)
+        while not ct.is_set():
+            try:
+                data = self._socket.recv(8192)
+            except socket.timeout:
+                continue
+            event = parse_uevent(data)
+            if event.get("SUBSYSTEM") != "tty":
+                continue
+            _logger.debug("(%s) %s %s", self.name, event.get("ACTION"), event)
+            for callback in self._callbacks:
+                callback(event)
+
+    def _finally_internal(self):
+        self._socket.close()
+
+
+def create_hotplug_monitor(ports: list):
+    """A :class:`HotplugMonitor` (not started) for ``ports`` (list of
+    :class:`SerialPort`), None without uevents"""
+    sock = open_uevent_socket()
+    if sock is None:
+        return None
+    monitor = HotplugMonitor(sock)
+    for port in ports:
+        monitor.subscribe(port.hotplug)
+    return monitor
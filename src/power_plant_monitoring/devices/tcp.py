@@ -0,0 +1,337 @@
+"""Modbus TCP gateways: RS485-to-Ethernet converters and dataloggers.
+
+:class:`ModbusTcpGateway` is a client with the interface the drivers use
+(``read_input_registers``/``read_holding_registers`` returning responses with
+``registers`` and ``isError()``, like the pymodbus clients), so
+:class:`~power_plant_monitoring.growatt.Growatt` and
+:class:`~power_plant_monitoring.devices.driver.ModbusDriver` work behind a
+gateway unchanged.
+
+The gateway keeps a pool of persistent connections with TCP keep-alive. A
+connection the gateway closed (many do after a minute idle) is opened again
+by the next transaction, a read that was lost with it is sent once more.
+
+Transactions are pipelined: up to ``max_in_flight`` requests per connection
+are sent without waiting for the previous answer, a reader thread per
+connection hands the answers to the waiting callers by their transaction ID.
+Units polled from several threads (see
+:func:`~power_plant_monitoring.sharding.poll_units`) then overlap their round
+trips instead of queueing behind each other. ``max_in_flight: 1`` serializes
+the transactions for gateways which cannot handle more than one.
+"""
+import logging
+import socket
+import struct
+import threading
+import time
+
+from pymodbus.exceptions import ConnectionException, ModbusIOException
+
+from power_plant_monitoring.metrics import REGISTRY
+
+_logger = logging.getLogger(__name__)
+
+_IN_FLIGHT = REGISTRY.gauge(
+    "modbus_tcp_in_flight", "Pipelined transactions waiting for an answer", ["gateway"]
+)
+_RECONNECTS = REGISTRY.counter(
+    "modbus_tcp_reconnects", "Connections opened again", ["gateway"]
+)
+
+#: transaction ID, protocol (0), length, unit
+_MBAP = struct.Struct(">HHHB")
+_READ = struct.Struct(">BHH")
+
+READ_HOLDING_REGISTERS = 3
+READ_INPUT_REGISTERS = 4
+
+
+class RegisterResponse:
+    """The answer to a read request."""
+
+    __slots__ = ("function_code", "registers", "exception_code")
+
+    def __init__(self, function_code: int, registers: list, exception_code=None):
+        self.function_code: int = function_code
+        self.registers: list = registers
+        #: set for exception responses
+        self.exception_code: int = exception_code
+
+    def isError(self) -> bool:
+        return self.function_code > 0x80
+
+    def __repr__(self):
+        if self.isError():
+            return f"RegisterResponse(exception {self.exception_code})"
+        return f"RegisterResponse({len(self.registers)} registers)"
+
+
+def decode_response(function: int, pdu: bytes):
+    """The response for a read PDU, ModbusIOException for an invalid one"""
+    if pdu and pdu[0] == function | 0x80 and len(pdu) == 2:
+        return RegisterResponse(pdu[0], [], pdu[1])
+    if len(pdu) < 2 or pdu[0] != function or len(pdu) != 2 + pdu[1] or pdu[1] % 2:
+        return ModbusIOException(f"Invalid response {pdu.hex()}", function)
+    return RegisterResponse(function, list(struct.unpack(f">{pdu[1] // 2}H", pdu[2:])))
+
+
+class _Pending:
+    __slots__ = ("event", "pdu")
+
+    def __init__(self):
+        self.event: threading.Event = threading.Event()
+        #: the response PDU, None if the connection was lost
+        self.pdu: bytes = None
+
+
+class _Connection:
+    """A persistent connection with pipelined transactions"""
+
+    def __init__(self, gateway: "ModbusTcpGateway", index: int):
+        self._gateway = gateway
+        self.name: str = f"{gateway.name}#{index}"
+        self._socket: socket.socket = None
+        self._lock: threading.Lock = threading.Lock()
+        self._send_lock: threading.Lock = threading.Lock()
+        self._slots: threading.BoundedSemaphore = threading.BoundedSemaphore(
+            gateway.max_in_flight
+        )
+        #: transaction ID -> _Pending
+        self._pending: dict = {}
+        self._next_id: int = 0
+        #: connections opened
+        self.opened: int = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    @property
+    def connected(self) -> bool:
+        return self._socket is not None
+
+    def _open(self):
+        gateway = self._gateway
+        sock = socket.create_connection(
+            (gateway.host, gateway.port), timeout=gateway.connect_timeout
+        )
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for option, value in (
+            ("TCP_KEEPIDLE", gateway.keepalive),
+            ("TCP_KEEPINTVL", gateway.keepalive),
+            ("TCP_KEEPCNT", 3),
+        ):
+            if hasattr(socket, option):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+        # the reader blocks until an answer arrives or the socket is closed
+        sock.settimeout(None)
+
+        self._socket = sock
+        self.opened += 1
+        if self.opened > 1:
+            _RECONNECTS.labels(gateway.name).inc()
+        threading.Thread(
+            target=self._read, args=(sock,), name=f"ModbusTcp-{self.name}", daemon=True
+        ).start()
+        _logger.debug("%s: connected", self.name)
+
+    def _read(self, sock: socket.socket):
+        stream = sock.makefile("rb")
+        try:
+            while True:
+                header = stream.read(_MBAP.size)
+                if len(header) < _MBAP.size:
+                    break
+                tid, _, length, _ = _MBAP.unpack(header)
+                if not 2 <= length <= 254:
+                    # out of step with the stream, nothing after it can be trusted
+                    _logger.warning("%s: invalid MBAP length %s", self.name, length)
+                    break
+                pdu = stream.read(length - 1)
+                if len(pdu) < length - 1:
+                    break
+                with self._lock:
+                    pending = self._pending.pop(tid, None)
+                if pending is None:
+                    # the caller gave up waiting
+                    continue
+                pending.pdu = pdu
+                pending.event.set()
+        except (OSError, ValueError):
+            pass
+        finally:
+            stream.close()
+            self._drop(sock)
+
+    def _drop(self, sock: socket.socket):
+        """Close ``sock`` and fail its waiting transactions"""
+        with self._lock:
+            if self._socket is not sock:
+                return
+            self._socket = None
+            pending, self._pending = self._pending, {}
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+        for entry in pending.values():
+            entry.event.set()
+        _logger.debug("%s: disconnected", self.name)
+
+    def close(self):
+        sock = self._socket
+        if sock is not None:
+            self._drop(sock)
+
+    def transact(self, unit: int, pdu: bytes, timeout: float):
+        """Send a request and wait for its answer
+
+        Returns:
+          bytes: the response PDU, None after ``timeout`` seconds
+
+        Raises:
+          OSError: the connection failed or was lost
+        """
+        deadline = time.monotonic() + timeout
+        if not self._slots.acquire(timeout=timeout):
+            return None
+        try:
+            with self._lock:
+                if self._socket is None:
+                    self._open()
+                sock = self._socket
+                self._next_id = self._next_id % 0xFFFF + 1
+                while self._next_id in self._pending:
+                    self._next_id = self._next_id % 0xFFFF + 1
+                tid = self._next_id
+                pending = self._pending[tid] = _Pending()
+
+            try:
+                with self._send_lock:
+                    sock.sendall(_MBAP.pack(tid, 0, len(pdu) + 1, unit) + pdu)
+            except OSError:
+                self._drop(sock)
+                raise
+
+            if not pending.event.wait(max(0.0, deadline - time.monotonic())):
+                with self._lock:
+                    self._pending.pop(tid, None)
+                return None
+            if pending.pdu is None:
+                raise ConnectionResetError(f"{self.name}: connection lost")
+            return pending.pdu
+        finally:
+            self._slots.release()
+
+
+class ModbusTcpGateway:
+    """Client of a Modbus TCP gateway, see the module documentation.
+
+    Args:
+      host (str): ...
+      port (int): ...
+      timeout (float): seconds to wait for an answer
+      connections (int): size of the connection pool
+      max_in_flight (int): pipelined transactions per connection
+      connect_timeout (float): seconds
+      keepalive (int): seconds idle before the first TCP keep-alive probe
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 502,
+        timeout: float = 1.0,
+        connections: int = 1,
+        max_in_flight: int = 4,
+        connect_timeout: float = 3.0,
+        keepalive: int = 30,
+    ):
+        self.host: str = host
+        self.port: int = port
+        self.name: str = f"{host}:{port}"
+        self.timeout: float = timeout
+        self.max_in_flight: int = max(1, max_in_flight)
+        self.connect_timeout: float = connect_timeout
+        self.keepalive: int = keepalive
+        self._connections: tuple = tuple(
+            _Connection(self, i) for i in range(max(1, connections))
+        )
+        _IN_FLIGHT.labels(self.name).set_function(
+            lambda: sum(c.in_flight for c in self._connections)
+        )
+
+    @property
+    def concurrency(self) -> int:
+        """Transactions the gateway takes at once"""
+        return len(self._connections) * self.max_in_flight
+
+    def connect(self) -> bool:
+        """Open the first connection, the others are opened when needed
+
+        Returns:
+          bool: False if the gateway is not reachable (the next read tries
+          again)
+        """
+        connection = self._connections[0]
+        try:
+            with connection._lock:
+                if not connection.connected:
+                    connection._open()
+        except OSError as err:
+            _logger.error("%s: %s", self.name, err)
+            return False
+        return True
+
+    def close(self):
+        for connection in self._connections:
+            connection.close()
+
+    def read_input_registers(self, address: int, count: int = 1, unit: int = 1):
+        return self.execute(READ_INPUT_REGISTERS, address, count, unit)
+
+    def read_holding_registers(self, address: int, count: int = 1, unit: int = 1):
+        return self.execute(READ_HOLDING_REGISTERS, address, count, unit)
+
+    def execute(self, function: int, address: int, count: int, unit: int = 1):
+        """Read ``count`` registers
+
+        Returns:
+          RegisterResponse: also for exception responses (``isError()``);
+          ModbusIOException if the unit did not answer in time
+
+        Raises:
+          ConnectionException: the gateway is not reachable
+        """
+        pdu = _READ.pack(function, address, count)
+        # the least busy connection, the idle ones are preferred
+        connection = min(self._connections, key=lambda c: c.in_flight)
+        reconnected = not connection.connected
+        while True:
+            try:
+                response = connection.transact(unit, pdu, self.timeout)
+                break
+            except OSError as err:
+                if reconnected:
+                    raise ConnectionException(f"{self.name}: {err}") from err
+                # a stale connection, the read is repeated on a new one
+                _logger.debug("%s: %s, reconnecting", connection.name, err)
+                reconnected = True
+
+        if response is None:
+            return ModbusIOException(f"No response from unit {unit}", function)
+        return decode_response(function, response)
+
+    def stats(self) -> dict:
+        return {
+            "gateway": self.name,
+            "connections": [
+                {"connected": c.connected, "in_flight": c.in_flight, "opened": c.opened}
+                for c in self._connections
+            ],
+        }
+
+    def __str__(self):
+        return f"ModbusTcpGateway({self.name})"
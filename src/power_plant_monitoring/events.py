@@ -0,0 +1,359 @@
+"""Change-only state and fault events and their local, indexed log.
+
+The status and fault codes of an inverter change a few times a day, repeating
+their texts in every 1 Hz point only bloats the database. A
+:class:`TransitionTracker` per inverter turns the codes of the samples
+(:data:`TRACKED_CODES`) into :class:`StateEvent` transitions: the code and text
+before and after, and how long the previous state lasted. The events are
+published on the sample bus (topic ``events``), written to their own InfluxDB
+measurement and kept in an :class:`EventLog`.
+
+The event log is a SQLite database indexed by kind and time. "All faults in
+March" is a range scan of the ``(kind, timestamp)`` index, "time spent in
+Fault" sums the durations stored with the transitions out of the state
+(:meth:`EventLog.time_in_state`), neither touches the raw samples. A tracker
+resumes from the last logged state, so a restart does not record a transition
+and the duration of the state includes the downtime.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+
+from power_plant_monitoring.growatt import (
+    DeratingMode,
+    ErrorCodes,
+    StateCodes,
+    code_text,
+)
+from power_plant_monitoring.metrics import REGISTRY
+
+_logger = logging.getLogger(__name__)
+
+_EVENTS = REGISTRY.counter("state_events", "State transitions recorded", ["kind"])
+
+#: kind -> (code field, text field, texts) of the samples
+TRACKED_CODES = {
+    "status": ("StatusCode", "Status", StateCodes),
+    "fault": ("FaultCode", "Fault", ErrorCodes),
+    # only present if the register map decodes it
+    "derating": ("DeratingMode", "Derating", DeratingMode),
+}
+
+#: fields carried by the events, not repeated in every sample
+TEXT_FIELDS = frozenset(text for _, text, _ in TRACKED_CODES.values())
+
+
+@dataclass(frozen=True)
+class StateEvent:
+    """A transition of a tracked code."""
+
+    #: timestamp (float): first sample in the new state (epoch seconds)
+    timestamp: float
+    #: kind (str): key of :data:`TRACKED_CODES`
+    kind: str
+    #: from_code (int): None for the first state of an inverter
+    from_code: int
+    #: to_code (int): ...
+    to_code: int
+    #: from_text (str): ...
+    from_text: str
+    #: to_text (str): ...
+    to_text: str
+    #: duration (float): seconds spent in the previous state, None if unknown
+    duration: float
+    #: port (str): None in the single-port mode
+    port: str = None
+    #: unit (int): ...
+    unit: int = None
+
+    def fields(self) -> dict:
+        """The fields of the InfluxDB point and the bus sample"""
+        return {
+            key: value
+            for key, value in asdict(self).items()
+            if key not in ("timestamp", "kind", "port", "unit") and value is not None
+        }
+
+    @classmethod
+    def from_sample(cls, sample) -> "StateEvent":
+        """The event of a sample of the ``events`` topic"""
+        fields = dict.fromkeys(
+            ("from_code", "from_text", "duration", "to_code", "to_text")
+        )
+        fields.update(sample.fields)
+        unit = sample.tags.get("unit")
+        return cls(
+            sample.timestamp,
+            sample.tags["kind"],
+            port=sample.tags.get("port"),
+            unit=int(unit) if unit is not None else None,
+            **fields,
+        )
+
+
+class TransitionTracker:
+    """Turns the tracked codes of an inverter's samples into events.
+
+    Args:
+      port (str): ...
+      unit (int): ...
+      last (dict): kind -> (code, since) to resume from, see
+          :meth:`EventLog.last_states`
+    """
+
+    def __init__(self, port: str = None, unit: int = None, last: dict = None):
+        self._port: str = port
+        self._unit: int = unit
+        #: kind -> (code, text, since)
+        self._state: dict = {}
+        for kind, (code, since) in (last or {}).items():
+            if kind in TRACKED_CODES:
+                texts = TRACKED_CODES[kind][2]
+                self._state[kind] = (code, code_text(texts, code), since)
+
+    def update(self, timestamp: float, info: dict) -> list[StateEvent]:
+        """The transitions of a sample, usually none"""
+        events = []
+        for kind, (code_field, text_field, texts) in TRACKED_CODES.items():
+            code = info.get(code_field)
+            if code is None:
+                continue
+            code = int(code)
+            state = self._state.get(kind)
+            if state is not None and state[0] == code:
+                continue
+
+            text = info.get(text_field) or code_text(texts, code)
+            previous, previous_text, since = state or (None, None, None)
+            event = StateEvent(
+                timestamp,
+                kind,
+                previous,
+                code,
+                previous_text,
+                text,
+                timestamp - since if since is not None else None,
+                self._port,
+                self._unit,
+            )
+            self._state[kind] = (code, text, timestamp)
+            _EVENTS.labels(kind).inc()
+            events.append(event)
+        return events
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    timestamp REAL NOT NULL,
+    kind TEXT NOT NULL,
+    port TEXT,
+    unit INTEGER,
+    from_code INTEGER,
+    to_code INTEGER NOT NULL,
+    from_text TEXT,
+    to_text TEXT NOT NULL,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS events_kind_time ON events (kind, timestamp);
+CREATE INDEX IF NOT EXISTS events_kind_from ON events (kind, from_code, timestamp);
+"""
+
+_COLUMNS = (
+    "timestamp, kind, port, unit, from_code, to_code, from_text, to_text, duration"
+)
+
+
+def _source(port: str, unit: int) -> tuple:
+    """SQL condition and parameters selecting an inverter (all if None)"""
+    conditions, parameters = [], []
+    if port is not None:
+        conditions.append("port = ?")
+        parameters.append(port)
+    if unit is not None:
+        conditions.append("unit = ?")
+        parameters.append(unit)
+    return "".join(f" AND {c}" for c in conditions), parameters
+
+
+class EventLog:
+    """The :class:`StateEvent` s in a SQLite database, see the module
+    documentation. The methods may be called from any thread.
+
+    Args:
+      path (str): database file, ``":memory:"`` for tests
+    """
+
+    def __init__(self, path: str = "events.sqlite"):
+        self._path: str = path
+        self._lock: threading.Lock = threading.Lock()
+        self._db: sqlite3.Connection = sqlite3.connect(path, check_same_thread=False)
+        # readers (e.g. the sqlite3 shell) do not block the writer
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def append(self, event: StateEvent):
+        with self._lock:
+            self._db.execute(
+                f"INSERT INTO events ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    event.timestamp,
+                    event.kind,
+                    event.port,
+                    event.unit,
+                    event.from_code,
+                    event.to_code,
+                    event.from_text,
+                    event.to_text,
+                    event.duration,
+                ),
+            )
+            self._db.commit()
+
+    def last_states(self, port: str = None, unit: int = None) -> dict:
+        """kind -> (code, since) of the last event of each kind of an inverter"""
+        source, parameters = _source(port, unit)
+        with self._lock:
+            # SQLite takes the other columns from the row of max()
+            rows = self._db.execute(
+                "SELECT kind, to_code, max(timestamp) FROM events"
+                f" WHERE 1{source} GROUP BY kind",
+                parameters,
+            ).fetchall()
+        return {kind: (code, since) for kind, code, since in rows}
+
+    def events(
+        self,
+        start: float = None,
+        end: float = None,
+        kind: str = None,
+        code: int = None,
+        port: str = None,
+        unit: int = None,
+        limit: int = None,
+    ) -> list[StateEvent]:
+        """The events in ``[start, end)`` in time order
+
+        Args:
+          kind (str): only transitions of a kind
+          code (int): only transitions into a code (needs ``kind``)
+        """
+        conditions, parameters = ["timestamp >= ?", "timestamp < ?"], [
+            start if start is not None else float("-inf"),
+            end if end is not None else float("inf"),
+        ]
+        if kind is not None:
+            conditions.append("kind = ?")
+            parameters.append(kind)
+            if code is not None:
+                conditions.append("to_code = ?")
+                parameters.append(code)
+        source, source_parameters = _source(port, unit)
+        sql = (
+            f"SELECT {_COLUMNS} FROM events WHERE {' AND '.join(conditions)}{source}"
+            " ORDER BY timestamp"
+        )
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            rows = self._db.execute(sql, parameters + source_parameters).fetchall()
+        return [
+            StateEvent(row[0], row[1], *row[4:], port=row[2], unit=row[3])
+            for row in rows
+        ]
+
+    def time_in_state(
+        self,
+        kind: str,
+        code: int,
+        start: float,
+        end: float = None,
+        port: str = None,
+        unit: int = None,
+    ) -> float:
+        """Seconds the inverters were in state ``code`` within ``[start, end)``
+
+        The intervals ending in the range are the transitions out of the state,
+        a state that still lasts counts up to ``end`` (now by default).
+        """
+        end = min(end, time.time()) if end is not None else time.time()
+        source, parameters = _source(port, unit)
+        with self._lock:
+            # a transition out of the state ends an interval of ``duration``
+            (closed,) = self._db.execute(
+                "SELECT total(min(timestamp, ?) - max(timestamp - duration, ?))"
+                " FROM events WHERE kind = ? AND from_code = ? AND timestamp > ?"
+                f" AND timestamp - duration < ?{source}",
+                [end, start, kind, code, start, end] + parameters,
+            ).fetchone()
+            # the current state of every inverter
+            current = self._db.execute(
+                "SELECT to_code, max(timestamp) FROM events"
+                f" WHERE kind = ?{source} GROUP BY port, unit",
+                [kind] + parameters,
+            ).fetchall()
+        lasting = sum(
+            max(0.0, end - max(since, start)) for to, since in current if to == code
+        )
+        return closed + lasting
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def add_event_routes(server, log: EventLog):
+    """Register ``/events`` and ``/events/time_in_state`` on an
+    :class:`~power_plant_monitoring.http_api.HttpApiServer`.
+
+    * ``/events?kind=fault&start=1709251200&end=1711929600`` - the transitions,
+      ``code``, ``port``, ``unit`` and ``limit`` (default 1000) filter further
+    * ``/events/time_in_state?kind=status&code=3&start=1709251200`` - seconds
+    """
+    from power_plant_monitoring.http_api import HttpError, json_response
+
+    def number(query, key, convert=float, default=None):
+        if key not in query:
+            return default
+        try:
+            return convert(query[key])
+        except ValueError:
+            raise HttpError(400, f"Invalid {key} {query[key]}") from None
+
+    def kind(query, required=False):
+        value = query.get("kind")
+        if value is None and not required:
+            return None
+        if value not in TRACKED_CODES:
+            raise HttpError(400, f"Unknown kind {value}")
+        return value
+
+    def events(query):
+        found = log.events(
+            number(query, "start"),
+            number(query, "end"),
+            kind(query),
+            number(query, "code", int),
+            query.get("port"),
+            number(query, "unit", int),
+            number(query, "limit", int, 1000),
+        )
+        return json_response([asdict(event) for event in found])
+
+    def time_in_state(query):
+        if "code" not in query or "start" not in query:
+            raise HttpError(400, "code and start are required")
+        seconds = log.time_in_state(
+            kind(query, required=True),
+            number(query, "code", int),
+            number(query, "start"),
+            number(query, "end"),
+            query.get("port"),
+            number(query, "unit", int),
+        )
+        return json_response({"seconds": seconds})
+
+    server.add_route("/events", events)
+    server.add_route("/events/time_in_state", time_in_state)
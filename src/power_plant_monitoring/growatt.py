@@ -1,6 +1,20 @@
 import datetime
+import time
+
 from pymodbus.exceptions import ModbusIOException
 
+from power_plant_monitoring.metrics import REGISTRY
+
+_MODBUS_RTT = REGISTRY.histogram(
+    "modbus_rtt_seconds", "Round-trip time of a Modbus transaction", ["unit", "block"]
+)
+_MODBUS_ERRORS = REGISTRY.counter(
+    "modbus_errors", "Failed Modbus transactions", ["unit", "block"]
+)
+_DECODE_TIME = REGISTRY.histogram(
+    "growatt_decode_seconds", "Time spent decoding in Growatt.read()", ["unit"]
+)
+
 # Codes
 StateCodes = {
     0: 'Waiting',
@@ -37,6 +51,12 @@ DeratingMode = {
     9: '*OverBackByTime',
 }
 
+def code_text(texts, code):
+    """The text of a status/fault code, codes missing in the tables (newer
+    firmware, corrupted frames) must not break the read"""
+    text = texts.get(code)
+    return text if text is not None else f"Unknown ({code})"
+
 def read_single(row, index, unit=10):
     return float(row.registers[index]) / unit
 
@@ -50,13 +70,43 @@ def merge(*dict_args):
     return result
 
 class Growatt:
-    def __init__(self, client, name, unit):
+    def __init__(self, client, name, unit, journal=None):
         self.client = client
         self.name = name
         self.unit = unit
 
+        # optional FrameJournal recording the raw registers of every read
+        self.journal = journal
+        # timestamp of the current read(), shared by all of its blocks
+        self._cycle_time = 0.0
+
+        # time spent waiting for the bus during the current read()
+        self._transaction_time = 0.0
+
         #self.read_info()
 
+    def _read_input_registers(self, address, count):
+        start = time.perf_counter()
+        row = self.client.read_input_registers(address, count, unit=self.unit)
+        elapsed = time.perf_counter() - start
+
+        self._transaction_time += elapsed
+        block = f"input_{address}_{count}"
+        _MODBUS_RTT.labels(self.unit, block).observe(elapsed)
+        if row.isError():
+            _MODBUS_ERRORS.labels(self.unit, block).inc()
+
+        if self.journal is not None:
+            self.journal.record(
+                self._cycle_time,
+                self.unit,
+                address,
+                count,
+                None if row.isError() else row.registers,
+            )
+
+        return row
+
     def read_info(self):
         row = self.client.read_holding_registers(73, unit=self.unit)
         if type(row) is ModbusIOException:
@@ -71,15 +121,22 @@ class Growatt:
         print('\tModbus Version: ' + str(self.modbusVersion))
 
     def read(self):
-        row = self.client.read_input_registers(0, 33, unit=self.unit)
+        start = time.perf_counter()
+        self._transaction_time = 0.0
+        self._cycle_time = time.time()
+
+        row = self._read_input_registers(0, 33)
         if type(row) is ModbusIOException:
             return None
+        if row.isError():
+            # an exception response has no registers
+            return None
 
         # http://www.growatt.pl/dokumenty/Inne/Growatt%20PV%20Inverter%20Modbus%20RS485%20RTU%20Protocol%20V3.04.pdf
         #                                           # Unit,     Variable Name,      Description
         info = {                                    # ==================================================================
             'StatusCode': row.registers[0],         # N/A,      Inverter Status,    Inverter run state
-            'Status': StateCodes[row.registers[0]],
+            'Status': code_text(StateCodes, row.registers[0]),
             'Ppv': read_double(row, 1),             # 0.1W,     Ppv H,              Input power (high)
                                                     # 0.1W,     Ppv L,              Input power (low)
             'Vpv1': read_single(row, 3),            # 0.1V,     Vpv1,               PV1 voltage
@@ -114,7 +171,9 @@ class Growatt:
             'Temp': read_single(row, 32)            # 0.1C,     Temperature,        Inverter temperature
         }
 
-        row = self.client.read_input_registers(33, 8, unit=self.unit)
+        row = self._read_input_registers(33, 8)
+        if row.isError():
+            return None
         info = merge(info, {
             'ISOFault': read_single(row, 0),        # 0.1V,     ISO fault Value,    ISO Fault value
             'GFCIFault': read_single(row, 1, 1),    # 1mA,      GFCI fault Value,   GFCI fault Value
@@ -124,7 +183,7 @@ class Growatt:
             'FacFault': read_single(row, 5, 100),   # 0.01 Hz,  Fac fault Value,    AC frequency fault value
             'TempFault': read_single(row, 6),       # 0.1C,     Temp fault Value,   Temperature fault value
             'FaultCode': row.registers[7],          #           Fault code,         Inverter fault bit
-            'Fault': ErrorCodes[row.registers[7]]
+            'Fault': code_text(ErrorCodes, row.registers[7])
         })
 
         # row = self.client.read_input_registers(41, 1, unit=self.unit)
@@ -132,7 +191,9 @@ class Growatt:
         #    'IPMTemp': read_single(row, 0),         # 0.1C,     IPM Temperature,    The inside IPM in inverter Temperature
         # })
 
-        row = self.client.read_input_registers(42, 2, unit=self.unit)
+        row = self._read_input_registers(42, 2)
+        if row.isError():
+            return None
         info = merge(info, {
             'PBusV': read_single(row, 0),           # 0.1V,     P Bus Voltage,      P Bus inside Voltage
             'NBusV': read_single(row, 1),           # 0.1V,     N Bus Voltage,      N Bus inside Voltage
@@ -151,7 +212,9 @@ class Growatt:
         #    'Derating': DeratingMode[row.registers[6]]
         # })
 
-        row = self.client.read_input_registers(48, 16, unit=self.unit)
+        row = self._read_input_registers(48, 16)
+        if row.isError():
+            return None
         info = merge(info, {
             'Epv1_today': read_double(row, 0),      # 0.1kWh,   Epv1_today H,       PV Energy today
                                                     # 0.1kWh,   Epv1_today L,       PV Energy today
@@ -179,6 +242,10 @@ class Growatt:
         #
         # info = merge_dicts(info, self.read_fault_table('GridFault', 90, 5))
 
+        _DECODE_TIME.labels(self.unit).observe(
+            time.perf_counter() - start - self._transaction_time
+        )
+
         return info
 
     # def read_fault_table(self, name, base_index, count):
@@ -0,0 +1,144 @@
+"""Embedded HTTP server for local, read-only endpoints.
+
+The server runs as a :class:`ProgramThread` and dispatches requests to handlers
+registered with :meth:`HttpApiServer.add_route`. The live view routes
+(:func:`add_live_routes`) answer from a :class:`SampleRingBuffer` only, they never
+touch the Modbus bus or the database.
+"""
+import json
+import logging
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from power_plant_monitoring.program_thread import ProgramThread
+
+_logger = logging.getLogger(__name__)
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+def json_response(data) -> tuple:
+    return 200, "application/json", json.dumps(data).encode()
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    #: set on the subclass created by :class:`HttpApiServer`
+    routes: dict = {}
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        handler = self.routes.get(url.path)
+
+        try:
+            if handler is None:
+                raise HttpError(404, f"Unknown path {url.path}")
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            status, content_type, body = handler(query)
+        except HttpError as ex:
+            status, content_type = ex.status, "application/json"
+            body = json.dumps({"error": str(ex)}).encode()
+        except Exception as ex:
+            _logger.error("Request %s failed: %s", self.path, ex)
+            status, content_type = 500, "application/json"
+            body = json.dumps({"error": str(ex)}).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        _logger.debug("%s " + format, self.address_string(), *args)
+
+
+class HttpApiServer(ProgramThread):
+    """Serves the registered routes on ``host:port``.
+
+    A handler is called with the query parameters as ``dict`` and returns a
+    ``(status, content_type, body)`` tuple, see :func:`json_response`.
+    """
+
+    def __init__(
+        self, host: str = "127.0.0.1", port: int = 8080, name: str = "HttpApiServer"
+    ):
+        ProgramThread.__init__(self, name)
+
+        self._host: str = host
+        self._port: int = port
+        self._routes: dict = {}
+        self._server: ThreadingHTTPServer = None
+
+    @property
+    def port(self) -> int:
+        """The bound port (useful when started with port 0)"""
+        return self._server.server_port if self._server is not None else self._port
+
+    def add_route(self, path: str, handler):
+        self._routes[path] = handler
+
+    def _prepare_internal(self):
+        handler = type("RequestHandler", (_RequestHandler,), {"routes": self._routes})
+        self._server = ThreadingHTTPServer((self._host, self._port), handler)
+        self._server.daemon_threads = True
+        self._server.timeout = 0.5
+        _logger.info(f"({self.name}) Listening on {self._host}:{self.port}")
+
+    def _run_internal(self, ct: threading.Event):
+        while not ct.is_set():
+            self._server.handle_request()
+
+    def _finally_internal(self):
+        self._server.server_close()
+
+
+def _nan_to_none(values: list) -> list:
+    return [None if math.isnan(v) else v for v in values]
+
+
+def add_live_routes(server: HttpApiServer, buffer):
+    """Register ``/latest``, ``/window`` and ``/aggregate`` for ``buffer``.
+
+    * ``/latest`` - the newest sample
+    * ``/window?field=Pac&seconds=600`` - timestamps and values of a field
+    * ``/aggregate?field=Pac&seconds=600`` - count/mean/min/max/last of a field
+    """
+
+    def parse(query):
+        field = query.get("field")
+        if field not in buffer.fields:
+            raise HttpError(400, f"Unknown field {field}")
+        try:
+            seconds = float(query.get("seconds", 600))
+        except ValueError:
+            raise HttpError(400, f"Invalid seconds {query['seconds']}") from None
+        return field, seconds
+
+    def latest(query):
+        sample = buffer.latest()
+        return json_response({k: None if v != v else v for k, v in sample.items()})
+
+    def window(query):
+        field, seconds = parse(query)
+        timestamps, values = buffer.window(field, seconds)
+        return json_response(
+            {
+                "field": field,
+                "timestamps": timestamps.tolist(),
+                "values": _nan_to_none(values.tolist()),
+            }
+        )
+
+    def aggregate(query):
+        field, seconds = parse(query)
+        return json_response(dict(field=field, **buffer.aggregate(field, seconds)))
+
+    server.add_route("/latest", latest)
+    server.add_route("/window", window)
+    server.add_route("/aggregate", aggregate)
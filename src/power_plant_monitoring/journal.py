@@ -0,0 +1,374 @@
+"""Append-only journal of the raw input registers read from the inverters.
+
+Decoded samples lose the raw registers, so a decoding bug or a change of the
+register map can only be fixed for new data. The journal keeps the registers of
+every ``read_input_registers`` call, history can be decoded again with
+:meth:`JournalReader.decode`.
+
+Layout: one directory per UTC day and one file per register block, e.g.
+``journal/20240621/input_0_33.bin``. A file starts with a header (magic,
+version, start address, register count, start of the day) followed by
+fixed-size records::
+
+    time       uint32   milliseconds since the start of the day
+    unit       uint8    Modbus unit ID
+    flags      uint8    FLAG_ERROR if the read failed (registers are 0)
+    registers  uint16[count]
+
+Fixed-size records let the reader memory-map a file as a NumPy structured array
+and decode thousands of frames per field with a few vectorized operations.
+
+A frame identical to the previous one of the same unit and block is skipped
+(the reader carries the last frame forward), which keeps a day of 1 s polling
+at a few MB. The first frame of every file is always written, and an unchanged
+frame at least every ``keepalive`` seconds, so a static period (an inverter
+sitting in a fault) still has rows to tell it from a gap in the recording.
+"""
+import calendar
+import logging
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from power_plant_monitoring.registers import GROWATT_INPUT_REGISTERS
+
+_logger = logging.getLogger(__name__)
+
+MAGIC = b"PPMJ"
+VERSION = 1
+#: magic, version, address, count, start of the day (epoch seconds)
+HEADER = struct.Struct("<4sHHHd")
+
+FLAG_ERROR = 1
+
+
+def frame_dtype(count: int) -> np.dtype:
+    """Record type of a block of ``count`` registers"""
+    return np.dtype(
+        [
+            ("time", "<u4"),
+            ("unit", "u1"),
+            ("flags", "u1"),
+            ("registers", "<u2", (count,)),
+        ]
+    )
+
+
+def _block_filename(address: int, count: int) -> str:
+    return f"input_{address}_{count}.bin"
+
+
+class FrameJournal:
+    """Records raw register frames, see the module documentation.
+
+    Frames are buffered and flushed every ``flush_interval`` seconds, on a new
+    day and in :meth:`close`. Units polled concurrently may share a journal.
+
+    Args:
+      directory (str): root directory of the journal
+      flush_interval (float): ...
+      skip_unchanged (bool): skip frames identical to the previous one
+      keepalive (float): seconds after which an unchanged frame is written
+          anyway
+    """
+
+    def __init__(
+        self,
+        directory: str = "journal",
+        flush_interval: float = 10.0,
+        skip_unchanged: bool = True,
+        keepalive: float = 60.0,
+    ):
+        self._directory: str = directory
+        self._flush_interval: float = flush_interval
+        self._skip_unchanged: bool = skip_unchanged
+        self._keepalive: float = keepalive
+        #: current UTC day number (epoch seconds // 86400)
+        self._day: int = None
+        #: (address, count) -> (file, struct.Struct) of the current day
+        self._files: dict = {}
+        #: (unit, address, count) -> registers of the last frame (None = error)
+        #: and when it was written
+        self._last: dict = {}
+        self._flushed: float = time.monotonic()
+        self._lock: threading.RLock = threading.RLock()
+        #: frames written / skipped as unchanged
+        self.written: int = 0
+        self.skipped: int = 0
+
+    def _rotate(self, day: int):
+        self.close()
+        self._day = day
+        self._last = {}
+
+    def _open(self, address: int, count: int):
+        day_start = self._day * 86400
+        path = os.path.join(
+            self._directory,
+            time.strftime("%Y%m%d", time.gmtime(day_start)),
+            _block_filename(address, count),
+        )
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        record = struct.Struct(f"<IBB{count}H")
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size >= HEADER.size:
+            # drop a record left incomplete by a crash
+            partial = (size - HEADER.size) % record.size
+            if partial:
+                _logger.warning(f"{path}: dropping {partial} bytes of a partial frame")
+                os.truncate(path, size - partial)
+            f = open(path, "ab")
+        else:
+            f = open(path, "wb")
+            f.write(HEADER.pack(MAGIC, VERSION, address, count, day_start))
+
+        entry = (f, record)
+        self._files[(address, count)] = entry
+        return entry
+
+    def record(
+        self, timestamp: float, unit: int, address: int, count: int, registers=None
+    ):
+        """Append a frame.
+
+        Args:
+          timestamp (float): time of the read (epoch seconds), use the same
+              timestamp for all blocks of one read cycle
+          unit (int): ...
+          address (int): start address of the block
+          count (int): number of registers of the block
+          registers (list[int]): the registers read, None if the read failed
+        """
+        with self._lock:
+            day = int(timestamp // 86400)
+            if day != self._day:
+                self._rotate(day)
+
+            key = (unit, address, count)
+            if registers is not None:
+                registers = tuple(registers)
+            last, written_at = self._last.get(key, (None, None))
+            unchanged = written_at is not None and last == registers
+            if (
+                self._skip_unchanged
+                and unchanged
+                and timestamp - written_at < self._keepalive
+            ):
+                self.skipped += 1
+                return
+            self._last[key] = (registers, timestamp)
+
+            entry = self._files.get((address, count))
+            f, record = entry if entry is not None else self._open(address, count)
+
+            millis = int((timestamp - day * 86400) * 1000)
+            if registers is None:
+                f.write(record.pack(millis, unit, FLAG_ERROR, *([0] * count)))
+            else:
+                f.write(record.pack(millis, unit, 0, *registers))
+            self.written += 1
+
+            if time.monotonic() - self._flushed >= self._flush_interval:
+                self.flush()
+
+    def flush(self):
+        for f, _ in self._files.values():
+            f.flush()
+        self._flushed = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            for f, _ in self._files.values():
+                f.close()
+            self._files = {}
+
+
+def decode_frames(frames: np.ndarray, address: int, layout=GROWATT_INPUT_REGISTERS):
+    """Decode the fields of ``layout`` contained in a block of frames.
+
+    Args:
+      frames (np.ndarray): records of :func:`frame_dtype`
+      address (int): start address of the block
+      layout (tuple[RegisterField]): ...
+
+    Returns:
+      dict[str, np.ndarray]: field name -> physical values (float64)
+    """
+    registers = frames["registers"]
+    count = registers.shape[1] if registers.ndim == 2 else 0
+
+    columns = {}
+    for field in layout:
+        offset = field.address - address
+        if offset < 0 or offset + field.words > count:
+            continue
+
+        raw = registers[:, offset].astype(np.uint32)
+        if field.words == 2:
+            raw = (raw << 16) | registers[:, offset + 1]
+        columns[field.name] = raw / field.scale
+    return columns
+
+
+class JournalReader:
+    """Memory-maps and decodes a journal written by :class:`FrameJournal`.
+
+    Args:
+      directory (str): root directory of the journal
+    """
+
+    def __init__(self, directory: str = "journal"):
+        self._directory: str = directory
+
+    def days(self) -> list[str]:
+        """The recorded UTC days as ``YYYYMMDD``"""
+        if not os.path.isdir(self._directory):
+            return []
+        return sorted(
+            name
+            for name in os.listdir(self._directory)
+            if len(name) == 8 and name.isdigit()
+        )
+
+    def blocks(self, day: str) -> list[tuple]:
+        """The recorded blocks of a day as (address, count)"""
+        blocks = []
+        for name in os.listdir(os.path.join(self._directory, day)):
+            kind, _, rest = name.partition("_")
+            if kind == "input" and name.endswith(".bin"):
+                address, _, count = rest[:-4].partition("_")
+                blocks.append((int(address), int(count)))
+        return sorted(blocks)
+
+    def frames(self, day: str, address: int, count: int):
+        """Timestamps and records of a block of a day.
+
+        Returns:
+          tuple[np.ndarray, np.ndarray]: timestamps (epoch seconds) and the
+          memory-mapped records (:func:`frame_dtype`)
+        """
+        path = os.path.join(self._directory, day, _block_filename(address, count))
+        with open(path, "rb") as f:
+            magic, version, file_address, file_count, day_start = HEADER.unpack(
+                f.read(HEADER.size)
+            )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a journal file (version {VERSION})")
+        if (file_address, file_count) != (address, count):
+            raise ValueError(f"{path} contains block {file_address}/{file_count}")
+
+        dtype = frame_dtype(count)
+        records = (os.path.getsize(path) - HEADER.size) // dtype.itemsize
+        if records == 0:
+            return np.empty(0), np.empty(0, dtype)
+
+        frames = np.memmap(
+            path, dtype=dtype, mode="r", offset=HEADER.size, shape=(records,)
+        )
+        return day_start + frames["time"] / 1000.0, frames
+
+    def decode(
+        self,
+        start: float = None,
+        end: float = None,
+        unit: int = None,
+        layout=GROWATT_INPUT_REGISTERS,
+    ) -> dict:
+        """Decode the journal into columns.
+
+        There is one row per successful frame of the first block (the lowest
+        start address) in ``[start, end)``. The other blocks contribute their
+        last frame at or before the row (frames are skipped while unchanged),
+        NaN if there is none or it was a failed read.
+
+        Args:
+          start (float): epoch seconds, inclusive
+          end (float): epoch seconds, exclusive
+          unit (int): only this unit, all units if None
+          layout (tuple[RegisterField]): ...
+
+        Returns:
+          dict[str, np.ndarray]: ``timestamp``, ``unit`` and one column per field
+        """
+        parts = []
+        for day in self.days():
+            day_start = calendar.timegm(time.strptime(day, "%Y%m%d"))
+            if start is not None and day_start + 86400 <= start:
+                continue
+            if end is not None and day_start >= end:
+                continue
+            parts.append(self._decode_day(day, start, end, unit, layout))
+
+        parts = [part for part in parts if part]
+        if not parts:
+            return {"timestamp": np.empty(0), "unit": np.empty(0, np.uint8)}
+
+        names = list(dict.fromkeys(name for part in parts for name in part))
+        return {
+            name: np.concatenate(
+                [
+                    part[name]
+                    if name in part
+                    else np.full(len(part["timestamp"]), np.nan)
+                    for part in parts
+                ]
+            )
+            for name in names
+        }
+
+    def _decode_day(self, day, start, end, unit, layout) -> dict:
+        blocks = self.blocks(day)
+        if not blocks:
+            return {}
+
+        first, *others = blocks
+        timestamps, frames = self.frames(day, *first)
+        mask = frames["flags"] == 0 if len(frames) else np.zeros(0, bool)
+        if start is not None:
+            mask &= timestamps >= start
+        if end is not None:
+            mask &= timestamps < end
+        if unit is not None:
+            mask &= frames["unit"] == unit
+
+        rows = frames[mask]
+        row_times = timestamps[mask]
+        row_units = rows["unit"]
+        columns = {"timestamp": row_times, "unit": np.array(row_units)}
+        columns.update(decode_frames(rows, first[0], layout))
+
+        for address, count in others:
+            block_times, block_frames = self.frames(day, address, count)
+            decoded = decode_frames(block_frames, address, layout)
+            if not decoded:
+                continue
+
+            failed = (
+                block_frames["flags"] != 0
+                if len(block_frames)
+                else np.zeros(0, bool)
+            )
+            result = {name: np.full(len(rows), np.nan) for name in decoded}
+            for block_unit in np.unique(row_units):
+                selected = np.flatnonzero(block_frames["unit"] == block_unit)
+                targets = np.flatnonzero(row_units == block_unit)
+                # the journal is appended in time order
+                index = (
+                    np.searchsorted(
+                        block_times[selected], row_times[targets], side="right"
+                    )
+                    - 1
+                )
+                valid = index >= 0
+                source = selected[index[valid]]
+                valid_targets = targets[valid]
+                ok = ~failed[source]
+                for name, values in decoded.items():
+                    result[name][valid_targets[ok]] = values[source[ok]]
+            columns.update(result)
+
+        return columns
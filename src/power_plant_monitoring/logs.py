@@ -0,0 +1,179 @@
+"""Asynchronous logging pipeline.
+
+The root logger only gets a queue handler: the calling thread creates the
+record and puts it into a queue, a listener thread formats it and writes it to
+stdout and the rotating log file. Records are handed over unformatted, so
+``_logger.debug("Read %s in %.3f s", block, elapsed)`` costs a level check when
+DEBUG is off and a queue put when it is on, the formatting happens on the
+listener thread.
+
+Repeated messages are rate-limited before they are queued
+(:class:`RateLimitFilter`): an inverter that is offline reports the same error
+every poll, only the first few per period are written, followed by a count of
+the suppressed ones. Records can be written as JSON lines
+(:class:`JsonFormatter`) for log shippers.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = (
+    "%(asctime)s.%(msecs)03d %(levelname)s {%(module)s} [%(funcName)s] %(message)s"
+)
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets at most ``burst`` records per ``period`` seconds pass for each
+    logger, level and message template.
+
+    The first record passing after a suppression carries the number of
+    suppressed records as ``record.suppressed``.
+
+    Args:
+      period (float): seconds
+      burst (int): records per period
+      clock: returns the current time in seconds
+    """
+
+    #: windows kept before the expired ones are pruned
+    _MAX_WINDOWS = 1000
+
+    def __init__(self, period: float = 60.0, burst: int = 5, clock=time.monotonic):
+        logging.Filter.__init__(self)
+        self._period: float = period
+        self._burst: int = burst
+        self._clock = clock
+        #: key -> [start of the window, records passed, records suppressed]
+        self._windows: dict = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # the template, not the formatted message: "%s" messages with changing
+        # arguments count as the same message (exceptions by their type)
+        msg = record.msg if isinstance(record.msg, str) else type(record.msg)
+        key = (record.name, record.levelno, msg)
+        now = self._clock()
+
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self._period:
+            if len(self._windows) >= self._MAX_WINDOWS:
+                self._prune(now)
+            if window is not None and window[2]:
+                record.suppressed = window[2]
+            self._windows[key] = [now, 1, 0]
+            return True
+
+        if window[1] < self._burst:
+            window[1] += 1
+            return True
+
+        window[2] += 1
+        return False
+
+    def _prune(self, now: float):
+        for key, window in list(self._windows.items()):
+            if now - window[0] >= self._period:
+                del self._windows[key]
+
+
+class TextFormatter(logging.Formatter):
+    """The classic format plus the number of suppressed repetitions"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = logging.Formatter.format(self, record)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            text += f" [{suppressed} similar messages suppressed]"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": f"{self.formatTime(record, DATE_FORMAT)}.{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.processName,
+            "thread": record.threadName,
+            "function": record.funcName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            data["suppressed"] = suppressed
+        return json.dumps(data, default=str)
+
+
+class _UnformattedQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the queue stays inside the process, the listener thread formats the
+        # record (QueueHandler.prepare would format it on the calling thread)
+        return record
+
+
+def configure_logging(
+    level: int = logging.WARNING,
+    filename: str = "log/power_plant_monitoring.log",
+    stdout: bool = True,
+    json_format: bool = False,
+    rate_limit: tuple = (60.0, 5),
+) -> QueueListener:
+    """Route all logging through a queue to a listener thread.
+
+    Args:
+      level (int): level of the root logger
+      filename (str): rotating log file, None for no file
+      stdout (bool): also write to stdout
+      json_format (bool): write JSON lines instead of text
+      rate_limit (tuple): (period in seconds, burst), None for no limit
+
+    Returns:
+      QueueListener: the running listener, it is stopped (and the queue
+      drained) at exit
+    """
+    if json_format:
+        formatter = JsonFormatter()
+    else:
+        formatter = TextFormatter(LOG_FORMAT, DATE_FORMAT)
+
+    handlers = []
+    if stdout:
+        handlers.append(logging.StreamHandler(sys.stdout))
+    if filename:
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        handlers.append(
+            RotatingFileHandler(filename, maxBytes=10000 * 1000, backupCount=10)
+        )
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    queue_handler = _UnformattedQueueHandler(records)
+    if rate_limit:
+        queue_handler.addFilter(RateLimitFilter(*rate_limit))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_listener, listener)
+    return listener
+
+
+def stop_listener(listener: QueueListener):
+    """Write the queued records and stop the listener (if still running)"""
+    if listener._thread is not None:
+        listener.stop()
@@ -0,0 +1,256 @@
+"""Self-instrumentation metrics in Prometheus text format.
+
+Recording never takes a lock: counters and histograms are sharded per thread
+(each shard is only written by its own thread, so the ``+=`` cannot race) and
+the shards are summed up when the metrics are rendered. Gauges are plain
+assignments or callbacks evaluated at render time. Recording a value costs
+roughly a dictionary lookup and an addition, which is cheap enough to be called
+thousands of times per second.
+
+Example::
+
+    _RTT = REGISTRY.histogram("modbus_rtt_seconds", "Modbus round-trip", ["block"])
+    _RTT.labels("input_0_33").observe(0.012)
+"""
+import bisect
+import logging
+import math
+import threading
+
+_logger = logging.getLogger(__name__)
+
+#: default histogram buckets in seconds (100 µs .. 10 s)
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class _CounterValue:
+    __slots__ = ("_shards",)
+
+    def __init__(self):
+        #: thread id -> [value]
+        self._shards: dict = {}
+
+    def inc(self, amount: float = 1):
+        try:
+            self._shards[threading.get_ident()][0] += amount
+        except KeyError:
+            self._shards[threading.get_ident()] = [amount]
+
+    @property
+    def value(self) -> float:
+        return sum(shard[0] for shard in list(self._shards.values()))
+
+    def samples(self, name, labels):
+        yield name + "_total", labels, self.value
+
+
+class _GaugeValue:
+    __slots__ = ("_value", "_function")
+
+    def __init__(self):
+        self._value: float = 0
+        self._function = None
+
+    def set(self, value: float):
+        self._value = value
+
+    def set_function(self, function):
+        """Evaluate ``function()`` whenever the gauge is read"""
+        self._function = function
+
+    @property
+    def value(self) -> float:
+        return self._function() if self._function is not None else self._value
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class _HistogramValue:
+    __slots__ = ("_buckets", "_shards")
+
+    def __init__(self, buckets):
+        self._buckets: tuple = buckets
+        #: thread id -> [count per bucket (last = +Inf)..., sum]
+        self._shards: dict = {}
+
+    def observe(self, value: float):
+        try:
+            shard = self._shards[threading.get_ident()]
+        except KeyError:
+            shard = [0] * (len(self._buckets) + 2)
+            self._shards[threading.get_ident()] = shard
+
+        shard[bisect.bisect_left(self._buckets, value)] += 1
+        shard[-1] += value
+
+    def snapshot(self):
+        """Returns the cumulative bucket counts, the sum and the count"""
+        totals = [0] * (len(self._buckets) + 2)
+        for shard in list(self._shards.values()):
+            for i, value in enumerate(shard):
+                totals[i] += value
+
+        cumulative = []
+        running = 0
+        for count in totals[:-1]:
+            running += count
+            cumulative.append(running)
+
+        return cumulative, totals[-1], running
+
+    def samples(self, name, labels):
+        cumulative, total, count = self.snapshot()
+        for bound, value in zip(self._buckets + (math.inf,), cumulative):
+            le = "+Inf" if bound == math.inf else repr(bound)
+            yield name + "_bucket", labels + (("le", le),), value
+        yield name + "_sum", labels, total
+        yield name + "_count", labels, count
+
+
+class Metric:
+    """A metric family, children are created per label value combination."""
+
+    def __init__(
+        self, name: str, help: str, kind: str, labelnames=(), buckets=DEFAULT_BUCKETS
+    ):
+        self._name: str = name
+        self._help: str = help
+        self._kind: str = kind
+        self._labelnames: tuple = tuple(labelnames)
+        self._buckets: tuple = tuple(buckets)
+        self._children: dict = {}
+        #: label values as passed to :meth:`labels` (e.g. an int unit) -> child
+        self._lookup: dict = {}
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def _create_child(self):
+        if self._kind == "counter":
+            return _CounterValue()
+        if self._kind == "gauge":
+            return _GaugeValue()
+        return _HistogramValue(self._buckets)
+
+    def labels(self, *values):
+        """The child for the given label values (cache it on hot paths)"""
+        try:
+            return self._lookup[values]
+        except KeyError:
+            pass
+
+        if len(values) != len(self._labelnames):
+            raise ValueError(
+                f"{self._name} expects labels {self._labelnames}, got {values}"
+            )
+
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            # setdefault keeps the first child if two threads race here
+            child = self._children.setdefault(key, self._create_child())
+        # the next call with the same values is a single lookup
+        self._lookup[values] = child
+        return child
+
+    # shortcuts for metrics without labels
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def set_function(self, function):
+        self.labels().set_function(function)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self._name} {self._help}",
+            f"# TYPE {self._name} {self._kind}",
+        ]
+        for values, child in list(self._children.items()):
+            labels = tuple(zip(self._labelnames, values))
+            try:
+                for name, sample_labels, value in child.samples(self._name, labels):
+                    lines.append(f"{name}{_format_labels(sample_labels)} {value}")
+            except Exception as ex:
+                _logger.warning(f"Metric {self._name}{values} failed: {ex}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class MetricsRegistry:
+    """Creates (or returns the existing) metrics by name."""
+
+    def __init__(self):
+        self._metrics: dict = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def _get(self, name, help, kind, labelnames, buckets=DEFAULT_BUCKETS) -> Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = Metric(name, help, kind, labelnames, buckets)
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames=()) -> Metric:
+        return self._get(name, help, "counter", labelnames)
+
+    def gauge(self, name: str, help: str, labelnames=()) -> Metric:
+        return self._get(name, help, "gauge", labelnames)
+
+    def histogram(
+        self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS
+    ) -> Metric:
+        return self._get(name, help, "histogram", labelnames, buckets)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+#: the process wide registry used by the instrumented modules
+REGISTRY = MetricsRegistry()
+
+
+def add_metrics_route(server, registry: MetricsRegistry = REGISTRY):
+    """Register ``/metrics`` on an :class:`~.http_api.HttpApiServer`"""
+
+    def metrics(query):
+        return 200, "text/plain; version=0.0.4", registry.render().encode()
+
+    server.add_route("/metrics", metrics)
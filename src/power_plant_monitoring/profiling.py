@@ -0,0 +1,245 @@
+"""On-demand profiling of the running daemon.
+
+Nothing is measured until a capture is triggered, either by a signal
+(``SIGUSR1``: CPU, ``SIGUSR2``: memory, see :func:`install_signal_handlers`) or
+over HTTP (``/profile?kind=cpu&seconds=10``, see :func:`add_profiling_routes`).
+A capture runs on its own thread and writes its results to ``log/``:
+
+* ``cpu``: samples the stacks of all threads with :func:`sys._current_frames`
+  and writes them in collapsed ("flame graph") format plus a summary of the
+  hottest functions,
+* ``memory``: traces allocations with :mod:`tracemalloc` for the given time and
+  writes the top allocators,
+* both also write the stage timings recorded by :func:`span` meanwhile.
+
+While no capture is active :func:`span` returns a shared no-op context manager,
+so the hooks can stay in the hot loop in production.
+"""
+import collections
+import contextlib
+import datetime
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+
+_logger = logging.getLogger(__name__)
+
+_NULL_SPAN = contextlib.nullcontext()
+
+#: longest capture accepted by the ``/profile`` route (seconds)
+MAX_CAPTURE_SECONDS = 300.0
+
+#: the recorder of the active capture, None while no capture is running
+_recorder = None
+
+
+class _SpanRecorder:
+    def __init__(self):
+        #: name -> [count, total seconds, max seconds]
+        self.spans: dict = collections.defaultdict(lambda: [0, 0.0, 0.0])
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            entry = self.spans[name]
+            entry[0] += 1
+            entry[1] += elapsed
+            if elapsed > entry[2]:
+                entry[2] = elapsed
+
+    def report(self) -> list[str]:
+        lines = [f"{'span':<24} {'count':>8} {'mean ms':>10} {'max ms':>10}"]
+        for name, (count, total, maximum) in sorted(self.spans.items()):
+            lines.append(
+                f"{name:<24} {count:>8} {total / count * 1000:>10.3f} "
+                f"{maximum * 1000:>10.3f}"
+            )
+        return lines
+
+
+def span(name: str):
+    """Time the enclosed block as stage ``name`` while a capture is running"""
+    recorder = _recorder
+    if recorder is None:
+        return _NULL_SPAN
+    return recorder.span(name)
+
+
+class Profiler:
+    """Runs one capture at a time and writes the results to ``directory``.
+
+    Args:
+      directory (str): output directory
+      sample_interval (float): seconds between two stack samples
+      top (int): number of entries in the summaries
+    """
+
+    def __init__(
+        self, directory: str = "log", sample_interval: float = 0.005, top: int = 30
+    ):
+        self._directory: str = directory
+        self._sample_interval: float = sample_interval
+        self._top: int = top
+        self._busy: threading.Lock = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._busy.locked()
+
+    def _path(self, kind: str) -> str:
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        return os.path.join(self._directory, f"profile-{stamp}-{kind}.txt")
+
+    def trigger(self, kind: str, seconds: float) -> str:
+        """Start a capture in the background.
+
+        Args:
+          kind (str): ``cpu`` or ``memory``
+          seconds (float): duration of the capture
+
+        Returns:
+          str: the file the results will be written to, None if another
+          capture is still running
+        """
+        if kind not in ("cpu", "memory"):
+            raise ValueError(f"Unknown profile kind {kind}")
+
+        if not self._busy.acquire(blocking=False):
+            _logger.warning(f"Profiling ({kind}) ignored, a capture is running")
+            return None
+
+        path = self._path(kind)
+        thread = threading.Thread(
+            target=self._capture,
+            args=(kind, seconds, path),
+            name=f"Profiler-{kind}",
+            daemon=True,
+        )
+        thread.start()
+        return path
+
+    def _capture(self, kind: str, seconds: float, path: str):
+        global _recorder
+
+        try:
+            _logger.info(f"Profiling ({kind}) for {seconds} s -> {path}")
+            recorder = _SpanRecorder()
+            _recorder = recorder
+            try:
+                if kind == "cpu":
+                    lines = self._sample_stacks(seconds)
+                else:
+                    lines = self._trace_allocations(seconds)
+            finally:
+                _recorder = None
+
+            os.makedirs(self._directory, exist_ok=True)
+            with open(path, "w") as f:
+                f.write("\n".join(lines + ["", "# spans"] + recorder.report()) + "\n")
+            _logger.info(f"Profiling ({kind}) written to {path}")
+        except Exception as ex:
+            _logger.error(f"Profiling ({kind}) failed: {ex}")
+        finally:
+            self._busy.release()
+
+    def _sample_stacks(self, seconds: float) -> list[str]:
+        own = threading.get_ident()
+        stacks = collections.Counter()
+        functions = collections.Counter()
+        samples = 0
+
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+                        f"{frame.f_lineno})"
+                    )
+                    frame = frame.f_back
+
+                if stack:
+                    functions[stack[0].rsplit(":", 1)[0] + ")"] += 1
+                    stacks[";".join([names.get(ident, str(ident))] + stack[::-1])] += 1
+            samples += 1
+            time.sleep(self._sample_interval)
+
+        lines = [f"# {samples} samples every {self._sample_interval * 1000:.1f} ms"]
+        lines.append("# top functions (self)")
+        for function, count in functions.most_common(self._top):
+            lines.append(f"{count / max(samples, 1):>8.1%}  {function}")
+        lines.append("")
+        lines.append("# collapsed stacks")
+        lines.extend(f"{stack} {count}" for stack, count in stacks.most_common())
+        return lines
+
+    def _trace_allocations(self, seconds: float) -> list[str]:
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(25)
+        try:
+            before = tracemalloc.take_snapshot()
+            time.sleep(seconds)
+            after = tracemalloc.take_snapshot()
+        finally:
+            if started:
+                tracemalloc.stop()
+
+        current = after.statistics("lineno")
+        grown = after.compare_to(before, "lineno")
+
+        lines = [f"# top {self._top} allocators"]
+        lines.extend(str(stat) for stat in current[: self._top])
+        lines.append("")
+        lines.append(f"# top {self._top} growth during the capture")
+        lines.extend(str(stat) for stat in grown[: self._top])
+        return lines
+
+
+def install_signal_handlers(profiler: Profiler, seconds: float = 30.0):
+    """``SIGUSR1`` captures CPU, ``SIGUSR2`` memory for ``seconds``"""
+    if not hasattr(signal, "SIGUSR1"):
+        _logger.info("Profiling signals are not available on this platform")
+        return
+
+    signal.signal(signal.SIGUSR1, lambda *_: profiler.trigger("cpu", seconds))
+    signal.signal(signal.SIGUSR2, lambda *_: profiler.trigger("memory", seconds))
+
+
+def add_profiling_routes(server, profiler: Profiler):
+    """Register ``/profile?kind=cpu|memory&seconds=10`` on an HttpApiServer"""
+    from power_plant_monitoring.http_api import HttpError, json_response
+
+    def profile(query):
+        try:
+            seconds = float(query.get("seconds", 10))
+        except ValueError:
+            raise HttpError(400, f"Invalid seconds {query['seconds']}") from None
+        # also rejects nan and inf
+        if not 0 < seconds <= MAX_CAPTURE_SECONDS:
+            raise HttpError(
+                400, f"seconds must be between 0 and {MAX_CAPTURE_SECONDS:.0f}"
+            )
+        try:
+            path = profiler.trigger(query.get("kind", "cpu"), seconds)
+        except ValueError as ex:
+            raise HttpError(400, str(ex)) from None
+        if path is None:
+            raise HttpError(409, "A capture is already running")
+        return json_response({"file": path})
+
+    server.add_route("/profile", profile)
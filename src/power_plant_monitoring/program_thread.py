@@ -6,8 +6,17 @@ import time
 from abc import ABC, abstractmethod
 from enum import Enum
 
+from power_plant_monitoring.metrics import REGISTRY
+
 _logger = logging.getLogger(__name__)
 
+_STATE = REGISTRY.gauge(
+    "program_thread_state", "1 = IDLE, 2 = RUNNING, 3 = STOPPING", ["thread"]
+)
+_TRANSITIONS = REGISTRY.counter(
+    "program_thread_transitions", "State changes of the threads", ["thread", "state"]
+)
+
 class ProgramState(Enum):
     IDLE = 1
     RUNNING = 2
@@ -55,6 +64,8 @@ class ProgramThread(ABC):
                 f"({self.name}) State changed: Prev. state = {self._state}, New state = {value}"
             )
             self._state = value
+            _STATE.labels(self.name).set(value.value)
+            _TRANSITIONS.labels(self.name, value.name).inc()
 
     @property
     def is_running(self):
@@ -117,6 +128,18 @@ class ProgramThread(ABC):
                 if self._ct is not None:
                     self._ct.set()
 
+    def join(self, timeout: float = None) -> bool:
+        """Wait until the thread has finished, including ``_stop_internal``
+        after :meth:`stop`
+
+        Returns:
+          bool: False if it is still running after ``timeout`` seconds
+        """
+        if self._ct is None:
+            # never started
+            return True
+        return self._thread_done.wait(timeout)
+
     def run(self, ct: threading.Event):
 
         try:
@@ -0,0 +1,101 @@
+"""Register layout of the Growatt inverter (Modbus RTU protocol V3.04).
+
+The layout mirrors what :meth:`Growatt.read` decodes, so tools that need to
+produce or consume raw registers (the simulator, the frame journal) do not have
+to repeat the addresses and scales.
+"""
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class RegisterField:
+    """A value stored in one (``words=1``) or two (high word first) registers.
+
+    The physical value is ``raw / scale``.
+    """
+
+    name: str
+    address: int
+    words: int = 1
+    scale: int = 10
+
+
+#: input register blocks read by :meth:`Growatt.read`, as (address, count)
+GROWATT_INPUT_BLOCKS = ((0, 33), (33, 8), (42, 2), (48, 16))
+
+GROWATT_INPUT_REGISTERS = (
+    RegisterField("StatusCode", 0, 1, 1),
+    RegisterField("Ppv", 1, 2),
+    RegisterField("Vpv1", 3),
+    RegisterField("PV1Curr", 4),
+    RegisterField("PV1Watt", 5, 2),
+    RegisterField("Vpv2", 7),
+    RegisterField("PV2Curr", 8),
+    RegisterField("PV2Watt", 9, 2),
+    RegisterField("Pac", 11, 2),
+    RegisterField("Fac", 13, 1, 100),
+    RegisterField("Vac1", 14),
+    RegisterField("Iac1", 15),
+    RegisterField("Pac1", 16, 2),
+    RegisterField("Vac2", 18),
+    RegisterField("Iac2", 19),
+    RegisterField("Pac2", 20, 2),
+    RegisterField("Vac3", 22),
+    RegisterField("Iac3", 23),
+    RegisterField("Pac3", 24, 2),
+    RegisterField("EnergyToday", 26, 2),
+    RegisterField("EnergyTotal", 28, 2),
+    RegisterField("TimeTotal", 30, 2, 2),
+    RegisterField("Temp", 32),
+    RegisterField("ISOFault", 33),
+    RegisterField("GFCIFault", 34, 1, 1),
+    RegisterField("DCIFault", 35, 1, 100),
+    RegisterField("VpvFault", 36),
+    RegisterField("VavFault", 37),
+    RegisterField("FacFault", 38, 1, 100),
+    RegisterField("TempFault", 39),
+    RegisterField("FaultCode", 40, 1, 1),
+    RegisterField("PBusV", 42),
+    RegisterField("NBusV", 43),
+    RegisterField("Epv1_today", 48, 2),
+    RegisterField("Epv1_total", 50, 2),
+    RegisterField("Epv2_today", 52, 2),
+    RegisterField("Epv2_total", 54, 2),
+    RegisterField("Epv_total", 56, 2),
+    RegisterField("Rac", 58, 2),
+    RegisterField("E_rac_today", 60, 2),
+    RegisterField("E_rac_total", 62, 2),
+)
+
+#: holding register read by :meth:`Growatt.read_info`
+GROWATT_MODBUS_VERSION = 73
+
+
+def encode(fields: dict, layout=GROWATT_INPUT_REGISTERS, size: int = 125) -> list:
+    """Encode the physical values in ``fields`` into a register table.
+
+    Fields missing in ``fields`` are left 0, values outside the range of their
+    registers are clamped.
+
+    Args:
+      fields (dict): field name -> physical value
+      layout (tuple[RegisterField]): ...
+      size (int): number of registers in the table
+
+    Returns:
+      list[int]: ``size`` register values
+    """
+    registers = [0] * size
+    for field in layout:
+        value = fields.get(field.name)
+        if value is None:
+            continue
+
+        limit = (1 << (16 * field.words)) - 1
+        raw = min(max(int(round(value * field.scale)), 0), limit)
+        if field.words == 2:
+            registers[field.address] = raw >> 16
+            registers[field.address + 1] = raw & 0xFFFF
+        else:
+            registers[field.address] = raw
+    return registers
@@ -0,0 +1,85 @@
+"""Name based lookup of the pluggable reader and sink classes.
+
+Entries are registered as ``"module:ClassName"`` strings, so looking up a name
+only imports the module that implements it (and whatever heavy dependencies that
+module pulls in), instead of importing every implementation up front.
+"""
+import importlib
+import logging
+
+from power_plant_monitoring.base import ConfigError
+
+_logger = logging.getLogger(__name__)
+
+
+class Registry:
+    """A mapping of snake_case names to lazily imported classes."""
+
+    def __init__(self, kind: str):
+        #: human readable kind of the registered classes, used in error messages
+        self._kind: str = kind
+        #: name -> class or "module:ClassName" reference
+        self._entries: dict = {}
+
+    @property
+    def kind(self):
+        return self._kind
+
+    def names(self) -> list[str]:
+        return sorted(self._entries)
+
+    def register(self, name: str, target):
+        """Register a class under ``name``.
+
+        Args:
+          name (str): the snake_case name used in the configuration
+          target (type | str): the class itself or a ``"module:ClassName"``
+              reference which is imported on first use
+        """
+        self._entries[name] = target
+
+    def get(self, name: str) -> type:
+        try:
+            target = self._entries[name]
+        except KeyError:
+            raise ConfigError(
+                f"Unknown {self._kind} '{name}', available: {', '.join(self.names())}"
+            ) from None
+
+        if isinstance(target, str):
+            module_name, _, class_name = target.partition(":")
+            _logger.debug(f"Importing {self._kind} '{name}' from {module_name}")
+            target = getattr(importlib.import_module(module_name), class_name)
+            self._entries[name] = target
+
+        return target
+
+    def create(self, name: str, *args, **kwargs):
+        return self.get(name)(*args, **kwargs)
+
+
+_forecast_module = "power_plant_monitoring.weather_forecast.weather_forecast_reader"
+
+#: weather forecast readers
+readers = Registry("reader")
+readers.register("basf_weather_forecast", f"{_forecast_module}:BasfWeatherForecast")
+readers.register(
+    "binance_reader_zh_gateway", f"{_forecast_module}:BinanceReaderZhGateway"
+)
+readers.register("binance_reader_gateway", f"{_forecast_module}:BinanceReaderGateway")
+readers.register("json_reader", f"{_forecast_module}:JsonReader")
+
+#: sample sinks
+sinks = Registry("sink")
+sinks.register("influxdb", "power_plant_monitoring.sinks:InfluxDbSink")
+
+#: alert transports
+transports = Registry("alert transport")
+transports.register("log", "power_plant_monitoring.alerting:LogTransport")
+transports.register("http", "power_plant_monitoring.alerting:HttpTransport")
+transports.register("telegram", "power_plant_monitoring.alerting:TelegramTransport")
+
+#: Modbus device drivers, created with (client, name, unit, journal=..., **options)
+drivers = Registry("device driver")
+drivers.register("growatt", "power_plant_monitoring.growatt:Growatt")
+drivers.register("modbus", "power_plant_monitoring.devices.driver:ModbusDriver")
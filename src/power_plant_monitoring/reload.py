@@ -0,0 +1,213 @@
+"""Live reload of the configuration file.
+
+The components built from the configuration - the poll intervals, the Modbus
+client of the port, the InfluxDB sink, the alert transport, the validation
+stage - are kept in :attr:`ConfigReloader.components`, each registered with the
+settings it is built from (:meth:`ConfigReloader.watch`). ``SIGHUP`` (or a
+changed file, if ``reload.watch_interval_sec`` is set) reloads the file and
+builds new components for the settings that changed. Only if all of them could
+be built the components are replaced - in one assignment, a reader sees either
+the old or the new configuration, never a mix. An invalid file or a component
+failing to build leaves everything as it was.
+
+Components whose settings did not change are kept, so the queues of the sample
+bus, the pending alerts and the open connections survive a reload. Settings no
+component is built from (e.g. ``growatt.mode`` or ``journal``) take effect on
+the next start, a change of them is logged.
+"""
+import logging
+import os
+import signal
+import threading
+
+from power_plant_monitoring.metrics import REGISTRY
+from power_plant_monitoring.program_thread import ProgramThread
+
+_logger = logging.getLogger(__name__)
+
+_RELOADS = REGISTRY.counter(
+    "config_reloads", "Configuration reloads by result", ["result"]
+)
+
+
+def _value(config, path: str):
+    """The value of a dotted ``path`` of ``config``, None if it is missing"""
+    view = config
+    for key in path.split("."):
+        view = view[key]
+    return view.get() if view.exists() else None
+
+
+def _leaves(value, prefix: str = "") -> dict:
+    """dotted path -> value of the scalars and lists of a nested dict"""
+    if not isinstance(value, dict):
+        return {prefix: value}
+    leaves = {}
+    for key, item in value.items():
+        leaves.update(_leaves(item, f"{prefix}.{key}" if prefix else str(key)))
+    return leaves
+
+
+class _Watch:
+    def __init__(self, key: str, paths: tuple, build, swap):
+        self.key: str = key
+        self.paths: tuple = paths
+        self.build = build
+        self.swap = swap
+
+    def covers(self, path: str) -> bool:
+        return any(path == p or path.startswith(p + ".") for p in self.paths)
+
+
+class ConfigReloader(ProgramThread):
+    """Reloads the configuration on request or when the file changes, see the
+    module documentation.
+
+    Args:
+      load: ``load()`` reads the configuration file (``confuse.Configuration``)
+      config: the configuration loaded at the start
+      path (str): the file watched for changes
+      watch_interval (float): seconds between checks of the file's
+          modification time, None to reload on :meth:`request` only
+    """
+
+    def __init__(self, load, config, path: str = None, watch_interval: float = None):
+        ProgramThread.__init__(self, "ConfigReloader")
+
+        self._load = load
+        self._config = config
+        self._path: str = path
+        self._watch_interval: float = watch_interval
+        self._watches: list = []
+        self._requested: threading.Event = threading.Event()
+        self._mtime: float = self._modified()
+        #: key -> component, replaced as a whole by a reload
+        self.components: dict = {}
+
+    def watch(self, key: str, paths, build, swap=None):
+        """Build component ``key`` now and again on every reload that changes
+        one of ``paths``.
+
+        Args:
+          key (str): key of :attr:`components`
+          paths (tuple[str]): dotted settings, e.g. ``"growatt.interval_sec"``
+              or a whole section ``"influxdb"``
+          build: ``build(config, components)`` returns the component, it may
+              use the components registered before it (already rebuilt if
+              they changed too) and raises if the settings are invalid
+          swap: ``swap(old, new)`` is called once the new component is live,
+              e.g. to close the old one
+
+        Returns:
+          the component
+        """
+        watch = _Watch(key, tuple(paths), build, swap)
+        self.components = dict(
+            self.components, **{key: build(self._config, self.components)}
+        )
+        self._watches.append(watch)
+        return self.components[key]
+
+    def request(self):
+        """Reload at once (safe to call from a signal handler)"""
+        self._requested.set()
+
+    def reload(self) -> bool:
+        """Load the file and apply the changed settings
+
+        Returns:
+          bool: False if the configuration was rejected
+        """
+        try:
+            config = self._load()
+            changed = self._changed(config)
+            built = self._build(config, changed)
+        except Exception as err:
+            _RELOADS.labels("rejected").inc()
+            _logger.error("Configuration rejected, keeping the current one: %s", err)
+            return False
+
+        old, self.components = self.components, dict(self.components, **built)
+        self._config = config
+        for watch in self._watches:
+            if watch.key in built and watch.swap is not None:
+                try:
+                    watch.swap(old[watch.key], built[watch.key])
+                except Exception as err:
+                    _logger.error("Replacing %s failed: %s", watch.key, err)
+
+        _RELOADS.labels("applied").inc()
+        _logger.info(
+            "Configuration reloaded, replaced: %s", ", ".join(built) or "nothing"
+        )
+        return True
+
+    def _changed(self, config) -> list:
+        """The keys of the watches whose settings changed, logs the changes
+        applied on the next start"""
+        changed = [
+            watch.key
+            for watch in self._watches
+            if any(_value(config, p) != _value(self._config, p) for p in watch.paths)
+        ]
+
+        before, after = _leaves(self._config.get() or {}), _leaves(config.get() or {})
+        paths = sorted(
+            path
+            for path in before.keys() | after.keys()
+            if before.get(path) != after.get(path)
+            and not any(watch.covers(path) for watch in self._watches)
+        )
+        if paths:
+            _logger.warning(
+                "Changed settings applied on the next start: %s", ", ".join(paths)
+            )
+        return changed
+
+    def _build(self, config, changed: list) -> dict:
+        """The new components of the ``changed`` watches, all or none"""
+        built = {}
+        try:
+            for watch in self._watches:
+                if watch.key in changed:
+                    components = dict(self.components, **built)
+                    built[watch.key] = watch.build(config, components)
+        except Exception:
+            for component in built.values():
+                close = getattr(component, "close", None)
+                if close is not None:
+                    close()
+            raise
+        return built
+
+    def _modified(self) -> float:
+        try:
+            return os.path.getmtime(self._path) if self._path else None
+        except OSError:
+            return None
+
+    def _run_internal(self, ct: threading.Event):
+        timeout = min(self._watch_interval or 0.5, 0.5)
+        waited = 0.0
+        while not ct.is_set():
+            if not self._requested.wait(timeout):
+                waited += timeout
+                if self._watch_interval is None or waited < self._watch_interval:
+                    continue
+                waited = 0.0
+                modified = self._modified()
+                if modified == self._mtime:
+                    continue
+                self._mtime = modified
+                _logger.info("%s changed", self._path)
+            else:
+                self._requested.clear()
+                _logger.info("Reload requested")
+                self._mtime = self._modified()
+            self.reload()
+
+
+def install_reload_signal(reloader: ConfigReloader):
+    """Reload on ``SIGHUP`` (``kill -HUP <pid>``, ``systemctl reload``)"""
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda *_: reloader.request())
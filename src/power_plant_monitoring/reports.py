@@ -0,0 +1,338 @@
+"""Daily and monthly yield reports computed from the frame journal.
+
+The reports are computed from the raw registers kept by the
+:class:`~power_plant_monitoring.journal.FrameJournal`, not from InfluxDB. The
+journal is decoded a month at a time into memory-mapped NumPy columns
+(:meth:`JournalReader.decode`) and every figure is a vectorized reduction over
+the rows of a day (``np.add.reduceat`` and friends), so a year of 1 Hz samples
+is reported in seconds.
+
+Per UTC day and inverter:
+
+* ``yield_kwh`` - the increase of ``EnergyToday`` (the counter resets once a
+  day, wherever the reset falls in the UTC day)
+* ``peak_pac_w`` and ``peak_time`` - maximum ``Pac`` and when it was reached
+* ``epv1_kwh``, ``epv2_kwh`` and ``epv1_share`` - the split between the strings
+* ``operating_hours`` - the increase of ``TimeTotal``
+* ``fault_hours`` and ``faults`` - time in ``Fault`` or with a ``FaultCode``
+  and the number of faults starting that day
+* ``specific_yield`` - kWh per kWp of the inverter's ``peak_power_kwp``
+* ``expected_yield`` and ``performance_ratio`` - the baseline in kWh/kWp (the
+  monthly ``expected_yield`` of the configuration spread over the days of the
+  month) and the specific yield relative to it
+
+A monthly report sums the days that were recorded, so the ratio of a partial
+month compares like with like. Figures that cannot be computed (no kWp or
+baseline configured) are NaN, empty in CSV and ``null`` in JSON.
+"""
+import calendar
+import csv
+import datetime
+import json
+import logging
+
+import numpy as np
+
+from power_plant_monitoring.registers import GROWATT_INPUT_REGISTERS
+
+_logger = logging.getLogger(__name__)
+
+#: fields decoded from the journal
+REPORT_FIELDS = (
+    "Pac",
+    "EnergyToday",
+    "Epv1_today",
+    "Epv2_today",
+    "TimeTotal",
+    "StatusCode",
+    "FaultCode",
+)
+
+_LAYOUT = tuple(
+    field for field in GROWATT_INPUT_REGISTERS if field.name in REPORT_FIELDS
+)
+
+#: StatusCode of an inverter in fault
+FAULT_STATUS = 3
+
+#: columns of the reports, in output order
+COLUMNS = (
+    "date",
+    "unit",
+    "yield_kwh",
+    "peak_pac_w",
+    "peak_time",
+    "epv1_kwh",
+    "epv2_kwh",
+    "epv1_share",
+    "operating_hours",
+    "fault_hours",
+    "faults",
+    "specific_yield",
+    "expected_yield",
+    "performance_ratio",
+)
+
+#: columns summed over the days of a month
+_SUMMED = (
+    "yield_kwh",
+    "epv1_kwh",
+    "epv2_kwh",
+    "operating_hours",
+    "fault_hours",
+    "faults",
+    "expected_yield",
+)
+
+
+def _fill(values: np.ndarray, previous: float) -> np.ndarray:
+    """``values`` with every NaN replaced by the last value before it"""
+    valid = ~np.isnan(values)
+    if valid.all():
+        return values
+    index = np.maximum.accumulate(np.where(valid, np.arange(len(values)), -1))
+    filled = values[np.maximum(index, 0)]
+    filled[index < 0] = np.nan if previous is None else previous
+    return filled
+
+
+def _increments(values: np.ndarray, previous: float, daily: bool) -> np.ndarray:
+    """The increase of a counter at every row.
+
+    Args:
+      values (np.ndarray): the counter, NaN where unknown
+      previous (float): last value before the rows, None if there is none
+      daily (bool): the counter restarts at 0 once a day (``EnergyToday``),
+          a lifetime counter (``TimeTotal``) only ever increases
+    """
+    values = _fill(values, previous)
+    if previous is None:
+        previous = 0.0 if daily else values[0]
+    steps = np.diff(values, prepend=previous)
+    # a daily counter fell back to 0 and counted ``value`` since
+    steps = np.where(steps < 0, values, steps) if daily else np.maximum(steps, 0)
+    return np.nan_to_num(steps)
+
+
+def _last(values: np.ndarray, previous: float) -> float:
+    """The last known value of a column, ``previous`` if there is none"""
+    known = values[~np.isnan(values)]
+    return float(known[-1]) if len(known) else previous
+
+
+def _segment_argmax(values: np.ndarray, starts: np.ndarray) -> tuple:
+    """Maximum of every segment starting at ``starts`` and the row of its first
+    occurrence (NaN is never the maximum unless a segment is all NaN)"""
+    values = np.where(np.isnan(values), -np.inf, values)
+    peaks = np.maximum.reduceat(values, starts)
+    segment = np.repeat(np.arange(len(starts)), np.diff(starts, append=len(values)))
+    hits = np.flatnonzero(values == peaks[segment])
+    _, first = np.unique(segment[hits], return_index=True)
+    return np.where(np.isinf(peaks), np.nan, peaks), hits[first]
+
+
+def _divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+
+class ReportEngine:
+    """Computes the reports of the module documentation from a journal.
+
+    Args:
+      reader (JournalReader): the journal
+      peak_power_kwp (float | dict): kWp of the inverters, or unit -> kWp
+      expected_yield (list[float]): the 12 monthly kWh/kWp of the baseline,
+          e.g. from PVGIS for the plant's location and orientation
+      max_gap (float): longest interval (seconds) a sample represents, the
+          journal has no rows while the inverter is off; keep it above the
+          ``keepalive`` of the journal, which writes unchanged frames at least
+          that often
+    """
+
+    def __init__(
+        self,
+        reader,
+        peak_power_kwp=None,
+        expected_yield: list = None,
+        max_gap: float = 300.0,
+    ):
+        if expected_yield is not None and len(expected_yield) != 12:
+            raise ValueError("expected_yield needs one value per month")
+        self._reader = reader
+        self._kwp = peak_power_kwp
+        self._expected: np.ndarray = (
+            np.asarray(expected_yield, float)
+            if expected_yield is not None
+            else np.full(12, np.nan)
+        )
+        self._max_gap: float = max_gap
+
+    def _peak_power(self, units: np.ndarray) -> np.ndarray:
+        if isinstance(self._kwp, dict):
+            return np.array([self._kwp.get(int(unit), np.nan) for unit in units], float)
+        return np.full(len(units), np.nan if self._kwp is None else self._kwp, float)
+
+    def daily(self, start: datetime.date, end: datetime.date) -> dict:
+        """The daily report of the UTC days ``[start, end]``
+
+        Returns:
+          dict[str, np.ndarray]: the :data:`COLUMNS`, ``date`` as
+          ``datetime64[D]``, ``peak_time`` as epoch seconds, one row per day
+          and unit in time order
+        """
+        parts, carried = [], {}
+        month = datetime.date(start.year, start.month, 1)
+        while month <= end:
+            following = (month + datetime.timedelta(days=32)).replace(day=1)
+            chunk_start = max(month, start)
+            chunk_end = min(following, end + datetime.timedelta(days=1))
+            columns = self._reader.decode(
+                calendar.timegm(chunk_start.timetuple()),
+                calendar.timegm(chunk_end.timetuple()),
+                layout=_LAYOUT,
+            )
+            for unit in np.unique(columns["unit"]):
+                selected = columns["unit"] == unit
+                unit_columns = {
+                    name: values[selected] for name, values in columns.items()
+                }
+                state = carried.setdefault(int(unit), {})
+                parts.append(self._days(int(unit), unit_columns, state))
+            month = following
+
+        if not parts:
+            return {name: np.empty(0) for name in COLUMNS}
+        report = {
+            name: np.concatenate([part[name] for part in parts]) for name in COLUMNS
+        }
+        order = np.lexsort((report["unit"], report["date"]))
+        return {name: values[order] for name, values in report.items()}
+
+    def _days(self, unit: int, rows: dict, state: dict) -> dict:
+        """The daily figures of the rows of a unit (in time order), ``state``
+        carries the last values to the next call"""
+        timestamps = rows["timestamp"]
+        day = (timestamps // 86400).astype(np.int64)
+        starts = np.flatnonzero(np.diff(day, prepend=-1))
+        n = len(starts)
+
+        def total(values):
+            return np.add.reduceat(values, starts)
+
+        def counter(name, daily=True):
+            steps = _increments(rows[name], state.get(name), daily)
+            state[name] = _last(rows[name], state.get(name))
+            return total(steps)
+
+        peaks, peak_rows = _segment_argmax(rows["Pac"], starts)
+        report = {
+            "date": day[starts].astype("datetime64[D]"),
+            "unit": np.full(n, unit),
+            "yield_kwh": counter("EnergyToday"),
+            "peak_pac_w": peaks,
+            "peak_time": np.where(np.isnan(peaks), np.nan, timestamps[peak_rows]),
+            "epv1_kwh": counter("Epv1_today"),
+            "epv2_kwh": counter("Epv2_today"),
+            "operating_hours": counter("TimeTotal", daily=False) / 3600.0,
+        }
+
+        # a row lasts until the next one, at most max_gap
+        durations = np.clip(np.diff(timestamps, append=timestamps[-1]), 0, None)
+        durations = np.minimum(durations, self._max_gap)
+        with np.errstate(invalid="ignore"):
+            faulty = (rows["StatusCode"] == FAULT_STATUS) | (rows["FaultCode"] > 0)
+        before = np.concatenate(([state.get("faulty", False)], faulty[:-1]))
+        state["faulty"] = bool(faulty[-1])
+        report["fault_hours"] = total(durations * faulty) / 3600.0
+        report["faults"] = total((faulty & ~before).astype(np.int64))
+
+        self._ratios(report)
+        return report
+
+    def _ratios(self, report: dict):
+        """Add the split, specific yield and performance ratio to a report of
+        summed figures"""
+        kwp = self._peak_power(report["unit"])
+        report["epv1_share"] = _divide(
+            report["epv1_kwh"], report["epv1_kwh"] + report["epv2_kwh"]
+        )
+        report["specific_yield"] = _divide(report["yield_kwh"], kwp)
+        if "expected_yield" not in report:
+            months = report["date"].astype("datetime64[M]")
+            days_in_month = (months + 1).astype("datetime64[D]") - months.astype(
+                "datetime64[D]"
+            )
+            report["expected_yield"] = self._expected[
+                months.astype(np.int64) % 12
+            ] / days_in_month.astype(float)
+        report["performance_ratio"] = _divide(
+            report["specific_yield"], report["expected_yield"]
+        )
+
+    def monthly(self, daily: dict) -> dict:
+        """Aggregate a :meth:`daily` report into one row per month and unit,
+        ``date`` is the first day of the month"""
+        if not len(daily["date"]):
+            return {name: np.empty(0) for name in COLUMNS}
+        months = daily["date"].astype("datetime64[M]")
+        order = np.lexsort((months, daily["unit"]))
+        months, units = months[order], daily["unit"][order]
+        changed = (np.diff(months.astype(np.int64), prepend=-1) != 0) | (
+            np.diff(units, prepend=-1) != 0
+        )
+        starts = np.flatnonzero(changed)
+
+        peaks, peak_rows = _segment_argmax(daily["peak_pac_w"][order], starts)
+        report = {
+            "date": months[starts].astype("datetime64[D]"),
+            "unit": units[starts],
+            "peak_pac_w": peaks,
+            "peak_time": daily["peak_time"][order][peak_rows],
+        }
+        for name in _SUMMED:
+            report[name] = np.add.reduceat(daily[name][order], starts)
+        self._ratios(report)
+
+        order = np.lexsort((report["unit"], report["date"]))
+        return {name: report[name][order] for name in COLUMNS}
+
+
+def rows(report: dict) -> list[dict]:
+    """The rows of a report with plain Python values, NaN as None and the
+    times as ISO 8601"""
+    result = []
+    for i in range(len(report["date"])):
+        row = {}
+        for name in COLUMNS:
+            value = report[name][i]
+            if name == "date":
+                value = str(value)
+            elif name == "peak_time":
+                value = (
+                    None
+                    if np.isnan(value)
+                    else datetime.datetime.fromtimestamp(
+                        value, datetime.timezone.utc
+                    ).isoformat()
+                )
+            elif name in ("unit", "faults"):
+                value = int(value)
+            else:
+                value = None if np.isnan(value) else round(float(value), 4)
+            row[name] = value
+        result.append(row)
+    return result
+
+
+def write_csv(report: dict, f):
+    """Write a report as CSV with a header line to the text file ``f``"""
+    writer = csv.DictWriter(f, COLUMNS, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(rows(report))
+
+
+def write_json(report: dict, f):
+    """Write a report as a JSON list of rows to the text file ``f``"""
+    json.dump(rows(report), f, indent=1)
+    f.write("\n")
@@ -0,0 +1,420 @@
+"""Error classification and circuit breakers of the endpoints.
+
+:func:`classify` maps the errors of pymodbus, pyserial, requests, the InfluxDB
+client and the standard library onto the hierarchy of
+:mod:`~power_plant_monitoring.base`:
+
+* ``RequestTimeout`` - no answer in time (Modbus timeouts, HTTP 408/504)
+* ``ExchangeNotAvailable`` - the endpoint is not reachable (serial port gone,
+  connection refused, HTTP 5xx), ``CircuitOpen`` if a breaker sheds it
+* ``RateLimitExceeded`` - HTTP 429, ``retry_after`` holds the requested pause
+* ``BadResponse`` - an answer that cannot be used (corrupted frame, invalid
+  JSON), ``NullResponse`` if a driver read no data (:func:`read_device`)
+* ``BadRequest``, ``AuthenticationError``, ``PermissionDenied`` - HTTP 4xx
+
+The libraries are not imported, their exceptions are recognized by the
+qualified names of their classes.
+
+A :class:`CircuitBreaker` guards an endpoint (serial bus, inverter unit,
+InfluxDB, forecast API). After ``failure_threshold`` consecutive failures it
+opens and the calls fail at once with ``CircuitOpen``, the endpoint is shed
+instead of blocking its caller in timeouts. After ``reset_timeout`` seconds
+the next call goes through as probe (half-open): a success closes the breaker,
+a failure opens it again for twice the time (up to ``max_reset_timeout``).
+Timeouts and bad responses are retried at once, but only within a retry budget
+of ``retry_ratio`` retries per call, so a failing endpoint does not multiply
+its load. A breaker can have a parent, the unit breakers of a bus share the
+breaker of the bus: a missing port opens the bus, a silent unit only its own
+breaker, and the other units keep their rate.
+"""
+import logging
+import threading
+import time
+from enum import Enum
+
+from power_plant_monitoring.base import (
+    AuthenticationError,
+    BadRequest,
+    BadResponse,
+    BaseError,
+    CircuitOpen,
+    DDoSProtection,
+    ExchangeNotAvailable,
+    NetworkError,
+    NotSupported,
+    NullResponse,
+    PermissionDenied,
+    RateLimitExceeded,
+    RequestTimeout,
+)
+from power_plant_monitoring.metrics import REGISTRY
+
+_logger = logging.getLogger(__name__)
+
+_STATE = REGISTRY.gauge(
+    "circuit_breaker_state", "0 closed, 1 half-open, 2 open", ["endpoint"]
+)
+_FAILURES = REGISTRY.counter(
+    "circuit_breaker_failures", "Failed calls of an endpoint", ["endpoint", "error"]
+)
+_REJECTED = REGISTRY.counter(
+    "circuit_breaker_rejected", "Calls shed by an open breaker", ["endpoint"]
+)
+_RETRIES = REGISTRY.counter(
+    "circuit_breaker_retries", "Calls retried within the budget", ["endpoint"]
+)
+
+#: the error is derived from the HTTP status of the exception
+_STATUS = "status"
+
+#: qualified exception class name -> error class, the first class of the MRO
+#: found here decides
+_ERRORS = {
+    # pymodbus
+    "pymodbus.exceptions.ConnectionException": ExchangeNotAvailable,
+    "pymodbus.exceptions.ModbusIOException": RequestTimeout,
+    "pymodbus.exceptions.InvalidMessageReceivedException": BadResponse,
+    "pymodbus.exceptions.NoSuchSlaveException": BadRequest,
+    "pymodbus.exceptions.ParameterException": BadRequest,
+    "pymodbus.exceptions.NotImplementedException": NotSupported,
+    "pymodbus.exceptions.ModbusException": NetworkError,
+    # pyserial
+    "serial.serialutil.SerialTimeoutException": RequestTimeout,
+    "serial.serialutil.SerialException": ExchangeNotAvailable,
+    # requests
+    "requests.exceptions.HTTPError": _STATUS,
+    "requests.exceptions.InvalidJSONError": BadResponse,
+    "requests.exceptions.ConnectionError": ExchangeNotAvailable,
+    "requests.exceptions.Timeout": RequestTimeout,
+    "requests.exceptions.RequestException": NetworkError,
+    # influxdb_client and its urllib3
+    "influxdb_client.client.exceptions.InfluxDBError": _STATUS,
+    "urllib3.exceptions.NewConnectionError": ExchangeNotAvailable,
+    "urllib3.exceptions.TimeoutError": RequestTimeout,
+    "urllib3.exceptions.MaxRetryError": ExchangeNotAvailable,
+    "urllib3.exceptions.HTTPError": NetworkError,
+    # standard library
+    "urllib.error.HTTPError": _STATUS,
+    "urllib.error.URLError": ExchangeNotAvailable,
+    "json.decoder.JSONDecodeError": BadResponse,
+    "socket.gaierror": ExchangeNotAvailable,
+    "builtins.TimeoutError": RequestTimeout,
+    "builtins.ConnectionError": ExchangeNotAvailable,
+}
+
+#: errors retried at once (within the budget)
+_RETRYABLE = (RequestTimeout, BadResponse)
+
+
+def error_for_status(status: int) -> type:
+    """The error class of an HTTP status code"""
+    if status == 429:
+        return RateLimitExceeded
+    if status in (408, 504):
+        return RequestTimeout
+    if status == 401:
+        return AuthenticationError
+    if status == 403:
+        return PermissionDenied
+    if status >= 500:
+        return ExchangeNotAvailable
+    if status >= 400:
+        return BadRequest
+    return BadResponse
+
+
+def _http_status(exc):
+    """(status, headers) of an HTTP error of requests, influxdb_client or urllib"""
+    response = getattr(exc, "response", None)
+    if getattr(response, "status_code", None) is not None:
+        return response.status_code, response.headers
+    for attribute in ("status", "code"):
+        status = getattr(exc, attribute, None)
+        if status is not None:
+            return status, getattr(exc, "headers", None)
+    return getattr(response, "status", None), getattr(exc, "headers", None)
+
+
+def _retry_after(headers):
+    try:
+        return float(headers.get("Retry-After"))
+    except (AttributeError, TypeError, ValueError):
+        # no headers or an HTTP date, the breaker's own timeout applies
+        return None
+
+
+def classify(exc: BaseException):
+    """Map an exception onto the error hierarchy
+    (see the module documentation)
+
+    Returns:
+      BaseError: ``exc`` itself if it already is one, else a new error with
+      ``exc`` as ``__cause__``; None for exceptions that are no endpoint
+      errors (programming errors)
+    """
+    if isinstance(exc, BaseError):
+        return exc
+
+    for cls in type(exc).__mro__:
+        error_class = _ERRORS.get(f"{cls.__module__}.{cls.__qualname__}")
+        if error_class is None:
+            continue
+
+        retry_after = None
+        if error_class is _STATUS:
+            status, headers = _http_status(exc)
+            if not status:
+                error_class = NetworkError
+            else:
+                error_class = error_for_status(int(status))
+                retry_after = _retry_after(headers)
+
+        error = error_class(f"{type(exc).__name__}: {exc}")
+        error.__cause__ = exc
+        if retry_after is not None:
+            error.retry_after = retry_after
+        return error
+    return None
+
+
+def read_device(device):
+    """``device.read()``, the drivers return None for a failed transaction
+    which is raised as :class:`~power_plant_monitoring.base.NullResponse`"""
+    info = device.read()
+    if info is None:
+        raise NullResponse(f"no valid response from {device.name}")
+    return info
+
+
+class State(Enum):
+    CLOSED = 0
+    HALF_OPEN = 1
+    OPEN = 2
+
+
+class CircuitBreaker:
+    """Guards an endpoint, see the module documentation.
+
+    Args:
+      name (str): the endpoint, used in logs and metrics
+      failure_threshold (int): consecutive failures opening the breaker
+      reset_timeout (float): seconds until the first probe of an open breaker
+      max_reset_timeout (float): limit of the doubled timeout after failed
+          probes
+      retry_ratio (float): retries earned per call
+      retry_burst (int): retries that can be saved up
+      trips_on (tuple[type]): errors counting as failure, others (and
+          successful calls) reset the failure count
+      parent (CircuitBreaker): the breaker of the endpoint this one is reached
+          through, it handles the errors it trips on
+      clock: returns monotonic seconds
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 3,
+        reset_timeout: float = 30.0,
+        max_reset_timeout: float = 600.0,
+        retry_ratio: float = 0.2,
+        retry_burst: int = 3,
+        trips_on=(NetworkError, BadResponse),
+        parent: "CircuitBreaker" = None,
+        clock=time.monotonic,
+    ):
+        self.name: str = name
+        self.parent: CircuitBreaker = parent
+        self._failure_threshold: int = failure_threshold
+        self._reset_timeout: float = reset_timeout
+        self._max_reset_timeout: float = max(reset_timeout, max_reset_timeout)
+        self._retry_ratio: float = retry_ratio
+        self._retry_burst: float = float(retry_burst)
+        self._trips_on: tuple = tuple(trips_on)
+        self._clock = clock
+        self._lock: threading.Lock = threading.Lock()
+
+        self.state: State = State.CLOSED
+        #: consecutive failures
+        self.failures: int = 0
+        #: the current open time, doubled by failed probes
+        self._timeout: float = reset_timeout
+        #: OPEN: end of the open time, HALF_OPEN: end of the probe's lease
+        self._until: float = 0.0
+        self._retry_tokens: float = self._retry_burst
+        #: calls shed
+        self.rejected: int = 0
+        #: the last failure
+        self.last_error: BaseError = None
+
+    def trips(self, error) -> bool:
+        return isinstance(error, self._trips_on)
+
+    def allow(self) -> bool:
+        """True if a call may go to the endpoint: the breakers are closed or
+        it is the probe of a half-open one.
+
+        The probe holds a lease of the current open time, if its result is
+        never recorded the next call probes after the lease.
+        """
+        if self.state is not State.CLOSED:
+            now = self._clock()
+            with self._lock:
+                admitted = now >= self._until
+                if admitted:
+                    if self.state is State.OPEN:
+                        _logger.info("%s: half-open, probing", self.name)
+                    self.state = State.HALF_OPEN
+                    self._until = now + self._timeout
+            if not admitted:
+                self.rejected += 1
+                _REJECTED.labels(self.name).inc()
+                return False
+        return self.parent is None or self.parent.allow()
+
+    def record(self, error: BaseError = None):
+        """Record the result of a call, ``error`` None for a success"""
+        parent = self.parent
+        if parent is not None:
+            parent.record(error)
+            if error is not None and parent.trips(error):
+                # the parent failed, this endpoint was not reached
+                return
+
+        if error is None or not self.trips(error):
+            self._succeeded()
+        else:
+            self._failed(error)
+
+    def _succeeded(self):
+        if self.failures == 0 and self.state is State.CLOSED:
+            return
+        with self._lock:
+            self.failures = 0
+            if self.state is not State.CLOSED:
+                _logger.info("%s: closed, the endpoint recovered", self.name)
+                self.state = State.CLOSED
+                self._timeout = self._reset_timeout
+
+    def _failed(self, error: BaseError):
+        _FAILURES.labels(self.name, type(error).__name__).inc()
+        retry_after = getattr(error, "retry_after", None)
+        with self._lock:
+            self.last_error = error
+            self.failures += 1
+            if self.state is State.HALF_OPEN:
+                self._timeout = min(2 * self._timeout, self._max_reset_timeout)
+            elif self.failures < self._failure_threshold and not isinstance(
+                error, DDoSProtection
+            ):
+                return
+
+            # rate limited endpoints are left alone at once
+            open_time = max(self._timeout, retry_after or 0.0)
+            self.state = State.OPEN
+            self._until = self._clock() + open_time
+        _logger.warning("%s: open for %.0f s after %s", self.name, open_time, error)
+
+    def reset(self, after: float = 0.0):
+        """The endpoint is expected back (e.g. a device was plugged in): an
+        open breaker probes after ``after`` seconds, the doubled open time
+        starts over"""
+        if self.state is State.CLOSED:
+            return
+        with self._lock:
+            self._timeout = self._reset_timeout
+            self.state = State.OPEN
+            self._until = min(self._until, self._clock() + after)
+        _logger.info("%s: reset, probing in %.0f s", self.name, after)
+
+    def _may_retry(self, error: BaseError) -> bool:
+        if self.state is not State.CLOSED or not isinstance(error, _RETRYABLE):
+            return False
+        with self._lock:
+            if self._retry_tokens < 1:
+                return False
+            self._retry_tokens -= 1
+        _RETRIES.labels(self.name).inc()
+        return True
+
+    def call(self, function, *args, **kwargs):
+        """Call ``function(*args, **kwargs)`` through the breaker
+
+        Raises:
+          CircuitOpen: the endpoint is shed, ``function`` was not called
+          BaseError: the classified error of ``function``; exceptions which
+              are not classified are raised unchanged and not counted
+        """
+        if not self.allow():
+            raise CircuitOpen(f"{self.name} is shed after {self.last_error}")
+
+        self._retry_tokens = min(
+            self._retry_burst, self._retry_tokens + self._retry_ratio
+        )
+        while True:
+            try:
+                result = function(*args, **kwargs)
+            except Exception as exc:
+                error = classify(exc)
+                if error is None:
+                    raise
+                if self._may_retry(error):
+                    _logger.debug("%s: retrying after %s", self.name, error)
+                    continue
+                self.record(error)
+                if error is exc:
+                    raise
+                raise error from exc
+
+            self.record()
+            return result
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "state": self.state.name,
+            "failures": self.failures,
+            "open_seconds": max(0.0, self._until - self._clock())
+            if self.state is not State.CLOSED
+            else 0.0,
+            "rejected": self.rejected,
+            "last_error": str(self.last_error) if self.last_error else None,
+        }
+
+
+#: name -> the breaker of the endpoint
+_breakers: dict = {}
+
+
+def breaker(name: str, **kwargs) -> CircuitBreaker:
+    """The breaker of endpoint ``name``, created with ``kwargs`` (see
+    :class:`CircuitBreaker`) on first use"""
+    if name not in _breakers:
+        register(CircuitBreaker(name, **kwargs))
+    return _breakers[name]
+
+
+def register(*endpoint_breakers: CircuitBreaker):
+    """Make ``endpoint_breakers`` the breakers of their endpoints (in
+    :func:`breakers` and the metrics), replacing those of the same names, e.g.
+    once the port rebuilt by a reload is live"""
+    for endpoint_breaker in endpoint_breakers:
+        _breakers[endpoint_breaker.name] = endpoint_breaker
+        _STATE.labels(endpoint_breaker.name).set_function(
+            lambda b=endpoint_breaker: b.state.value
+        )
+
+
+def breakers() -> list:
+    """The breakers created by :func:`breaker`"""
+    return list(_breakers.values())
+
+
+def add_breaker_route(server):
+    """Register ``/breakers`` (the state of all breakers) on an
+    :class:`~.http_api.HttpApiServer`"""
+    from power_plant_monitoring.http_api import json_response
+
+    def states(query):
+        return json_response([b.stats() for b in breakers()])
+
+    server.add_route("/breakers", states)
@@ -0,0 +1,181 @@
+"""In-memory ring buffer of the most recent samples.
+
+Each numeric field is stored in a preallocated NumPy column of fixed capacity.
+There is a single writer (the acquisition loop) and any number of readers. The
+writer fills the slot and only then advances :attr:`SampleRingBuffer.written`;
+readers copy the slots they need and afterwards check that the writer did not
+wrap around onto them in the meantime. Neither side takes a lock.
+"""
+import bisect
+import logging
+import math
+
+import numpy as np
+
+_logger = logging.getLogger(__name__)
+
+
+def numeric_fields(info: dict) -> list[str]:
+    """The fields of ``info`` which can be stored in the buffer"""
+    return [
+        key
+        for key, value in info.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    ]
+
+
+class _LogicalView:
+    """Sequence view of the logical positions ``[start, stop)`` of a ring column"""
+
+    __slots__ = ("_column", "_start", "_stop", "_capacity")
+
+    def __init__(self, column: np.ndarray, start: int, stop: int):
+        self._column = column
+        self._start = start
+        self._stop = stop
+        self._capacity = len(column)
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def __getitem__(self, k):
+        return self._column[(self._start + k) % self._capacity]
+
+
+class SampleRingBuffer:
+    """Fixed capacity column store for samples.
+
+    Args:
+      capacity (int): number of samples kept
+      fields (list[str]): the stored fields, taken from the first sample if None
+    """
+
+    def __init__(self, capacity: int, fields: list[str] = None):
+        self._capacity: int = capacity
+        self._fields: tuple = None
+        self._field_index: dict = {}
+        self._timestamps: np.ndarray = np.full(capacity, np.nan)
+        self._columns: np.ndarray = None
+        #: total number of samples written, slot = written % capacity
+        self.written: int = 0
+
+        if fields is not None:
+            self._allocate(fields)
+
+    def _allocate(self, fields):
+        self._columns = np.full((len(fields), self._capacity), np.nan)
+        self._field_index = {field: i for i, field in enumerate(fields)}
+        self._fields = tuple(fields)
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def fields(self) -> tuple:
+        return self._fields or ()
+
+    def __len__(self):
+        return min(self.written, self._capacity)
+
+    def append(self, timestamp: float, info: dict):
+        """Store a sample (must only be called by a single writer thread)."""
+        if self._fields is None:
+            self._allocate(numeric_fields(info))
+
+        slot = self.written % self._capacity
+        columns = self._columns
+        for i, field in enumerate(self._fields):
+            value = info.get(field)
+            columns[i, slot] = value if value is not None else math.nan
+        self._timestamps[slot] = timestamp
+
+        # publish the slot
+        self.written += 1
+
+    def _copy(self, column: np.ndarray, start: int, stop: int) -> np.ndarray:
+        """Copy the logical positions ``[start, stop)`` of ``column``"""
+        capacity = self._capacity
+        first, last = start % capacity, stop % capacity
+        if stop - start == 0:
+            return column[:0].copy()
+        if first < last:
+            return column[first:last].copy()
+        return np.concatenate((column[first:], column[:last]))
+
+    def _is_valid(self, start: int) -> bool:
+        # slots before ``written - capacity`` (plus the one being written) may
+        # have been overwritten while we were copying
+        return start > self.written - self._capacity
+
+    def latest(self) -> dict:
+        """The newest sample as dict, empty if nothing was written yet."""
+        while True:
+            written = self.written
+            if written == 0:
+                return {}
+
+            slot = (written - 1) % self._capacity
+            result = {"timestamp": float(self._timestamps[slot])}
+            for field, i in self._field_index.items():
+                result[field] = float(self._columns[i, slot])
+
+            if self._is_valid(written - 1):
+                return result
+
+    def _find(self, start: int, stop: int, timestamp: float, right=False) -> int:
+        """Binary search for the first logical position >= (or >) ``timestamp``"""
+        view = _LogicalView(self._timestamps, start, stop)
+        if right:
+            return start + bisect.bisect_right(view, timestamp)
+        return start + bisect.bisect_left(view, timestamp)
+
+    def window(self, field: str, seconds: float, now: float = None):
+        """Timestamps and values of ``field`` of the last ``seconds``.
+
+        Args:
+          field (str): ...
+          seconds (float): length of the window
+          now (float): end of the window, the newest sample if None
+
+        Returns:
+          tuple[np.ndarray, np.ndarray]: timestamps and values (copies)
+
+        Raises:
+          KeyError: for an unknown field
+        """
+        index = self._field_index[field]
+
+        while True:
+            stop = self.written
+            start = max(0, stop - self._capacity + 1)
+            if stop == 0:
+                return np.empty(0), np.empty(0)
+
+            if now is None:
+                now = self._timestamps[(stop - 1) % self._capacity]
+            else:
+                stop = self._find(start, stop, now, right=True)
+            first = self._find(start, stop, now - seconds)
+
+            timestamps = self._copy(self._timestamps, first, stop)
+            values = self._copy(self._columns[index], first, stop)
+
+            if self._is_valid(first):
+                return timestamps, values
+
+    def aggregate(self, field: str, seconds: float, now: float = None) -> dict:
+        """count/mean/min/max/last of ``field`` over the last ``seconds``"""
+        _, values = self.window(field, seconds, now)
+        values = values[~np.isnan(values)]
+
+        if values.size == 0:
+            return {"count": 0, "mean": None, "min": None, "max": None, "last": None}
+
+        return {
+            "count": int(values.size),
+            "mean": float(values.mean()),
+            "min": float(values.min()),
+            "max": float(values.max()),
+            "last": float(values[-1]),
+        }
@@ -0,0 +1,310 @@
+"""In-process publish/subscribe of the decoded samples.
+
+The acquisition publishes every sample exactly once (:meth:`SampleBus.publish`),
+the consumers (derivation, InfluxDB writer, live view, ...) subscribe to the
+bus instead of reading the device or keeping their own copy. A :class:`Sample`
+is immutable, its fields are a read-only mapping proxy of the published dict,
+so the same object is handed to every subscriber.
+
+A subscription selects samples by topic (``fnmatch`` patterns like
+``device/*``) and optionally by field (only samples having one of the fields)
+and chooses how they are delivered (:class:`Policy`):
+
+* ``INLINE`` - the callback runs on the publishing thread, for cheap consumers
+* ``LATEST`` - only the newest sample is kept, for consumers that want the
+  current state
+* ``QUEUE`` - a bounded FIFO, the oldest sample is dropped when it is full
+
+Dropped samples are counted. The lag of a subscription (age of the oldest
+sample it did not consume yet) is exported as metric and by
+:meth:`SampleBus.stats`, a growing lag points at a slow consumer.
+"""
+import collections
+import fnmatch
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from enum import Enum
+from types import MappingProxyType
+
+from power_plant_monitoring.metrics import REGISTRY
+from power_plant_monitoring.program_thread import ProgramThread
+
+_logger = logging.getLogger(__name__)
+
+_PUBLISHED = REGISTRY.counter("sample_bus_published", "Samples published", ["topic"])
+_DROPPED = REGISTRY.counter(
+    "sample_bus_dropped", "Samples dropped for a subscriber", ["subscriber"]
+)
+_ERRORS = REGISTRY.counter(
+    "sample_bus_errors", "Failed deliveries to a subscriber", ["subscriber"]
+)
+_PENDING = REGISTRY.gauge(
+    "sample_bus_pending", "Samples waiting for a subscriber", ["subscriber"]
+)
+_LAG = REGISTRY.gauge(
+    "sample_bus_lag_seconds", "Age of the oldest pending sample", ["subscriber"]
+)
+
+
+class Policy(Enum):
+    INLINE = 1
+    LATEST = 2
+    QUEUE = 3
+
+
+@dataclass(frozen=True)
+class Sample:
+    """A published sample, shared by all subscribers."""
+
+    #: topic (str): e.g. ``growatt`` or ``device/grid_meter``
+    topic: str
+    #: timestamp (float): time of the acquisition
+    timestamp: float
+    #: fields (Mapping): read-only field -> value
+    fields: MappingProxyType
+    #: tags (Mapping): read-only tag -> value
+    tags: MappingProxyType
+    #: sequence (int): position in the bus, over all topics
+    sequence: int
+
+
+_NO_TAGS = MappingProxyType({})
+
+
+class Subscription:
+    """A consumer of the bus, created by :meth:`SampleBus.subscribe`.
+
+    Args:
+      bus (SampleBus): ...
+      name (str): used in logs and metrics
+      topics (tuple[str]): ``fnmatch`` patterns of the topics
+      fields (Iterable[str]): only samples with at least one of the fields,
+          None for all
+      policy (Policy): ...
+      maxlen (int): capacity of the ``QUEUE``
+      callback: ``callback(sample)`` of an ``INLINE`` subscription
+    """
+
+    def __init__(
+        self,
+        bus,
+        name: str,
+        topics=("*",),
+        fields=None,
+        policy: Policy = Policy.QUEUE,
+        maxlen: int = 1000,
+        callback=None,
+    ):
+        if policy == Policy.INLINE and callback is None:
+            raise ValueError(f"Inline subscription {name} needs a callback")
+
+        self._bus = bus
+        self.name: str = name
+        self._topics: tuple = tuple(topics)
+        self._fields: frozenset = frozenset(fields) if fields is not None else None
+        self.policy: Policy = policy
+        self._callback = callback
+        #: topic -> matches, the patterns are only evaluated once per topic
+        self._matches: dict = {}
+
+        self._queue: collections.deque = collections.deque(
+            maxlen=1 if policy == Policy.LATEST else maxlen
+        )
+        self._condition: threading.Condition = threading.Condition()
+        self._closed: bool = False
+        self._dropped = _DROPPED.labels(name)
+        self._errors = _ERRORS.labels(name)
+
+        #: samples handed to the consumer
+        self.delivered: int = 0
+        #: samples lost because the consumer was too slow
+        self.dropped: int = 0
+
+        _PENDING.labels(name).set_function(lambda: len(self._queue))
+        _LAG.labels(name).set_function(lambda: self.lag)
+
+    def accepts(self, sample: Sample) -> bool:
+        matches = self._matches.get(sample.topic)
+        if matches is None:
+            matches = any(fnmatch.fnmatchcase(sample.topic, p) for p in self._topics)
+            self._matches[sample.topic] = matches
+        if not matches:
+            return False
+        return self._fields is None or not self._fields.isdisjoint(sample.fields)
+
+    def _deliver(self, sample: Sample):
+        if self.policy == Policy.INLINE:
+            try:
+                self._callback(sample)
+            except Exception as err:
+                self._errors.inc()
+                _logger.error("Subscriber %s failed: %s", self.name, err)
+            self.delivered += 1
+            return
+
+        with self._condition:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+                self._dropped.inc()
+            self._queue.append(sample)
+            self._condition.notify()
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue)
+
+    @property
+    def capacity(self) -> int:
+        """Samples kept before the oldest is dropped"""
+        return self._queue.maxlen
+
+    @property
+    def lag(self) -> float:
+        """Seconds since the oldest pending sample was acquired"""
+        try:
+            return max(0.0, time.time() - self._queue[0].timestamp)
+        except IndexError:
+            return 0.0
+
+    def get(self, timeout: float = None):
+        """The next sample, None after ``timeout`` seconds or if closed"""
+        with self._condition:
+            if not self._queue and not self._closed:
+                self._condition.wait(timeout)
+            if not self._queue:
+                return None
+            self.delivered += 1
+            return self._queue.popleft()
+
+    def drain(self) -> list:
+        """All pending samples, without waiting"""
+        with self._condition:
+            samples = list(self._queue)
+            self._queue.clear()
+            self.delivered += len(samples)
+        return samples
+
+    def close(self):
+        """Unsubscribe, a waiting :meth:`get` returns"""
+        self._bus.unsubscribe(self)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class SampleBus:
+    """Delivers published samples to the matching subscriptions."""
+
+    def __init__(self):
+        #: replaced on change, :meth:`publish` iterates without a lock
+        self._subscriptions: tuple = ()
+        self._lock: threading.Lock = threading.Lock()
+        #: samples published
+        self.published: int = 0
+
+    @property
+    def subscriptions(self) -> tuple:
+        return self._subscriptions
+
+    def subscribe(self, name: str, topics="*", **kwargs) -> Subscription:
+        """Add a :class:`Subscription`, see there for the arguments"""
+        if isinstance(topics, str):
+            topics = (topics,)
+        subscription = Subscription(self, name, topics, **kwargs)
+        with self._lock:
+            self._subscriptions += (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions = tuple(
+                s for s in self._subscriptions if s is not subscription
+            )
+
+    def publish(self, topic: str, timestamp: float, fields: dict, tags=None) -> Sample:
+        """Publish a sample to all matching subscriptions
+
+        ``fields`` is not copied, the caller must not modify it afterwards.
+        Inline subscribers are called in the order they subscribed, before
+        this returns. Samples are published from one thread (the
+        acquisition), inline subscribers may publish derived samples.
+
+        Returns:
+          Sample: the published sample
+        """
+        sample = Sample(
+            topic,
+            timestamp,
+            MappingProxyType(fields),
+            MappingProxyType(tags) if tags else _NO_TAGS,
+            self.published,
+        )
+        self.published += 1
+        _PUBLISHED.labels(topic).inc()
+
+        for subscription in self._subscriptions:
+            if subscription.accepts(sample):
+                subscription._deliver(sample)
+        return sample
+
+    def stats(self) -> list:
+        """Delivery statistics per subscription"""
+        return [
+            {
+                "name": s.name,
+                "policy": s.policy.name,
+                "pending": s.pending,
+                "lag_seconds": s.lag,
+                "delivered": s.delivered,
+                "dropped": s.dropped,
+            }
+            for s in self._subscriptions
+        ]
+
+
+class SubscriberThread(ProgramThread):
+    """Consumes a ``LATEST`` or ``QUEUE`` subscription on its own thread.
+
+    The samples published before :meth:`stop` are still consumed, :meth:`join`
+    returns once they are.
+
+    Args:
+      subscription (Subscription): ...
+      callback: ``callback(sample)``, exceptions are logged
+    """
+
+    def __init__(self, subscription: Subscription, callback):
+        ProgramThread.__init__(self, f"Subscriber-{subscription.name}")
+        self._subscription: Subscription = subscription
+        self._callback = callback
+
+    def _consume(self, sample: Sample):
+        try:
+            self._callback(sample)
+        except Exception as err:
+            self._subscription._errors.inc()
+            _logger.error("Subscriber %s failed: %s", self._subscription.name, err)
+
+    def _run_internal(self, ct: threading.Event):
+        while not ct.is_set():
+            sample = self._subscription.get(timeout=0.5)
+            if sample is not None:
+                self._consume(sample)
+
+    def _stop_internal(self, finalMessage: str = ""):
+        # what was published before the stop is still consumed
+        for sample in self._subscription.drain():
+            self._consume(sample)
+
+
+def add_bus_route(server, bus: SampleBus):
+    """Register ``/subscribers`` (:meth:`SampleBus.stats`) on an
+    :class:`~.http_api.HttpApiServer`"""
+    from power_plant_monitoring.http_api import json_response
+
+    def subscribers(query):
+        return json_response({"published": bus.published, "subscribers": bus.stats()})
+
+    server.add_route("/subscribers", subscribers)
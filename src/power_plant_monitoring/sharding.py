@@ -0,0 +1,514 @@
+"""Multi-process acquisition: one process per serial port.
+
+On gateways with several buses the acquisition threads, the decoding, the
+serialization and the HTTP API compete for the GIL, which shows up as jitter in
+the poll timing. In the sharded mode every port is polled by its own process
+(:func:`_acquisition_process`) which decodes the samples and publishes them
+into a :class:`SharedSampleRing`. The main process is the single aggregator: it
+reads all rings (:meth:`ShardedAcquisition.poll`) and does the derivation,
+writing and analytics.
+
+A ring is a ``multiprocessing.shared_memory`` block holding a write counter and
+fixed-size float64 records ``[timestamp, unit, ok, fields...]`` with the fields
+of the Growatt register map (:data:`SAMPLE_FIELDS`). As in
+:class:`~power_plant_monitoring.ringbuffer.SampleRingBuffer` there is a single
+writer which fills a slot before it advances the counter; the reader works on
+views of the shared memory (no copy, no pickling) and afterwards checks that
+the writer did not wrap around onto them.
+
+Shutdown is coordinated with a shared event: the aggregator sets it, the
+acquisition processes finish their cycle and exit, the aggregator joins them
+and releases the shared memory. A process also exits if its parent is gone.
+"""
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from power_plant_monitoring.registers import GROWATT_INPUT_REGISTERS
+
+_logger = logging.getLogger(__name__)
+
+#: the fields of a record after timestamp, unit and ok
+SAMPLE_FIELDS = tuple(field.name for field in GROWATT_INPUT_REGISTERS)
+
+#: bytes before the records (the write counter, padded to a cache line)
+_HEADER_SIZE = 64
+
+
+class SharedSampleRing:
+    """Fixed-size sample records in shared memory, see the module documentation.
+
+    Use :meth:`create` in the owning (aggregator) process and :meth:`attach` in
+    the writing process.
+
+    Args:
+      shm (shared_memory.SharedMemory): ...
+      capacity (int): number of records
+      fields (tuple[str]): the fields of a record
+      owner (bool): unlink the shared memory in :meth:`close`
+    """
+
+    def __init__(self, shm, capacity: int, fields=SAMPLE_FIELDS, owner=False):
+        self._shm: shared_memory.SharedMemory = shm
+        self._capacity: int = capacity
+        self._fields: tuple = tuple(fields)
+        self._owner: bool = owner
+        self._written: np.ndarray = np.ndarray((1,), np.int64, shm.buf)
+        self._records: np.ndarray = np.ndarray(
+            (capacity, 3 + len(self._fields)), np.float64, shm.buf, _HEADER_SIZE
+        )
+
+    @staticmethod
+    def size(capacity: int, fields=SAMPLE_FIELDS) -> int:
+        return _HEADER_SIZE + capacity * (3 + len(fields)) * 8
+
+    @classmethod
+    def create(cls, capacity: int, fields=SAMPLE_FIELDS) -> "SharedSampleRing":
+        shm = shared_memory.SharedMemory(create=True, size=cls.size(capacity, fields))
+        shm.buf[:_HEADER_SIZE] = bytes(_HEADER_SIZE)
+        return cls(shm, capacity, fields, owner=True)
+
+    @classmethod
+    def attach(cls, name: str, capacity: int, fields=SAMPLE_FIELDS):
+        shm = shared_memory.SharedMemory(name=name)
+        if shm.size < cls.size(capacity, fields):
+            shm.close()
+            raise ValueError(f"Shared memory {name} is too small")
+        # the writer processes are spawned by the owner and share its resource
+        # tracker, which only unlinks blocks the owner leaked
+        return cls(shm, capacity, fields)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def fields(self) -> tuple:
+        return self._fields
+
+    @property
+    def written(self) -> int:
+        """Total number of records written, record ``n`` is in slot ``n % capacity``"""
+        return int(self._written[0])
+
+    def append(self, timestamp: float, unit: int, info: dict = None):
+        """Publish a sample, ``info`` None records a failed read of ``unit``.
+        Must only be called by the single writer process."""
+        written = int(self._written[0])
+        record = self._records[written % self._capacity]
+
+        record[0] = timestamp
+        record[1] = unit
+        if info is None:
+            record[2] = 0.0
+            record[3:] = np.nan
+        else:
+            record[2] = 1.0
+            for i, field in enumerate(self._fields, 3):
+                value = info.get(field)
+                record[i] = np.nan if value is None else value
+
+        # publish the slot
+        self._written[0] = written + 1
+
+    def read(self, cursor: int):
+        """Records from ``cursor`` on, without copying.
+
+        The view is contiguous, so it may stop at the end of the ring, call
+        again with the returned cursor until it returns an empty view. Use
+        :meth:`is_valid` after the records were used.
+
+        Returns:
+          tuple[np.ndarray, int, int]: view of the records, the first record
+          of the view, the next cursor
+        """
+        written = int(self._written[0])
+        # slots before ``written - capacity`` (plus the one being written) may
+        # be overwritten at any time
+        cursor = max(cursor, written - self._capacity + 1, 0)
+        if cursor >= written:
+            return self._records[:0], cursor, cursor
+
+        slot = cursor % self._capacity
+        count = min(written - cursor, self._capacity - slot)
+        return self._records[slot : slot + count], cursor, cursor + count
+
+    def is_valid(self, first: int) -> bool:
+        """True if the writer did not touch the records from ``first`` on yet"""
+        return first > int(self._written[0]) - self._capacity
+
+    def sample(self, record: np.ndarray) -> dict:
+        """A record as dict of the fields which have a value"""
+        return {
+            field: float(value)
+            for field, value in zip(self._fields, record[3:].tolist())
+            if value == value
+        }
+
+    def close(self):
+        # the views must be gone before the shared memory can be closed
+        self._written = None
+        self._records = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+def create_modbus_client(
+    port: str,
+    baudrate: int = 9600,
+    timeout: float = 1,
+    adaptive: bool = True,
+    connections: int = 1,
+    max_in_flight: int = 4,
+):
+    """A Modbus client for a serial port or a ``tcp://host:port`` gateway
+
+    Args:
+      timeout (float): seconds, the maximum of an adaptive timeout
+      adaptive (bool): adapt the timeout and the inter-frame gap of a serial
+          port to the measured timing, see
+          :class:`~power_plant_monitoring.devices.rtu.AdaptiveRtuClient`
+      connections (int): connection pool of a gateway, see
+          :class:`~power_plant_monitoring.devices.tcp.ModbusTcpGateway`
+      max_in_flight (int): pipelined transactions per gateway connection
+    """
+    if port.startswith("tcp://"):
+        from power_plant_monitoring.devices.tcp import ModbusTcpGateway
+
+        host, _, tcp_port = port[len("tcp://") :].rpartition(":")
+        return ModbusTcpGateway(
+            host,
+            int(tcp_port or 502),
+            timeout=timeout,
+            connections=connections,
+            max_in_flight=max_in_flight,
+        )
+
+    if adaptive:
+        from power_plant_monitoring.devices.rtu import AdaptiveRtuClient
+
+        return AdaptiveRtuClient(port, baudrate, timeout)
+
+    from pymodbus.client.sync import ModbusSerialClient
+
+    return ModbusSerialClient(
+        method="rtu",
+        port=port,
+        baudrate=baudrate,
+        stopbits=1,
+        parity="N",
+        bytesize=8,
+        timeout=timeout,
+    )
+
+
+def _poll_unit(device, unit_breaker, read=None):
+    """Read a unit through its breaker
+
+    Returns:
+      tuple: (timestamp, info), info None for a failed read; None if the unit
+      is shed
+    """
+    from power_plant_monitoring.base import CircuitOpen
+    from power_plant_monitoring.resilience import read_device
+
+    now = time.time()
+    try:
+        return now, unit_breaker.call(read or read_device, device)
+    except CircuitOpen:
+        return None
+    except Exception as err:
+        _logger.error("%s unit %s: %s", device.name, device.unit, err)
+        return now, None
+
+
+def poll_units(devices: list, executor=None, read=None):
+    """Read the units of a port once
+
+    Units behind a gateway which pipelines its transactions are read
+    concurrently on ``executor``, the round trips overlap instead of adding up.
+
+    Args:
+      devices (list[tuple]): (device, breaker) per unit
+      executor (concurrent.futures.Executor): None reads one unit after the
+          other
+      read: reads a device, by default
+          :func:`~power_plant_monitoring.resilience.read_device`
+
+    Returns:
+      list[tuple]: (device, timestamp, info) in the order of ``devices``,
+      without the shed units
+    """
+    if executor is None:
+        results = [
+            _poll_unit(device, unit_breaker, read) for device, unit_breaker in devices
+        ]
+    else:
+        results = list(
+            executor.map(lambda entry: _poll_unit(*entry, read), devices)
+        )
+    return [
+        (device, *result)
+        for (device, _), result in zip(devices, results)
+        if result is not None
+    ]
+
+
+def _acquisition_process(shard: dict, ring_name: str, capacity: int, stop, data):
+    """Entry point of an acquisition process, polls the units of one port."""
+    from power_plant_monitoring.base import ExchangeNotAvailable
+    from power_plant_monitoring.growatt import Growatt
+    from power_plant_monitoring.logs import configure_logging
+    from power_plant_monitoring.resilience import breaker
+    from power_plant_monitoring.solar import AcquisitionCalendar
+
+    # Ctrl+C goes to the whole process group, the aggregator coordinates the
+    # shutdown; SIGTERM finishes the current cycle
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    configure_logging(shard.get("loglevel") or logging.WARNING, filename=None)
+
+    parent = os.getppid()
+    ring = SharedSampleRing.attach(ring_name, capacity)
+
+    journal = None
+    if shard.get("journal"):
+        from power_plant_monitoring.journal import FrameJournal
+
+        journal = FrameJournal(
+            shard["journal"], keepalive=shard.get("journal_keepalive", 60.0)
+        )
+
+    port = shard["port"]
+    client = create_modbus_client(
+        port,
+        shard.get("baudrate", 9600),
+        shard.get("timeout", 1.0),
+        shard.get("adaptive_timeout", True),
+        shard.get("connections", 1),
+        shard.get("max_in_flight", 4),
+    )
+    interval = shard.get("interval", 1.0)
+    offline_interval = shard.get("offline_interval", 60.0)
+    # the port and every unit have a breaker, offline units are probed every
+    # offline_interval (doubling) while the others keep the interval
+    settings = dict(shard.get("breaker") or {}, reset_timeout=offline_interval)
+    bus = breaker(f"serial {port}", trips_on=(ExchangeNotAvailable,), **settings)
+
+    read = None
+    hotplug = None
+    if not port.startswith("tcp://"):
+        from power_plant_monitoring.devices.serialport import (
+            SerialPort,
+            create_hotplug_monitor,
+        )
+
+        # re-opened when lost, following the adapter's by-id link
+        serial_port = SerialPort(client, port, bus)
+        read = serial_port.read
+        if shard.get("hotplug", True):
+            hotplug = create_hotplug_monitor([serial_port])
+            if hotplug is not None:
+                hotplug.start()
+    client.connect()
+
+    devices = [
+        (
+            Growatt(client, f"Growatt-{unit}", unit, journal=journal),
+            breaker(f"serial {port} unit {unit}", parent=bus, **settings),
+        )
+        for unit in shard.get("units", [1])
+    ]
+    night_interval = shard.get("night_interval", 600.0)
+    calendar = None
+    if shard.get("calendar"):
+        calendar = AcquisitionCalendar(**shard["calendar"])
+    # a gateway answers several transactions at once
+    workers = min(len(devices), getattr(client, "concurrency", 1))
+    executor = None
+    if workers > 1:
+        from concurrent.futures import ThreadPoolExecutor
+
+        executor = ThreadPoolExecutor(workers, thread_name_prefix="poll")
+    _logger.info(f"Polling units {shard.get('units', [1])} on {port}")
+
+    try:
+        next_poll = time.monotonic()
+        while not stop.is_set() and os.getppid() == parent:
+            for growatt, now, info in poll_units(devices, executor, read):
+                ring.append(now, growatt.unit, info)
+                data.release()
+
+            # keep the rhythm, skip missed polls instead of catching up
+            now = time.time()
+            step = interval
+            if calendar is not None and not calendar.is_active(now):
+                step = calendar.delay(now, step, night_interval)
+            next_poll += step
+            delay = next_poll - time.monotonic()
+            if delay < 0:
+                next_poll = time.monotonic()
+                delay = 0
+            stop.wait(delay)
+    finally:
+        if hotplug is not None:
+            hotplug.stop()
+        if executor is not None:
+            executor.shutdown()
+        client.close()
+        if journal is not None:
+            journal.close()
+        ring.close()
+        _logger.info(f"Acquisition of {port} stopped")
+
+
+def _growatt_info(sample: dict) -> dict:
+    """Restore the integer codes and their texts :meth:`Growatt.read` returns"""
+    from power_plant_monitoring.growatt import ErrorCodes, StateCodes, code_text
+
+    for code_field, text_field, texts in (
+        ("StatusCode", "Status", StateCodes),
+        ("FaultCode", "Fault", ErrorCodes),
+    ):
+        if code_field in sample:
+            code = int(sample[code_field])
+            sample[code_field] = code
+            sample[text_field] = code_text(texts, code)
+    return sample
+
+
+class ShardedAcquisition:
+    """Starts one acquisition process per shard and reads their rings.
+
+    Args:
+      shards (list[dict]): per port: ``port`` (device or ``tcp://host:port``),
+          ``units``, ``baudrate``, ``interval``, ``offline_interval``,
+          ``connections`` and ``max_in_flight`` (of a gateway), ``hotplug``
+          (of a serial port, see
+          :mod:`~power_plant_monitoring.devices.serialport`), ``calendar``
+          (arguments of an
+          :class:`~power_plant_monitoring.solar.AcquisitionCalendar`),
+          ``night_interval``, ``journal`` (directory), ``journal_keepalive``
+          and ``loglevel``
+      capacity (int): records per ring
+    """
+
+    def __init__(self, shards: list, capacity: int = 4096):
+        self._shards: list = shards
+        self._capacity: int = capacity
+        # spawn: the aggregator runs threads, forking it is not safe
+        self._context = multiprocessing.get_context("spawn")
+        self._stop = self._context.Event()
+        #: released once per record written by any process
+        self._data = self._context.Semaphore(0)
+        self._rings: list = []
+        self._cursors: list = []
+        self._processes: list = []
+        #: records lost because the aggregator fell behind
+        self.lost: int = 0
+
+    def start(self):
+        self._stop.clear()
+        self._rings, self._cursors, self._processes = [], [], []
+        for i in range(len(self._shards)):
+            self._rings.append(SharedSampleRing.create(self._capacity))
+            self._cursors.append(0)
+            self._processes.append(self._spawn(i))
+
+    def _spawn(self, i: int):
+        """Start the process of shard ``i``, writing to its ring"""
+        shard = self._shards[i]
+        process = self._context.Process(
+            target=_acquisition_process,
+            args=(shard, self._rings[i].name, self._capacity, self._stop, self._data),
+            name=f"acquisition-{os.path.basename(shard['port'])}",
+            daemon=True,
+        )
+        process.start()
+        _logger.info("Started %s (pid %s)", process.name, process.pid)
+        return process
+
+    @property
+    def alive(self) -> list[bool]:
+        return [process.is_alive() for process in self._processes]
+
+    def restart(self) -> list[str]:
+        """Start the processes which died again, the others keep running. A
+        restarted process continues its ring, no record before is lost.
+
+        Returns:
+          list[str]: the ports of the restarted processes
+        """
+        restarted = []
+        for i, process in enumerate(self._processes):
+            if not process.is_alive():
+                process.join(0)
+                self._processes[i] = self._spawn(i)
+                restarted.append(self._shards[i]["port"])
+        return restarted
+
+    def poll(self, timeout: float = 0.5) -> list[tuple]:
+        """Wait up to ``timeout`` for new records and return all of them.
+
+        Returns:
+          list[tuple]: (port, timestamp, unit, info) in order per port, info is
+          None for a failed read
+        """
+        samples = []
+        if not self._data.acquire(timeout=timeout):
+            return samples
+        # the records of further releases are collected now as well
+        while self._data.acquire(block=False):
+            pass
+
+        for i, ring in enumerate(self._rings):
+            port = self._shards[i]["port"]
+            while True:
+                records, first, cursor = ring.read(self._cursors[i])
+                self.lost += first - self._cursors[i]
+                if len(records) == 0:
+                    break
+
+                batch = [
+                    (
+                        port,
+                        float(record[0]),
+                        int(record[1]),
+                        _growatt_info(ring.sample(record)) if record[2] else None,
+                    )
+                    for record in records
+                ]
+                if ring.is_valid(first):
+                    samples.extend(batch)
+                    self._cursors[i] = cursor
+                else:
+                    # overwritten while converting, read again from the
+                    # oldest valid record
+                    self._cursors[i] = first
+        return samples
+
+    def stop(self, timeout: float = 5.0):
+        """Stop all processes and release the shared memory"""
+        self._stop.set()
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                _logger.warning(f"{process.name} did not stop, terminating it")
+                process.terminate()
+                process.join(1)
+
+        for ring in self._rings:
+            ring.close()
+        self._rings = []
+        self._processes = []
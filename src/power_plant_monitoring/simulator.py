@@ -0,0 +1,799 @@
+"""Simulated Growatt inverters speaking Modbus RTU and Modbus TCP.
+
+Used for load tests and offline development, e.g. 32 units on a pseudo-terminal
+and on a TCP port::
+
+    python -m power_plant_monitoring.simulator --rtu --link /tmp/ttyGROWATT \\
+        --tcp 127.0.0.1:5020 --units 1-32 --latency 0.02 --drop-rate 0.01
+
+Every unit ID is an independent :class:`SimulatedInverter` which serves the
+input and holding registers :meth:`Growatt.read`/:meth:`Growatt.read_info`
+expect. The values come from a synthetic :class:`DailyCurve` or from a recorded
+trace (:class:`TraceReplay`). :class:`SimulatedBus` adds the unit's latency, the
+transfer time at the simulated baud rate and injected errors (dropped requests,
+exception responses, corrupted frames).
+"""
+import argparse
+import bisect
+import collections
+import json
+import logging
+import math
+import os
+import random
+import select
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+from power_plant_monitoring.program_thread import ProgramThread
+from power_plant_monitoring.registers import GROWATT_MODBUS_VERSION, encode
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+_logger = logging.getLogger(__name__)
+
+#: registers per table, also the maximum count of a single read
+TABLE_SIZE = 125
+
+READ_HOLDING_REGISTERS = 3
+READ_INPUT_REGISTERS = 4
+
+# exception codes
+ILLEGAL_FUNCTION = 1
+ILLEGAL_DATA_ADDRESS = 2
+ILLEGAL_DATA_VALUE = 3
+SLAVE_DEVICE_FAILURE = 4
+GATEWAY_TARGET_FAILED = 11
+
+
+def _crc_table() -> tuple:
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return tuple(table)
+
+
+_CRC_TABLE = _crc_table()
+
+
+def crc16(data: bytes) -> int:
+    """Modbus CRC-16, appended to a frame as ``crc.to_bytes(2, "little")``"""
+    crc = 0xFFFF
+    for byte in data:
+        crc = (crc >> 8) ^ _CRC_TABLE[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def _exception(function: int, code: int) -> bytes:
+    return bytes((function | 0x80, code))
+
+
+class DailyCurve:
+    """Synthetic day: a clear-sky bell curve between sunrise and sunset dimmed by
+    drifting clouds. The values only depend on the time, the same time always
+    gives the same sample.
+
+    Args:
+      peak_power (float): AC power at noon on a clear day (W)
+      sunrise (float): hour of the day the inverter starts feeding in
+      sunset (float): hour of the day the inverter stops feeding in
+      string_ratio (float): share of PV1 on the input power
+      cloudiness (float): 0 = clear sky, 1 = clouds can dim the power to zero
+      seed (int): seed of the cloud pattern
+    """
+
+    def __init__(
+        self,
+        peak_power: float = 3000.0,
+        sunrise: float = 6.0,
+        sunset: float = 20.0,
+        string_ratio: float = 0.52,
+        cloudiness: float = 0.3,
+        seed: int = 0,
+    ):
+        self._peak_power: float = peak_power
+        self._sunrise: float = sunrise
+        self._sunset: float = sunset
+        self._string_ratio: float = string_ratio
+        self._cloudiness: float = cloudiness
+        self._seed: int = seed
+
+    def _noise(self, slot: int, channel: int) -> float:
+        """Reproducible value in [0, 1) for a time slot and channel"""
+        return random.Random(
+            (self._seed * 1_000_003 + slot) * 16 + channel
+        ).random()
+
+    def _clouds(self, timestamp: float) -> float:
+        # a random cover every 5 minutes, cosine interpolated in between
+        slot, fraction = divmod(timestamp / 300.0, 1.0)
+        a = self._noise(int(slot), 0)
+        b = self._noise(int(slot) + 1, 0)
+        weight = (1 - math.cos(math.pi * fraction)) / 2
+        return a + (b - a) * weight
+
+    def sample(self, timestamp: float) -> dict:
+        local = time.localtime(timestamp)
+        hour = local.tm_hour + local.tm_min / 60 + local.tm_sec / 3600
+        daylight = (hour - self._sunrise) / (self._sunset - self._sunrise)
+
+        irradiance = 0.0
+        if 0 < daylight < 1:
+            irradiance = math.sin(math.pi * daylight) ** 1.5 * (
+                1 - self._cloudiness * self._clouds(timestamp)
+            )
+
+        second = int(timestamp)
+        vac = 230.0 + 4.0 * (self._noise(second, 1) - 0.5)
+        fac = 50.0 + 0.04 * (self._noise(second, 2) - 0.5)
+        temp = 20.0 + 25.0 * irradiance
+
+        ppv = self._peak_power / 0.97 * irradiance
+        if ppv < 10.0:
+            return {
+                "StatusCode": 0,
+                "Vac1": vac,
+                "Fac": fac,
+                "Temp": temp,
+            }
+
+        pv1 = ppv * self._string_ratio
+        pv2 = ppv - pv1
+        vpv1 = 300.0 + 60.0 * irradiance**0.3
+        vpv2 = vpv1 - 8.0 * self._noise(second, 3)
+        pac = ppv * 0.97
+
+        return {
+            "StatusCode": 1,
+            "Ppv": ppv,
+            "Vpv1": vpv1,
+            "PV1Curr": pv1 / vpv1,
+            "PV1Watt": pv1,
+            "Vpv2": vpv2,
+            "PV2Curr": pv2 / vpv2,
+            "PV2Watt": pv2,
+            "Pac": pac,
+            "Fac": fac,
+            "Vac1": vac,
+            "Iac1": pac / vac,
+            "Pac1": pac,
+            "Temp": temp,
+            "PBusV": 380.0,
+            "NBusV": 379.0,
+        }
+
+
+class TraceReplay:
+    """Replays recorded samples in a loop.
+
+    The trace is a JSON list or JSON lines of samples with the field names of
+    :meth:`Growatt.read`. Samples with a ``timestamp`` are replayed at the
+    recorded pace (a trace of exactly one day stays aligned with the time of
+    day), others at one sample per ``interval`` seconds.
+
+    Args:
+      path (str): the trace file
+      interval (float): seconds per sample of traces without timestamps
+    """
+
+    def __init__(self, path: str, interval: float = 10.0):
+        with open(path) as f:
+            text = f.read()
+
+        if text.lstrip().startswith("["):
+            samples = json.loads(text)
+        else:
+            samples = [json.loads(line) for line in text.splitlines() if line.strip()]
+        if not samples:
+            raise ValueError(f"{path} contains no samples")
+
+        start = 0.0
+        timestamps = [sample.get("timestamp") for sample in samples]
+        if len(samples) > 1 and all(
+            isinstance(ts, (int, float)) for ts in timestamps
+        ):
+            samples = sorted(samples, key=lambda sample: sample["timestamp"])
+            start = samples[0]["timestamp"]
+            offsets = [sample["timestamp"] - start for sample in samples]
+            # one mean interval after the last sample the trace starts again
+            duration = offsets[-1] * len(samples) / (len(samples) - 1) or interval
+        else:
+            offsets = [i * interval for i in range(len(samples))]
+            duration = len(samples) * interval
+
+        self._start: float = start
+        self._samples: list = samples
+        self._offsets: list = offsets
+        self._duration: float = duration
+
+    def __len__(self):
+        return len(self._samples)
+
+    def sample(self, timestamp: float) -> dict:
+        position = (timestamp - self._start) % self._duration
+        return self._samples[bisect.bisect_right(self._offsets, position) - 1]
+
+
+#: energy counters (kWh) integrated from a power field (W)
+_COUNTERS = (
+    ("EnergyToday", "Pac"),
+    ("EnergyTotal", "Pac"),
+    ("Epv1_today", "PV1Watt"),
+    ("Epv1_total", "PV1Watt"),
+    ("Epv2_today", "PV2Watt"),
+    ("Epv2_total", "PV2Watt"),
+    ("Epv_total", "Ppv"),
+)
+
+
+class SimulatedInverter:
+    """The register tables of one unit.
+
+    The tables are recomputed from ``source`` at most once per ``resolution``
+    seconds of simulated time. Energy counters and the working time missing in
+    the samples of the source are integrated here.
+
+    Args:
+      unit (int): Modbus unit ID
+      source: :class:`DailyCurve`, :class:`TraceReplay` or anything with a
+          ``sample(timestamp) -> dict`` method
+      clock: returns the current time in seconds
+      speed (float): simulated seconds per second of ``clock``
+      resolution (float): ...
+      energy_total (float): initial value of the lifetime counters (kWh)
+    """
+
+    def __init__(
+        self,
+        unit: int,
+        source,
+        clock=time.time,
+        speed: float = 1.0,
+        resolution: float = 1.0,
+        energy_total: float = 10000.0,
+    ):
+        self.unit: int = unit
+        self._source = source
+        self._clock = clock
+        self._speed: float = speed
+        self._origin: float = clock()
+        self._resolution: float = resolution
+        self._lock: threading.Lock = threading.Lock()
+        #: simulated time the tables were computed for
+        self._updated: float = None
+        #: local date of the ``*_today`` counters
+        self._day: tuple = None
+        self._counters: dict = {
+            "EnergyToday": 0.0,
+            "EnergyTotal": energy_total,
+            "Epv1_today": 0.0,
+            "Epv1_total": energy_total / 2,
+            "Epv2_today": 0.0,
+            "Epv2_total": energy_total / 2,
+            "Epv_total": energy_total,
+            "TimeTotal": energy_total * 1000 / 3,
+        }
+        self._input: list = [0] * TABLE_SIZE
+        self._holding: list = [0] * TABLE_SIZE
+
+    def now(self) -> float:
+        """The simulated time"""
+        return self._origin + (self._clock() - self._origin) * self._speed
+
+    def _integrate(self, now: float, fields: dict):
+        day = time.localtime(now)[:3]
+        if day != self._day:
+            for name in self._counters:
+                if name.endswith("_today") or name == "EnergyToday":
+                    self._counters[name] = 0.0
+            self._day = day
+
+        dt = 0.0 if self._updated is None else min(max(now - self._updated, 0), 3600)
+        for counter, power in _COUNTERS:
+            self._counters[counter] += fields.get(power, 0.0) * dt / 3_600_000
+        if fields.get("StatusCode") == 1:
+            self._counters["TimeTotal"] += dt
+
+        for name, value in self._counters.items():
+            fields.setdefault(name, value)
+
+    def _update(self):
+        now = self.now()
+        if self._updated is not None and 0 <= now - self._updated < self._resolution:
+            return
+
+        fields = dict(self._source.sample(now))
+        self._integrate(now, fields)
+        self._updated = now
+        self._input = encode(fields, size=TABLE_SIZE)
+
+        local = time.localtime(now)
+        holding = [0] * TABLE_SIZE
+        holding[0] = 1  # remote on
+        holding[3] = 100  # active power rate (%)
+        holding[30] = self.unit  # com address
+        holding[45:51] = local[:6]  # system time
+        holding[GROWATT_MODBUS_VERSION] = 304  # protocol V3.04
+        self._holding = holding
+
+    def registers(self, function: int, address: int, count: int) -> list:
+        with self._lock:
+            self._update()
+            table = self._input if function == READ_INPUT_REGISTERS else self._holding
+            return table[address : address + count]
+
+
+@dataclass
+class Faults:
+    """Error injection, each rate is the probability per request."""
+
+    #: the request is not answered (the client runs into its timeout)
+    drop_rate: float = 0.0
+    #: the unit answers with a "slave device failure" exception
+    exception_rate: float = 0.0
+    #: one bit of the response is flipped (a CRC error on RTU)
+    corrupt_rate: float = 0.0
+
+
+class SimulatedBus:
+    """Dispatches Modbus requests to the simulated units.
+
+    Args:
+      devices (dict): unit ID -> :class:`SimulatedInverter`
+      latency (float): seconds a unit takes to answer
+      jitter (float): random additional latency of up to this many seconds
+      baudrate (int): adds the transfer time of request and response at this
+          speed (8N1), None for no transfer time
+      faults (Faults): ...
+      seed (int): seed of the jitter and the error injection
+    """
+
+    def __init__(
+        self,
+        devices: dict,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        baudrate: int = None,
+        faults: Faults = None,
+        seed: int = None,
+    ):
+        self._devices: dict = devices
+        self._latency: float = latency
+        self._jitter: float = jitter
+        self._baudrate: int = baudrate
+        self._faults: Faults = faults if faults is not None else Faults()
+        self._random: random.Random = random.Random(seed)
+        #: requests, responses, dropped, exceptions, corrupted, ... (approximate
+        #: while several connections are served at once)
+        self.stats: collections.Counter = collections.Counter()
+
+    @property
+    def units(self) -> list:
+        return sorted(self._devices)
+
+    def __contains__(self, unit: int) -> bool:
+        return unit in self._devices
+
+    def transfer_time(self, size: int) -> float:
+        """Seconds to transmit ``size`` bytes at the simulated baud rate"""
+        return size * 10 / self._baudrate if self._baudrate else 0.0
+
+    def handle(self, unit: int, pdu: bytes, overhead: int = 0) -> bytes:
+        """Execute a request PDU.
+
+        Args:
+          unit (int): ...
+          pdu (bytes): function code and data
+          overhead (int): framing bytes of request plus response, used for the
+              transfer time
+
+        Returns:
+          bytes: the response PDU, None if the request is not answered
+        """
+        self.stats["requests"] += 1
+        device = self._devices.get(unit)
+        if device is None:
+            self.stats["unknown_unit"] += 1
+            return None
+
+        if self._random.random() < self._faults.drop_rate:
+            self.stats["dropped"] += 1
+            return None
+
+        if not pdu:
+            return None
+        if self._random.random() < self._faults.exception_rate:
+            self.stats["exceptions"] += 1
+            response = _exception(pdu[0], SLAVE_DEVICE_FAILURE)
+        else:
+            response = self._execute(device, pdu)
+
+        delay = (
+            self._latency
+            + self._jitter * self._random.random()
+            + self.transfer_time(len(pdu) + len(response) + overhead)
+        )
+        if delay > 0:
+            time.sleep(delay)
+
+        self.stats["responses"] += 1
+        return response
+
+    def _execute(self, device: SimulatedInverter, pdu: bytes) -> bytes:
+        function = pdu[0]
+        if function not in (READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS):
+            return _exception(function, ILLEGAL_FUNCTION)
+        if len(pdu) != 5:
+            return _exception(function, ILLEGAL_DATA_VALUE)
+
+        address, count = struct.unpack(">HH", pdu[1:])
+        if not 1 <= count <= TABLE_SIZE:
+            return _exception(function, ILLEGAL_DATA_VALUE)
+        if address + count > TABLE_SIZE:
+            return _exception(function, ILLEGAL_DATA_ADDRESS)
+
+        registers = device.registers(function, address, count)
+        return struct.pack(f">BB{count}H", function, count * 2, *registers)
+
+    def corrupt(self, frame: bytes) -> bytes:
+        """``frame`` with one bit flipped with the configured probability"""
+        if not frame or self._random.random() >= self._faults.corrupt_rate:
+            return frame
+
+        self.stats["corrupted"] += 1
+        index = len(frame) - 1
+        return frame[:index] + bytes((frame[index] ^ 0x01,))
+
+
+class RtuSimulator(ProgramThread):
+    """Serves the bus as Modbus RTU on a pseudo-terminal.
+
+    Clients open :attr:`path` like a serial port. Frames are delimited by 3.5
+    characters of silence at the bus' baud rate (at least 2 ms), requests with a
+    bad CRC or for an unknown unit are not answered.
+
+    Args:
+      bus (SimulatedBus): ...
+      link (str): optional symlink to the pseudo-terminal, e.g. /tmp/ttyGROWATT
+    """
+
+    def __init__(self, bus: SimulatedBus, link: str = None, name="RtuSimulator"):
+        ProgramThread.__init__(self, name)
+
+        self._bus: SimulatedBus = bus
+        self._link: str = link
+        self._master: int = None
+        self._slave: int = None
+        self._path: str = None
+
+    @property
+    def path(self) -> str:
+        """The device clients open"""
+        return self._link or self._path
+
+    def _prepare_internal(self):
+        import tty
+
+        self._master, self._slave = os.openpty()
+        # no echo, no line editing; the slave is kept open so that the pty
+        # survives clients closing and reopening it
+        tty.setraw(self._slave)
+        self._path = os.ttyname(self._slave)
+
+        if self._link:
+            if os.path.islink(self._link):
+                os.unlink(self._link)
+            os.symlink(self._path, self._link)
+
+        _logger.info(f"({self.name}) Modbus RTU on {self.path}")
+
+    def _run_internal(self, ct: threading.Event):
+        gap = max(3.5 * self._bus.transfer_time(1), 0.002)
+        frame = b""
+
+        while not ct.is_set():
+            ready, _, _ = select.select([self._master], [], [], gap if frame else 0.5)
+            if ready:
+                frame += os.read(self._master, 512)
+            elif frame:
+                self._handle_frame(frame)
+                frame = b""
+
+    def _handle_frame(self, frame: bytes):
+        if len(frame) < 4 or crc16(frame[:-2]) != int.from_bytes(frame[-2:], "little"):
+            self._bus.stats["bad_frames"] += 1
+            return
+
+        unit = frame[0]
+        # unit ID and CRC of request and response
+        response = self._bus.handle(unit, frame[1:-2], overhead=6)
+        if response is None or unit == 0:
+            return
+
+        reply = bytes((unit,)) + response
+        reply += crc16(reply).to_bytes(2, "little")
+        os.write(self._master, self._bus.corrupt(reply))
+
+    def _finally_internal(self):
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = None
+
+        if self._link and os.path.islink(self._link):
+            os.unlink(self._link)
+
+
+class _TcpServer(socketserver.ThreadingTCPServer):
+    # restarted on the same port in tests, the handlers end with the process
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _TcpHandler(socketserver.BaseRequestHandler):
+    def _recv(self, size: int) -> bytes:
+        """Exactly ``size`` bytes, None if the connection or the server closed"""
+        data = b""
+        while len(data) < size:
+            try:
+                chunk = self.request.recv(size - len(data))
+            except socket.timeout:
+                if self.server.ct.is_set():
+                    return None
+                continue
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def handle(self):
+        self.request.settimeout(0.5)
+        self._send_lock = threading.Lock()
+
+        while True:
+            header = self._recv(7)
+            if header is None:
+                return
+            transaction, protocol, length, unit = struct.unpack(">HHHB", header)
+            pdu = self._recv(length - 1)
+            if pdu is None:
+                return
+
+            if self.server.pipelined:
+                threading.Thread(
+                    target=self._answer,
+                    args=(transaction, protocol, unit, pdu),
+                    daemon=True,
+                ).start()
+            else:
+                self._answer(transaction, protocol, unit, pdu)
+
+    def _answer(self, transaction: int, protocol: int, unit: int, pdu: bytes):
+        bus = self.server.bus
+        if unit not in bus:
+            bus.stats["unknown_unit"] += 1
+            response = _exception(pdu[0] if pdu else 0, GATEWAY_TARGET_FAILED)
+        else:
+            response = bus.handle(unit, pdu)
+            if response is None:
+                return
+
+        reply = struct.pack(">HHHB", transaction, protocol, len(response) + 1, unit)
+        try:
+            with self._send_lock:
+                self.request.sendall(bus.corrupt(reply + response))
+        except OSError:
+            # the connection is gone
+            pass
+
+
+class TcpSimulator(ProgramThread):
+    """Serves the bus as Modbus TCP, requests for unknown units are answered
+    with a "gateway target failed" exception.
+
+    Args:
+      bus (SimulatedBus): ...
+      host (str): ...
+      port (int): 0 picks a free port, see :attr:`port`
+      pipelined (bool): answer the requests of a connection concurrently (in
+          the order they complete), like a datalogger; otherwise one after the
+          other
+    """
+
+    def __init__(
+        self,
+        bus: SimulatedBus,
+        host: str = "127.0.0.1",
+        port: int = 5020,
+        name: str = "TcpSimulator",
+        pipelined: bool = False,
+    ):
+        ProgramThread.__init__(self, name)
+
+        self._bus: SimulatedBus = bus
+        self._host: str = host
+        self._port: int = port
+        self._pipelined: bool = pipelined
+        self._server: _TcpServer = None
+
+    @property
+    def port(self) -> int:
+        """The bound port (useful when started with port 0)"""
+        return self._server.server_address[1] if self._server else self._port
+
+    def _prepare_internal(self):
+        self._server = _TcpServer((self._host, self._port), _TcpHandler)
+        self._server.timeout = 0.5
+        self._server.bus = self._bus
+        self._server.pipelined = self._pipelined
+        _logger.info(f"({self.name}) Modbus TCP on {self._host}:{self.port}")
+
+    def _run_internal(self, ct: threading.Event):
+        self._server.ct = ct
+        while not ct.is_set():
+            self._server.handle_request()
+
+    def _finally_internal(self):
+        self._server.server_close()
+
+
+def parse_units(text: str) -> list[int]:
+    """``"1-4,10"`` -> ``[1, 2, 3, 4, 10]``"""
+    units = set()
+    for part in text.split(","):
+        first, _, last = part.partition("-")
+        units.update(range(int(first), int(last or first) + 1))
+    if not all(1 <= unit <= 247 for unit in units):
+        raise ValueError(f"Unit IDs must be in 1..247: {text}")
+    return sorted(units)
+
+
+def create_bus(args) -> SimulatedBus:
+    """Create the units and the bus from the command line parameters"""
+    trace = TraceReplay(args.trace) if args.trace else None
+
+    devices = {}
+    for unit in args.units:
+        if trace is not None:
+            source = trace
+        else:
+            # the units differ a little in size and cloud pattern
+            size = 0.8 + 0.4 * random.Random(unit).random()
+            source = DailyCurve(args.peak_power * size, seed=args.seed + unit)
+        devices[unit] = SimulatedInverter(unit, source, speed=args.speed)
+
+    return SimulatedBus(
+        devices,
+        latency=args.latency,
+        jitter=args.jitter,
+        baudrate=args.baudrate or None,
+        faults=Faults(args.drop_rate, args.exception_rate, args.corrupt_rate),
+        seed=args.seed,
+    )
+
+
+def parse_args(args):
+    """Parse command line parameters
+
+    Args:
+      args (List[str]): command line parameters as list of strings
+
+    Returns:
+      :obj:`argparse.Namespace`: command line parameters namespace
+    """
+    parser = argparse.ArgumentParser(description="Simulated Growatt inverters")
+    parser.add_argument("--rtu", action="store_true", help="serve RTU on a pty")
+    parser.add_argument("--link", help="symlink to the pty, e.g. /tmp/ttyGROWATT")
+    parser.add_argument("--tcp", metavar="HOST:PORT", help="serve Modbus TCP")
+    parser.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="answer the TCP requests of a connection concurrently",
+    )
+    parser.add_argument("--units", type=parse_units, default=[1], help="e.g. 1-32")
+    parser.add_argument("--baudrate", type=int, default=9600, help="0 = unlimited")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="seconds")
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--exception-rate", type=float, default=0.0)
+    parser.add_argument("--corrupt-rate", type=float, default=0.0)
+    parser.add_argument("--trace", help="replay a recorded trace (JSON)")
+    parser.add_argument("--peak-power", type=float, default=3000.0, help="W")
+    parser.add_argument("--speed", type=float, default=1.0, help="time lapse")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        dest="loglevel",
+        help="set loglevel to INFO",
+        action="store_const",
+        const=logging.INFO,
+    )
+    parser.add_argument(
+        "-vv",
+        "--very-verbose",
+        dest="loglevel",
+        help="set loglevel to DEBUG",
+        action="store_const",
+        const=logging.DEBUG,
+    )
+    args = parser.parse_args(args)
+    if not args.rtu and not args.tcp:
+        parser.error("at least one of --rtu and --tcp is required")
+    return args
+
+
+def main(args):
+    """Run the simulator until interrupted
+
+    Args:
+      args (List[str]): command line parameters as list of strings
+    """
+    args = parse_args(args)
+    logging.basicConfig(
+        level=args.loglevel or logging.WARNING,
+        stream=sys.stdout,
+        format="%(asctime)s %(levelname)s {%(module)s} %(message)s",
+    )
+
+    bus = create_bus(args)
+    servers = []
+    if args.rtu:
+        servers.append(RtuSimulator(bus, args.link))
+    if args.tcp:
+        host, _, port = args.tcp.rpartition(":")
+        servers.append(
+            TcpSimulator(
+                bus, host or "127.0.0.1", int(port), pipelined=args.pipelined
+            )
+        )
+
+    for server in servers:
+        server.start()
+        if isinstance(server, RtuSimulator):
+            print(f"Modbus RTU on {server.path}")
+        else:
+            print(f"Modbus TCP on port {server.port}")
+    print(
+        f"Units {args.units[0]}..{args.units[-1]} ({len(args.units)}), "
+        "Ctrl+C to stop"
+    )
+
+    def terminate(signum, frame):
+        # stop cleanly (and remove the pty link), once
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, terminate)
+    try:
+        while not any(server.last_exception for server in servers):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in servers:
+            server.stop()
+        _logger.info(f"Statistics: {dict(bus.stats)}")
+
+
+def run():
+    """Calls :func:`main` passing the CLI arguments extracted from :obj:`sys.argv`
+
+    This function can be used as entry point to create console scripts with setuptools.
+    """
+    main(sys.argv[1:])
+
+
+if __name__ == "__main__":
+    run()
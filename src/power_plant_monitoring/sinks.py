@@ -0,0 +1,119 @@
+import datetime
+import logging
+import time
+from abc import ABC, abstractmethod
+
+from power_plant_monitoring.metrics import REGISTRY
+
+_logger = logging.getLogger(__name__)
+
+_SERIALIZE_TIME = REGISTRY.histogram(
+    "sink_serialize_seconds", "Time to build a point from a sample", ["sink"]
+)
+_WRITE_TIME = REGISTRY.histogram(
+    "sink_write_seconds", "Time to flush a point to the sink", ["sink"]
+)
+_WRITE_ERRORS = REGISTRY.counter("sink_write_errors", "Failed sink writes", ["sink"])
+
+
+class Sink(ABC):
+    """A destination for decoded samples."""
+
+    @abstractmethod
+    def write(
+        self,
+        fields: dict,
+        measurement: str = "growattd",
+        tags: dict = None,
+        timestamp: datetime.datetime = None,
+    ):
+        pass
+
+    def close(self):
+        pass
+
+
+class InfluxDbSink(Sink):
+    """Writes samples synchronously to an InfluxDB 2.x bucket, or to the raw
+    tier of the ``tiers`` (see :mod:`~power_plant_monitoring.tiers`)."""
+
+    def __init__(self, config):
+        # imported here, the client library is slow to import
+        import influxdb_client
+        from influxdb_client.client.write_api import SYNCHRONOUS
+
+        url = config["url"].get(str)
+        org = config["org"].get(str)
+        token = config["token"].get(str)
+
+        #: the tiers, empty for a single bucket
+        self.tiers: list = []
+        if config["tiers"].exists():
+            from power_plant_monitoring.tiers import parse_tiers
+
+            self.tiers = parse_tiers(config["tiers"].get(list))
+
+        #: ...
+        self._bucket: str = (
+            config["bucket"].get(str) if config["bucket"].exists() else "monitoring"
+        )
+        #: measurement -> bucket of the measurements not written to the raw tier
+        self._routes: dict = {}
+        if self.tiers:
+            from power_plant_monitoring.tiers import routes
+
+            self._bucket = self.tiers[0].bucket
+            self._routes = routes(self.tiers)
+        #: ...
+        self._org: str = org
+
+        _logger.debug(f"InfluxDB: {url}, Organization: {org}")
+        self._client = influxdb_client.InfluxDBClient(url=url, token=token, org=org)
+        self._write_api = self._client.write_api(write_options=SYNCHRONOUS)
+        _logger.debug("InfluxDB client created.")
+
+    def write(
+        self,
+        fields: dict,
+        measurement: str = "growattd",
+        tags: dict = None,
+        timestamp: datetime.datetime = None,
+    ):
+        from influxdb_client import Point, WritePrecision
+
+        start = time.perf_counter()
+        point = Point.from_dict(
+            {
+                "measurement": measurement,
+                "tags": tags if tags is not None else {"location": "home"},
+                "fields": fields,
+                "time": timestamp if timestamp is not None else datetime.datetime.now(),
+            },
+            WritePrecision.MS,
+        )
+        serialized = time.perf_counter()
+        _SERIALIZE_TIME.labels("influxdb").observe(serialized - start)
+
+        bucket = self._routes.get(measurement, self._bucket)
+        try:
+            self._write_api.write(bucket=bucket, org=self._org, record=point)
+        except Exception:
+            _WRITE_ERRORS.labels("influxdb").inc()
+            raise
+        _WRITE_TIME.labels("influxdb").observe(time.perf_counter() - serialized)
+
+    def provision(self):
+        """Create or correct the buckets and tasks of the tiers"""
+        from power_plant_monitoring.tiers import provision
+
+        provision(self._client, self._org, self.tiers)
+
+    def verify(self) -> list[str]:
+        """The differences between the deployed tiers and the configuration"""
+        from power_plant_monitoring.tiers import verify
+
+        return verify(self._client, self._org, self.tiers)
+
+    def close(self):
+        self._write_api.close()
+        self._client.close()
@@ -0,0 +1,221 @@
+"""Sun position and the acquisition calendar derived from it.
+
+The inverter is powered by the PV strings, at night it is off and every poll
+ends in a timeout. :class:`AcquisitionCalendar` computes the daily sunrise and
+sunset for the configured location with the NOAA solar position algorithm
+(accurate to about a minute between +/-72 degrees latitude) and tells the poll
+loop when to poll at full rate and when a sparse probe is enough.
+
+The sun times are computed once per solar day and cached, a poll cycle only
+compares its timestamp with the cached window.
+"""
+import datetime
+import logging
+import math
+
+_logger = logging.getLogger(__name__)
+
+#: elevation of the sun's center at sunrise/sunset: refraction and the radius
+#: of the sun's disk
+HORIZON = -0.833
+
+_SECONDS_PER_DAY = 86400.0
+
+
+def _julian_century(timestamp: float) -> float:
+    return (timestamp / _SECONDS_PER_DAY + 2440587.5 - 2451545.0) / 36525.0
+
+
+def _sun(timestamp: float):
+    """Declination (degrees) and equation of time (minutes) at ``timestamp``"""
+    t = _julian_century(timestamp)
+
+    mean_long = (280.46646 + t * (36000.76983 + t * 0.0003032)) % 360
+    mean_anom = 357.52911 + t * (35999.05029 - 0.0001537 * t)
+    eccentricity = 0.016708634 - t * (0.000042037 + 0.0000001267 * t)
+    m = math.radians(mean_anom)
+    center = (
+        math.sin(m) * (1.914602 - t * (0.004817 + 0.000014 * t))
+        + math.sin(2 * m) * (0.019993 - 0.000101 * t)
+        + math.sin(3 * m) * 0.000289
+    )
+    omega = math.radians(125.04 - 1934.136 * t)
+    apparent_long = mean_long + center - 0.00569 - 0.00478 * math.sin(omega)
+    mean_obliquity = (
+        23 + (26 + (21.448 - t * (46.815 + t * (0.00059 - t * 0.001813))) / 60) / 60
+    )
+    obliquity = math.radians(mean_obliquity + 0.00256 * math.cos(omega))
+
+    declination = math.asin(math.sin(obliquity) * math.sin(math.radians(apparent_long)))
+
+    y = math.tan(obliquity / 2) ** 2
+    l0 = math.radians(mean_long)
+    equation_of_time = 4 * math.degrees(
+        y * math.sin(2 * l0)
+        - 2 * eccentricity * math.sin(m)
+        + 4 * eccentricity * y * math.sin(m) * math.cos(2 * l0)
+        - 0.5 * y * y * math.sin(4 * l0)
+        - 1.25 * eccentricity * eccentricity * math.sin(2 * m)
+    )
+    return math.degrees(declination), equation_of_time
+
+
+def solar_elevation(timestamp: float, latitude: float, longitude: float) -> float:
+    """Elevation of the sun in degrees (without refraction)
+
+    Args:
+      timestamp (float): seconds since the epoch
+      latitude (float): degrees, north positive
+      longitude (float): degrees, east positive
+    """
+    declination, equation_of_time = _sun(timestamp)
+    minutes = (timestamp % _SECONDS_PER_DAY) / 60
+    true_solar_time = (minutes + equation_of_time + 4 * longitude) % 1440
+    hour_angle = math.radians(true_solar_time / 4 - 180)
+
+    lat, dec = math.radians(latitude), math.radians(declination)
+    cos_zenith = math.sin(lat) * math.sin(dec) + (
+        math.cos(lat) * math.cos(dec) * math.cos(hour_angle)
+    )
+    return 90 - math.degrees(math.acos(max(-1.0, min(1.0, cos_zenith))))
+
+
+def solar_day(timestamp: float, longitude: float) -> datetime.date:
+    """The solar day of ``timestamp``: the date at the location's mean solar
+    time, it starts at (mean) solar midnight"""
+    return datetime.datetime.fromtimestamp(
+        timestamp + longitude * 240, datetime.timezone.utc
+    ).date()
+
+
+def _day_start(day: datetime.date, longitude: float) -> float:
+    midnight = datetime.datetime(
+        day.year, day.month, day.day, tzinfo=datetime.timezone.utc
+    )
+    return midnight.timestamp() - longitude * 240
+
+
+def sun_times(
+    day: datetime.date, latitude: float, longitude: float, elevation: float = HORIZON
+):
+    """Sunrise and sunset of a solar day (see :func:`solar_day`)
+
+    Args:
+      day (datetime.date): the solar day
+      latitude (float): degrees, north positive
+      longitude (float): degrees, east positive
+      elevation (float): elevation of the sun's center which counts as rise/set
+
+    Returns:
+      tuple[float, float]: timestamps of sunrise and sunset; ``(None, None)``
+      if the sun stays below and ``(-inf, inf)`` if it stays above
+      ``elevation`` the whole day
+    """
+    noon = _day_start(day, longitude) + _SECONDS_PER_DAY / 2
+    lat = math.radians(latitude)
+
+    def event(sign):
+        # the sun position is evaluated at the event itself, two refinements
+        # bring it below a second
+        timestamp = noon
+        for _ in range(3):
+            declination, equation_of_time = _sun(timestamp)
+            dec = math.radians(declination)
+            cos_hour_angle = (
+                math.sin(math.radians(elevation)) - math.sin(lat) * math.sin(dec)
+            ) / (math.cos(lat) * math.cos(dec))
+            if cos_hour_angle > 1:
+                return None
+            if cos_hour_angle < -1:
+                return sign * math.inf
+            hour_angle = math.degrees(math.acos(cos_hour_angle))
+            timestamp = noon + 60 * (sign * 4 * hour_angle - equation_of_time)
+        return timestamp
+
+    sunrise, sunset = event(-1), event(1)
+    if sunrise is None or sunset is None:
+        return None, None
+    return sunrise, sunset
+
+
+class AcquisitionCalendar:
+    """When to poll at full rate: from ``lead`` seconds before sunrise to
+    ``lag`` seconds after sunset, a sparse probe otherwise.
+
+    Args:
+      latitude (float): degrees, north positive
+      longitude (float): degrees, east positive
+      lead (float): seconds before sunrise the full rate starts
+      lag (float): seconds after sunset the full rate ends
+      elevation (float): sun elevation which counts as sunrise/sunset
+    """
+
+    def __init__(
+        self,
+        latitude: float,
+        longitude: float,
+        lead: float = 1800.0,
+        lag: float = 1800.0,
+        elevation: float = HORIZON,
+    ):
+        self._latitude: float = latitude
+        self._longitude: float = longitude
+        self._lead: float = lead
+        self._lag: float = lag
+        self._elevation: float = elevation
+        #: solar day -> acquisition window, only the last few days are kept
+        self._windows: dict = {}
+
+    def window(self, timestamp: float):
+        """The full-rate window of the solar day of ``timestamp``
+
+        Returns:
+          tuple[float, float]: start and end, None if there is no sunrise
+        """
+        day = solar_day(timestamp, self._longitude)
+        window = self._windows.get(day, False)
+        if window is False:
+            window = self._compute(day)
+            if len(self._windows) >= 4:
+                self._windows.clear()
+            self._windows[day] = window
+        return window
+
+    def _compute(self, day: datetime.date):
+        sunrise, sunset = sun_times(
+            day, self._latitude, self._longitude, self._elevation
+        )
+        if sunrise is None:
+            _logger.info("No sunrise on %s", day)
+            return None
+
+        start = _day_start(day, self._longitude)
+        if sunrise == -math.inf:
+            # polar day: poll around the clock
+            return start, start + _SECONDS_PER_DAY
+
+        _logger.info(
+            "Sunrise %s, sunset %s",
+            datetime.datetime.fromtimestamp(sunrise).strftime("%H:%M:%S"),
+            datetime.datetime.fromtimestamp(sunset).strftime("%H:%M:%S"),
+        )
+        return sunrise - self._lead, sunset + self._lag
+
+    def is_active(self, timestamp: float) -> bool:
+        """True if ``timestamp`` is inside the full-rate window"""
+        window = self.window(timestamp)
+        return window is not None and window[0] <= timestamp < window[1]
+
+    def delay(self, timestamp: float, interval: float, night_interval: float) -> float:
+        """Seconds until the next poll: ``interval`` inside the window,
+        otherwise ``night_interval`` but not beyond the start of the window"""
+        if self.is_active(timestamp):
+            return interval
+
+        window = self.window(timestamp)
+        if window is None or timestamp >= window[0]:
+            # the next window is the one of the next solar day
+            window = self.window(timestamp + _SECONDS_PER_DAY)
+        if window is None:
+            return night_interval
+        return max(0.0, min(night_interval, window[0] - timestamp))
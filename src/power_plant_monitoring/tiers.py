@@ -0,0 +1,228 @@
+"""Tiered downsampling and retention in InfluxDB.
+
+The ``influxdb.tiers`` of the configuration declare a chain of buckets, e.g.
+raw samples for 30 days, 1-minute means for a year and hourly means forever::
+
+    tiers:
+        - bucket: "monitoring_raw"
+          retention_days: 30
+        - bucket: "monitoring_1m"
+          every: "1m"
+          retention_days: 365
+        - bucket: "monitoring_1h"
+          every: "1h"
+          measurements: ["events"]
+
+The first tier holds the raw samples, every further tier is filled by an
+InfluxDB task aggregating the numeric fields of the tier before it
+(:func:`downsampling_flux`), so an hourly mean is computed from 60 minute
+means instead of 3600 samples. Writes go to the raw tier, the measurements of
+a tier's ``measurements`` (rare, long lived data like the state events) to that
+tier instead (:func:`routes`). ``retention_days`` 0 or missing keeps the data
+forever.
+
+:func:`provision` creates the missing buckets and tasks and corrects the
+retention and the task scripts, :func:`verify` lists the differences between
+the deployed state and the configuration (``power_plant_monitoring
+--verify-influxdb``). Both take an ``InfluxDBClient`` (or a stand-in with
+``buckets_api()`` and ``tasks_api()``).
+"""
+import logging
+import re
+from dataclasses import dataclass
+
+from power_plant_monitoring.base import ConfigError
+
+_logger = logging.getLogger(__name__)
+
+_DURATION = re.compile(r"^(\d+(ns|us|ms|s|mo|m|h|d|w|y))+$")
+
+#: measurements not downsampled (the rejected values)
+NOT_DOWNSAMPLED = ("quarantine",)
+
+
+@dataclass(frozen=True)
+class Tier:
+    """A bucket of the chain, see the module documentation."""
+
+    #: bucket (str): ...
+    bucket: str
+    #: retention_days (float): 0 keeps the data forever
+    retention_days: float = 0
+    #: every (str): aggregation window (Flux duration), None for the raw tier
+    every: str = None
+    #: fn (str): Flux aggregate of the window
+    fn: str = "mean"
+    #: measurements (tuple[str]): written to this tier instead of the raw one
+    measurements: tuple = ()
+    #: source (str): bucket the tier is aggregated from
+    source: str = None
+
+    @property
+    def retention_seconds(self) -> int:
+        return int(self.retention_days * 86400)
+
+    @property
+    def task_name(self) -> str:
+        return f"downsample {self.bucket}"
+
+
+def parse_tiers(entries: list) -> list[Tier]:
+    """The tiers of the configuration (list of dicts)
+
+    Raises:
+      ConfigError: the tiers do not form a chain starting with a raw tier
+    """
+    if not entries:
+        raise ConfigError("influxdb.tiers: at least the raw tier is required")
+
+    tiers, buckets = [], set()
+    for i, entry in enumerate(entries):
+        try:
+            tier = Tier(
+                bucket=str(entry["bucket"]),
+                retention_days=float(entry.get("retention_days") or 0),
+                every=entry.get("every"),
+                fn=str(entry.get("fn", "mean")),
+                measurements=tuple(entry.get("measurements") or ()),
+                source=tiers[-1].bucket if tiers else None,
+            )
+        except (KeyError, TypeError, ValueError, AttributeError) as err:
+            raise ConfigError(f"influxdb.tiers[{i}]: {err!r}") from err
+
+        if tier.bucket in buckets:
+            raise ConfigError(f"influxdb.tiers: bucket {tier.bucket} is used twice")
+        if tier.retention_days < 0:
+            raise ConfigError(f"influxdb.tiers.{tier.bucket}: negative retention")
+        if i == 0 and tier.every is not None:
+            raise ConfigError("influxdb.tiers: the first tier holds the raw data")
+        if i > 0 and not _DURATION.match(str(tier.every)):
+            raise ConfigError(
+                f"influxdb.tiers.{tier.bucket}: every must be a Flux duration, "
+                f"e.g. 1m, not {tier.every}"
+            )
+        buckets.add(tier.bucket)
+        tiers.append(tier)
+    return tiers
+
+
+def routes(tiers: list) -> dict:
+    """measurement -> bucket of the measurements not written to the raw tier"""
+    return {
+        measurement: tier.bucket for tier in tiers for measurement in tier.measurements
+    }
+
+
+def downsampling_flux(tier: Tier, org: str) -> str:
+    """The script of the task filling ``tier`` from its source"""
+    excluded = " and ".join(
+        f'r._measurement != "{measurement}"' for measurement in NOT_DOWNSAMPLED
+    )
+    # the offset gives late writes of the window time to arrive
+    return f"""import "types"
+
+option task = {{name: "{tier.task_name}", every: {tier.every}, offset: 10s}}
+
+from(bucket: "{tier.source}")
+    |> range(start: -task.every)
+    |> filter(fn: (r) => {excluded} and types.isNumeric(v: r._value))
+    |> aggregateWindow(every: task.every, fn: {tier.fn}, createEmpty: false)
+    |> to(bucket: "{tier.bucket}", org: "{org}")
+"""
+
+
+def _retention(bucket) -> int:
+    """Retention seconds of a deployed bucket, 0 = forever"""
+    for rule in bucket.retention_rules or []:
+        if rule.type == "expire":
+            return int(rule.every_seconds or 0)
+    return 0
+
+
+def _retention_rules(tier: Tier) -> list:
+    from influxdb_client import BucketRetentionRules
+
+    if not tier.retention_seconds:
+        return []
+    return [BucketRetentionRules(type="expire", every_seconds=tier.retention_seconds)]
+
+
+def _task(tasks_api, tier: Tier):
+    found = tasks_api.find_tasks(name=tier.task_name)
+    return found[0] if found else None
+
+
+def verify(client, org: str, tiers: list) -> list[str]:
+    """The differences between the deployed buckets and tasks and ``tiers``,
+    empty if the deployment matches"""
+    buckets_api, tasks_api = client.buckets_api(), client.tasks_api()
+    problems = []
+    for tier in tiers:
+        bucket = buckets_api.find_bucket_by_name(tier.bucket)
+        if bucket is None:
+            problems.append(f"bucket {tier.bucket}: missing")
+        elif _retention(bucket) != tier.retention_seconds:
+            problems.append(
+                f"bucket {tier.bucket}: retention {_retention(bucket)} s, "
+                f"configured {tier.retention_seconds} s"
+            )
+
+        if tier.every is None:
+            continue
+        task = _task(tasks_api, tier)
+        if task is None:
+            problems.append(f"task {tier.task_name}: missing")
+        elif task.flux.strip() != downsampling_flux(tier, org).strip():
+            problems.append(f"task {tier.task_name}: script differs")
+        elif task.status != "active":
+            problems.append(f"task {tier.task_name}: {task.status}")
+
+    configured = {tier.task_name for tier in tiers if tier.every is not None}
+    for task in tasks_api.find_tasks():
+        if task.name.startswith("downsample ") and task.name not in configured:
+            problems.append(f"task {task.name}: not configured")
+    return problems
+
+
+def provision(client, org: str, tiers: list):
+    """Create or correct the buckets and the downsampling tasks of ``tiers``.
+    Data is never deleted: buckets and tasks which are no longer configured
+    are left alone (:func:`verify` lists them)."""
+    from influxdb_client import TaskCreateRequest, TaskUpdateRequest
+
+    buckets_api, tasks_api = client.buckets_api(), client.tasks_api()
+    for tier in tiers:
+        bucket = buckets_api.find_bucket_by_name(tier.bucket)
+        if bucket is None:
+            _logger.info("Creating bucket %s", tier.bucket)
+            buckets_api.create_bucket(
+                bucket_name=tier.bucket,
+                retention_rules=_retention_rules(tier),
+                description=f"power_plant_monitoring tier {tier.every or 'raw'}",
+                org=org,
+            )
+        elif _retention(bucket) != tier.retention_seconds:
+            _logger.info(
+                "Changing the retention of %s to %s s",
+                tier.bucket,
+                tier.retention_seconds,
+            )
+            bucket.retention_rules = _retention_rules(tier)
+            buckets_api.update_bucket(bucket)
+
+        if tier.every is None:
+            continue
+        flux = downsampling_flux(tier, org)
+        task = _task(tasks_api, tier)
+        if task is None:
+            _logger.info("Creating task %s", tier.task_name)
+            tasks_api.create_task(
+                task_create_request=TaskCreateRequest(
+                    flux=flux, org=org, status="active"
+                )
+            )
+        elif task.flux.strip() != flux.strip() or task.status != "active":
+            _logger.info("Updating task %s", tier.task_name)
+            tasks_api.update_task_request(
+                task.id, TaskUpdateRequest(flux=flux, status="active")
+            )
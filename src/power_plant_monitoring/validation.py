@@ -0,0 +1,216 @@
+"""Data-quality checks of the samples before they are derived and written.
+
+The limits come from the register map of the device (``min``, ``max``,
+``max_rate`` and ``counter`` of the fields, see
+:mod:`~power_plant_monitoring.devices.register_map`) and can be overridden per
+field. :class:`SampleValidator` rejects
+
+* ``range`` - values outside ``[min, max]``,
+* ``spike`` - changes faster than ``max_rate`` per second against the last
+  accepted value, typically a corrupted RTU frame. A change that persists for
+  ``persistence`` samples is accepted as the new level,
+* ``counter`` - decreasing totals (also accepted once they persist).
+
+:class:`ValidationStage` runs the validator on the sample bus: rejected fields
+are removed from the sample, which goes on without them, and are published to
+``quarantine/<topic>`` with the reasons. A sample with most of its checked
+fields rejected (a garbage frame) is quarantined as a whole.
+
+The checks are plain comparisons against precomputed rule tuples, a sample of
+the Growatt map costs a few microseconds.
+"""
+import logging
+from dataclasses import dataclass
+
+from power_plant_monitoring.metrics import REGISTRY
+
+_logger = logging.getLogger(__name__)
+
+_REJECTED = REGISTRY.counter(
+    "validation_rejected",
+    "Field values rejected by the validation",
+    ["field", "reason"],
+)
+_QUARANTINED = REGISTRY.counter(
+    "validation_quarantined", "Samples quarantined as a whole", ["topic"]
+)
+
+
+@dataclass(frozen=True)
+class Violation:
+    """A rejected field value."""
+
+    #: field (str): ...
+    field: str
+    #: value (float): the rejected value
+    value: float
+    #: reason (str): ``range``, ``spike`` or ``counter``
+    reason: str
+
+
+class SampleValidator:
+    """Checks the samples of one device.
+
+    Args:
+      fields (Iterable[MapField]): the fields of the register map
+      overrides (dict): field -> dict with ``min``, ``max``, ``max_rate``
+          and/or ``counter`` replacing the limits of the map
+      persistence (int): consecutive rejections after which a spike or
+          counter decrease is accepted as the new level
+      max_gap (float): seconds without a sample after which the rate and
+          counter checks start over
+    """
+
+    def __init__(self, fields, overrides=None, persistence: int = 3, max_gap=300.0):
+        overrides = overrides or {}
+        rules = []
+        for field in fields:
+            limits = {
+                "min": field.min,
+                "max": field.max,
+                "max_rate": field.max_rate,
+                "counter": field.counter,
+            }
+            limits.update(overrides.get(field.name, {}))
+            if any(value not in (None, False) for value in limits.values()):
+                rules.append(
+                    (
+                        field.name,
+                        limits["min"],
+                        limits["max"],
+                        limits["max_rate"],
+                        bool(limits["counter"]),
+                    )
+                )
+
+        #: (field, min, max, max_rate, counter)
+        self._rules: tuple = tuple(rules)
+        self._persistence: int = persistence
+        self._max_gap: float = max_gap
+        #: field -> [timestamp, last accepted value, consecutive rejections]
+        self._last: dict = {}
+
+    @property
+    def checked_fields(self) -> tuple:
+        return tuple(rule[0] for rule in self._rules)
+
+    def check(self, timestamp: float, fields) -> list:
+        """Check a sample, the accepted values become the reference of the
+        rate and counter checks
+
+        Returns:
+          list[Violation]: the rejected values, empty for a good sample
+        """
+        violations = []
+        last_values = self._last
+        for name, low, high, max_rate, counter in self._rules:
+            value = fields.get(name)
+            if value is None:
+                continue
+
+            if (low is not None and value < low) or (high is not None and value > high):
+                violations.append(Violation(name, value, "range"))
+                continue
+
+            last = last_values.get(name)
+            if last is None or not 0 < timestamp - last[0] <= self._max_gap:
+                last_values[name] = [timestamp, value, 0]
+                continue
+
+            reason = None
+            if counter and value < last[1]:
+                reason = "counter"
+            elif (
+                max_rate is not None
+                and abs(value - last[1]) > max_rate * (timestamp - last[0])
+            ):
+                reason = "spike"
+
+            if reason is not None and last[2] + 1 < self._persistence:
+                last[2] += 1
+                violations.append(Violation(name, value, reason))
+                continue
+
+            if reason is not None:
+                _logger.info("%s changed to %s, accepted as new level", name, value)
+            last[0], last[1], last[2] = timestamp, value, 0
+
+        for violation in violations:
+            _REJECTED.labels(violation.field, violation.reason).inc()
+        return violations
+
+
+class ValidationStage:
+    """Inline subscriber of the sample bus: validates ``raw/<topic>`` and
+    publishes ``valid/<topic>`` (and ``quarantine/<topic>``).
+
+    Samples of topics without rules pass unchanged. Every device (topic and
+    tags) has its own validator.
+
+    Args:
+      bus (SampleBus): ...
+      overrides (dict): see :class:`SampleValidator`
+      persistence (int): see :class:`SampleValidator`
+      max_rejected_share (float): share of the checked fields which, when
+          rejected, quarantines the whole sample
+    """
+
+    def __init__(self, bus, overrides=None, persistence=3, max_rejected_share=0.5):
+        self._bus = bus
+        self._overrides: dict = overrides or {}
+        self._persistence: int = persistence
+        self._max_rejected_share: float = max_rejected_share
+        #: topic -> register map fields
+        self._layouts: dict = {}
+        #: (topic, tags) -> SampleValidator, None for topics without rules
+        self._validators: dict = {}
+
+    def add(self, topic: str, fields):
+        """Check the samples of ``topic`` (without ``raw/``) against the limits
+        of ``fields`` (MapField)"""
+        self._layouts[topic] = tuple(fields)
+
+    def _validator(self, topic: str, tags):
+        key = (topic, tuple(tags.items()))
+        validator = self._validators.get(key, False)
+        if validator is False:
+            layout = self._layouts.get(topic)
+            validator = None
+            if layout is not None:
+                validator = SampleValidator(layout, self._overrides, self._persistence)
+            self._validators[key] = validator
+        return validator
+
+    def __call__(self, sample):
+        topic = sample.topic[len("raw/") :]
+        validator = self._validator(topic, sample.tags)
+        violations = ()
+        if validator is not None:
+            violations = validator.check(sample.timestamp, sample.fields)
+        if not violations:
+            self._bus.publish(
+                f"valid/{topic}", sample.timestamp, sample.fields, sample.tags
+            )
+            return
+
+        reasons = ",".join(f"{v.field}:{v.reason}" for v in violations)
+        checked = sum(name in sample.fields for name in validator.checked_fields)
+        if len(violations) > self._max_rejected_share * checked:
+            _logger.warning("Quarantined a %s sample: %s", topic, reasons)
+            _QUARANTINED.labels(topic).inc()
+            quarantined = dict(sample.fields)
+        else:
+            _logger.info("Rejected %s", reasons)
+            rejected = {v.field for v in violations}
+            quarantined = {v.field: v.value for v in violations}
+            self._bus.publish(
+                f"valid/{topic}",
+                sample.timestamp,
+                {k: v for k, v in sample.fields.items() if k not in rejected},
+                sample.tags,
+            )
+
+        quarantined["reasons"] = reasons
+        self._bus.publish(
+            f"quarantine/{topic}", sample.timestamp, quarantined, sample.tags
+        )
@@ -20,18 +20,27 @@ Todo:
     * You have to also use ``sphinx.ext.todo`` extension
 
 """
+from __future__ import annotations
+
+import bisect
 import json
 import logging
+import os
 import random
 import string
 import threading
 import time
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from power_plant_monitoring.registry import readers
+from power_plant_monitoring.resilience import CircuitBreaker, breaker
 
-import confuse
-import requests
-from requests.structures import CaseInsensitiveDict
+if TYPE_CHECKING:
+    # only needed for annotations; requests is imported by the readers using it
+    import confuse
+    import requests
 
 _logger = logging.getLogger(__name__)
 
@@ -60,15 +69,35 @@ class WeatherForecastReader(ABC):
         self._config: confuse.ConfigView = config
         #: ...
         self._verbosity: int = 4
+        #: ...
+        self._lock: threading.Lock = threading.Lock()
+        #: ...
+        self._offset: int = 0
+        #: sheds the forecast API while it fails
+        self._breaker: CircuitBreaker = breaker(f"forecast {type(self).__name__}")
+
+    def get_announcements(
+        self, number_of_announcements: int, session: requests.Session = None
+    ) -> list["WeatherInfo"]:
+        """The latest announcements, read through the circuit breaker of the
+        forecast API
 
+        Raises:
+          CircuitOpen: the API failed repeatedly and is not queried
+          BaseError: the classified error of the request
+        """
+        return self._breaker.call(
+            self._get_announcements_internal, number_of_announcements, session
+        )
 
-class BasfWeatherForecast(AnnouncementReader):
+
+class BasfWeatherForecast(WeatherForecastReader):
     def __init__(self, config: confuse.ConfigView):
         """
         ...
         """
 
-        AnnouncementReader.__init__(self, config)
+        WeatherForecastReader.__init__(self, config)
 
         # set typename
         self._typename = "BAPI"
@@ -79,7 +108,10 @@ class BasfWeatherForecast(AnnouncementReader):
 
     def _get_announcements_internal(
         self, number_of_announcements: int, session: requests.Session = None
-    ) -> list["AnnouncementInfo"]:
+    ) -> list["WeatherInfo"]:
+
+        import requests
+        from requests.structures import CaseInsensitiveDict
 
         # get the latest announcement
         with self._lock:
@@ -122,6 +154,7 @@ class BasfWeatherForecast(AnnouncementReader):
                 response = requests.get(request_url, headers=headers, timeout=3)
             else:
                 response = session.get(request_url, headers=headers, timeout=3)
+            response.raise_for_status()
 
             self._cached = False
             self._page_size = rand_page
@@ -148,18 +181,18 @@ class BasfWeatherForecast(AnnouncementReader):
 
             announcements = response.json()["data"]["articles"]
 
-        return list(map(lambda item: AnnouncementInfo.from_dict(item), announcements))[
+        return list(map(lambda item: WeatherInfo.from_dict(item), announcements))[
             self._offset : self._offset + number_of_announcements - self._offset
         ]
 
 
-class BinanceReaderZhGateway(AnnouncementReader):
+class BinanceReaderZhGateway(WeatherForecastReader):
     def __init__(self, config: confuse.ConfigView):
         """
         ...
         """
 
-        AnnouncementReader.__init__(self, config)
+        WeatherForecastReader.__init__(self, config)
 
         # set typename
         self._typename = "GTZH"
@@ -170,7 +203,10 @@ class BinanceReaderZhGateway(AnnouncementReader):
 
     def _get_announcements_internal(
         self, number_of_announcements: int, session: requests.Session = None
-    ) -> list["AnnouncementInfo"]:
+    ) -> list["WeatherInfo"]:
+
+        import requests
+        from requests.structures import CaseInsensitiveDict
 
         # get the latest announcement
         with self._lock:
@@ -227,6 +263,7 @@ class BinanceReaderZhGateway(AnnouncementReader):
                 response = requests.get(request_url, headers=headers, timeout=3)
             else:
                 response = session.get(request_url, headers=headers, timeout=3)
+            response.raise_for_status()
 
             self._cached = False
             self._page_size = rand_page
@@ -242,17 +279,17 @@ class BinanceReaderZhGateway(AnnouncementReader):
             announcements = response.json()["data"]["catalogs"][0]["articles"]
 
             return list(
-                map(lambda item: AnnouncementInfo.from_dict(item), announcements)
+                map(lambda item: WeatherInfo.from_dict(item), announcements)
             )[self._offset : self._offset + number_of_announcements - self._offset]
 
 
-class BinanceReaderGateway(AnnouncementReader):
+class BinanceReaderGateway(WeatherForecastReader):
     def __init__(self, config: confuse.ConfigView):
         """
         ...
         """
 
-        AnnouncementReader.__init__(self, config)
+        WeatherForecastReader.__init__(self, config)
 
         # set typename
         self._typename = "GTCO"
@@ -263,7 +300,10 @@ class BinanceReaderGateway(AnnouncementReader):
 
     def _get_announcements_internal(
         self, number_of_announcements: int, session: requests.Session = None
-    ) -> list["AnnouncementInfo"]:
+    ) -> list["WeatherInfo"]:
+
+        import requests
+        from requests.structures import CaseInsensitiveDict
 
         # get the latest announcement
         with self._lock:
@@ -308,6 +348,7 @@ class BinanceReaderGateway(AnnouncementReader):
                 response = requests.get(request_url, headers=headers, timeout=3)
             else:
                 response = session.get(request_url, headers=headers, timeout=3)
+            response.raise_for_status()
 
             self._cached = False
             self._page_size = rand_page
@@ -335,48 +376,92 @@ class BinanceReaderGateway(AnnouncementReader):
             announcements = response.json()["data"]["catalogs"][0]["articles"]
 
             return list(
-                map(lambda item: AnnouncementInfo.from_dict(item), announcements)
+                map(lambda item: WeatherInfo.from_dict(item), announcements)
             )[self._offset : self._offset + number_of_announcements - self._offset]
 
 
-class JsonReader(AnnouncementReader):
+class JsonReader(WeatherForecastReader):
+    """Replays forecasts from a local JSON file.
+
+    The file is only parsed again when its modification time or size changed,
+    so repeated queries against an unchanged file cost a single ``os.stat``. Records are additionally indexed by timestamp which turns a
+    horizon query (see :meth:`get_range`) into a binary search.
+    """
+
     def __init__(self, config: confuse.ConfigView):
         """
         ...
         """
 
-        AnnouncementReader.__init__(self, config)
+        WeatherForecastReader.__init__(self, config)
 
         # set typename
         self._typename = "JSON"
         #: ...
         self._filename: str = config["filename"].get(str)
+        #: (st_mtime_ns, st_size) of the file the cached records were parsed from
+        self._cache_key: tuple = None
+        #: records in file order
+        self._records: list[WeatherInfo] = []
+        #: records sorted by timestamp
+        self._records_by_time: list[WeatherInfo] = []
+        #: timestamps of ``_records_by_time``, used for the binary search
+        self._timestamps: list[int] = []
+
+    def _reload_if_changed(self):
+        stat = os.stat(self._filename)
+        cache_key = (stat.st_mtime_ns, stat.st_size)
+
+        if cache_key == self._cache_key:
+            return
+
+        if stat.st_size == 0:
+            # not written yet, no records
+            items = []
+        else:
+            with open(self._filename, "rb") as f:
+                items = json.load(f)
+
+        records = [WeatherInfo.from_dict(item) for item in items]
+        records_by_time = sorted(records, key=lambda item: item.timestamp)
+
+        self._records = records
+        self._records_by_time = records_by_time
+        self._timestamps = [item.timestamp for item in records_by_time]
+        self._cache_key = cache_key
+
+        _logger.debug(f"{self._filename} parsed: {len(records)} records")
 
     def _get_announcements_internal(
         self, number_of_announcements: int, session: requests.Session = None
-    ) -> list["AnnouncementInfo"]:
+    ) -> list["WeatherInfo"]:
 
-        with open(self._filename, "r+") as f:
-            announcements = json.load(f)
+        with self._lock:
+            self._reload_if_changed()
+            records = self._records
 
-        return list(map(lambda item: AnnouncementInfo.from_dict(item), announcements))[
-            self._offset : self._offset + number_of_announcements
-        ]
+        return records[self._offset : self._offset + number_of_announcements]
 
+    def get_range(self, start: int, end: int) -> list["WeatherInfo"]:
+        """Return all records with ``start <= timestamp < end``, ordered by time.
 
-def create_reader_by_name(class_name_snake_case: str, config: confuse.ConfigView):
-    def _get_class_name(module_name):
-        """Build a class Name (CamelCase) from the module name
+        Args:
+          start (int): first timestamp of the horizon (inclusive)
+          end (int): last timestamp of the horizon (exclusive)
 
-        @type (str) -> str
-        @param module_name   \b str   The name of the python module (snake_case)
-        @return              \b str   The Class name in CamelCase
+        Returns:
+          list[WeatherInfo]: the records inside the horizon
         """
+        with self._lock:
+            self._reload_if_changed()
+            timestamps = self._timestamps
+            records_by_time = self._records_by_time
 
-        words = module_name.split("_")
-        return "".join(w.capitalize() for w in words).replace("_", "")
+        lo = bisect.bisect_left(timestamps, start)
+        hi = bisect.bisect_left(timestamps, end, lo)
 
-    class_name_camel_case = _get_class_name(class_name_snake_case)
-    class_to_be_created = globals()[class_name_camel_case]
+        return records_by_time[lo:hi]
 
-    return class_to_be_created(config)
+
+def create_reader_by_name(class_name_snake_case: str, config: confuse.ConfigView):
+    return readers.create(class_name_snake_case, config)
@@ -0,0 +1,127 @@
+"""
+    Benchmark runner for the tests in ``tests/benchmarks``.
+
+    A benchmark measures operations per second of a callable. The results are
+    compared against ``baseline.json``; a result more than
+    ``--benchmark-threshold`` below its baseline fails the test.
+    ``--benchmark-save`` stores the results of the run as the new baseline.
+"""
+
+import json
+import os
+import time
+
+import pytest
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+FRAMES = os.path.join(os.path.dirname(__file__), "frames.json")
+
+#: test name -> operations per second of this run
+_results: dict = {}
+
+
+def _load_baseline() -> dict:
+    try:
+        with open(BASELINE) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+class ReplayRow:
+    """A pymodbus style response carrying captured registers"""
+
+    __slots__ = ("registers",)
+
+    def __init__(self, registers):
+        self.registers = registers
+
+    def isError(self):
+        return False
+
+
+class ReplayClient:
+    """Answers ``read_input_registers`` from captured frames, one capture per
+    :meth:`Growatt.read` cycle"""
+
+    def __init__(self, captures):
+        self._captures = [
+            {key: ReplayRow(registers) for key, registers in capture.items()}
+            for capture in captures
+        ]
+        self._reads = 0
+
+    def read_input_registers(self, address, count, unit=1):
+        capture = self._captures[(self._reads // 4) % len(self._captures)]
+        self._reads += 1
+        return capture[f"{address},{count}"]
+
+
+@pytest.fixture(scope="session")
+def frames():
+    with open(FRAMES) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def replay_client(frames):
+    return ReplayClient(frames)
+
+
+@pytest.fixture
+def benchmark(request):
+    """Returns ``run(function, items=1, min_time=0.5)`` which calls ``function``
+    repeatedly for at least ``min_time`` seconds and returns the rate in items
+    (``items`` per call) per second"""
+    baseline = _load_baseline()
+    threshold = request.config.getoption("--benchmark-threshold")
+    saving = request.config.getoption("--benchmark-save")
+    name = request.node.name
+
+    def run(function, items: int = 1, min_time: float = 0.5) -> float:
+        function()  # warm up caches and lazy imports
+
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            function()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+
+        rate = calls * items / elapsed
+        _results[name] = round(rate, 1)
+
+        expected = baseline.get(name)
+        if not saving and expected and rate < expected * (1 - threshold):
+            pytest.fail(
+                f"{name}: {rate:.0f}/s is more than {threshold:.0%} below "
+                f"the baseline of {expected:.0f}/s"
+            )
+        return rate
+
+    return run
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not _results or not session.config.getoption("--benchmark-save"):
+        return
+
+    baseline = _load_baseline()
+    baseline.update(_results)
+    with open(BASELINE, "w") as f:
+        json.dump(dict(sorted(baseline.items())), f, indent=2)
+        f.write("\n")
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    if not _results:
+        return
+
+    baseline = _load_baseline()
+    terminalreporter.section("benchmarks")
+    for name, rate in sorted(_results.items()):
+        expected = baseline.get(name)
+        change = f"{rate / expected - 1:+.1%}" if expected else "new"
+        terminalreporter.write_line(f"{name:<40} {rate:>14,.1f}/s  {change}")
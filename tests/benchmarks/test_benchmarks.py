@@ -0,0 +1,307 @@
+import datetime
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from power_plant_monitoring.anomaly import AnomalyDetector
+from power_plant_monitoring.energy import EnergyIntegrator
+from power_plant_monitoring.growatt import Growatt
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+pytestmark = pytest.mark.benchmark
+
+
+def _sample(replay_client) -> dict:
+    return Growatt(replay_client, "Growatt", 1).read()
+
+
+def test_growatt_decode(benchmark, replay_client):
+    growatt = Growatt(replay_client, "Growatt", 1)
+
+    assert growatt.read()["Pac"] == 2500.0
+    benchmark(growatt.read)
+
+
+def test_line_protocol(benchmark, replay_client):
+    influxdb_client = pytest.importorskip("influxdb_client")
+
+    info = _sample(replay_client)
+    time = datetime.datetime(2024, 6, 1, 12)
+
+    def serialize():
+        return influxdb_client.Point.from_dict(
+            {
+                "measurement": "growattd",
+                "tags": {"location": "home"},
+                "fields": info,
+                "time": time,
+            },
+            influxdb_client.WritePrecision.MS,
+        ).to_line_protocol()
+
+    assert serialize().startswith("growattd,location=home ")
+    benchmark(serialize)
+
+
+def test_sample_bus_handoff(benchmark, replay_client):
+    from power_plant_monitoring.samplebus import Policy, SampleBus, SubscriberThread
+
+    bus = SampleBus()
+    batch = 1000
+    done = threading.Event()
+    last = [None]
+
+    def consume(sample):
+        if sample.sequence == last[0]:
+            done.set()
+
+    # as in the application: an inline consumer and the InfluxDB writer thread
+    bus.subscribe("live_view", "growatt", policy=Policy.INLINE, callback=len)
+    writer = SubscriberThread(
+        bus.subscribe("influxdb", "growatt", maxlen=batch), consume
+    )
+    fields, tags = _sample(replay_client), {"location": "home"}
+
+    def handoff():
+        done.clear()
+        last[0] = bus.published + batch - 1
+        for i in range(batch):
+            bus.publish("growatt", float(i), fields, tags)
+        assert done.wait(5.0)
+
+    writer.start()
+    try:
+        benchmark(handoff, items=batch)
+    finally:
+        writer.stop()
+    assert bus.stats()[1]["dropped"] == 0
+
+
+def test_derive_pipeline(benchmark, replay_client):
+    growatt = Growatt(replay_client, "Growatt", 1)
+    samples = [growatt.read() for _ in range(3)]
+    energy = EnergyIntegrator()
+    anomalies = AnomalyDetector()
+    clock = [0.0]
+
+    def derive():
+        clock[0] += 10.0
+        info = dict(samples[int(clock[0]) % 3])
+        info.update(energy.update(clock[0], info))
+        anomalies.update(clock[0], info)
+
+    benchmark(derive)
+
+
+def test_forecast_parsing(benchmark, tmp_path):
+    confuse = pytest.importorskip("confuse")
+    from power_plant_monitoring.weather_forecast.weather_forecast_reader import (
+        JsonReader,
+    )
+
+    path = tmp_path / "forecast.json"
+    records = [
+        {"releaseDate": 1_700_000_000 + i * 900, "id": i, "title": f"forecast {i}"}
+        for i in range(1000)
+    ]
+    path.write_text(json.dumps(records))
+
+    config = confuse.Configuration("power_plant_monitoring_bench", read=False)
+    config.set({"filename": str(path)})
+    reader = JsonReader(config)
+
+    def parse():
+        reader._cache_key = None  # force a full parse
+        return reader.get_range(1_700_000_000, 1_700_000_000 + 96 * 900)
+
+    assert len(parse()) == 96
+    benchmark(parse)
+
+
+def _tcp_simulator():
+    from power_plant_monitoring.simulator import (
+        DailyCurve,
+        SimulatedBus,
+        SimulatedInverter,
+        TcpSimulator,
+    )
+
+    noon = datetime.datetime(2024, 6, 21, 13).timestamp()
+    device = SimulatedInverter(1, DailyCurve(), clock=lambda: noon)
+    return TcpSimulator(SimulatedBus({1: device}), port=0)
+
+
+def test_end_to_end(benchmark, fake_influxdb):
+    confuse = pytest.importorskip("confuse")
+    pytest.importorskip("influxdb_client")
+    pymodbus_client = pytest.importorskip("pymodbus.client.sync")
+    from power_plant_monitoring.sinks import InfluxDbSink
+
+    config = confuse.Configuration("power_plant_monitoring_bench", read=False)
+    config.set(
+        {"url": fake_influxdb.url, "org": "home", "token": "secret", "bucket": "b"}
+    )
+    simulator = _tcp_simulator()
+    simulator.start()
+    client = pymodbus_client.ModbusTcpClient("127.0.0.1", simulator.port, timeout=1)
+    client.connect()
+    sink = InfluxDbSink(config)
+    growatt = Growatt(client, "Growatt", 1)
+    energy = EnergyIntegrator()
+    anomalies = AnomalyDetector()
+    clock = [0.0]
+
+    def cycle():
+        clock[0] += 10.0
+        info = growatt.read()
+        info.update(energy.update(clock[0], info))
+        anomalies.update(clock[0], info)
+        sink.write(info)
+
+    try:
+        benchmark(cycle)
+    finally:
+        sink.close()
+        client.close()
+        simulator.stop()
+
+    assert fake_influxdb.writes
+    assert fake_influxdb.writes[0].startswith(b"growattd,location=home ")
+
+
+def test_modbus_tcp_read(benchmark):
+    pymodbus_client = pytest.importorskip("pymodbus.client.sync")
+
+    simulator = _tcp_simulator()
+    simulator.start()
+    client = pymodbus_client.ModbusTcpClient("127.0.0.1", simulator.port, timeout=1)
+    client.connect()
+    try:
+        growatt = Growatt(client, "Growatt", 1)
+        assert growatt.read()["Status"] == "Normal"
+        benchmark(growatt.read)
+    finally:
+        client.close()
+        simulator.stop()
+
+
+def test_journal_replay(benchmark, replay_client, tmp_path):
+    from power_plant_monitoring.journal import FrameJournal, JournalReader
+
+    journal = FrameJournal(str(tmp_path), skip_unchanged=False)
+    growatt = Growatt(replay_client, "Growatt", 1, journal=journal)
+    cycles = 10_000
+    for _ in range(cycles):
+        growatt.read()
+    journal.close()
+
+    reader = JournalReader(str(tmp_path))
+    assert len(reader.decode()["Pac"]) == cycles
+    benchmark(reader.decode, items=cycles)
+
+
+@pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a pseudo-terminal")
+def test_rtu_poll_with_drops(benchmark):
+    pymodbus_client = pytest.importorskip("pymodbus.client.sync")
+    pytest.importorskip("serial")
+    from power_plant_monitoring.devices.rtu import AdaptiveRtuClient
+    from power_plant_monitoring.simulator import (
+        DailyCurve,
+        Faults,
+        RtuSimulator,
+        SimulatedBus,
+        SimulatedInverter,
+    )
+
+    noon = datetime.datetime(2024, 6, 21, 13).timestamp()
+    # 5 % of the requests are lost, 2 % of the responses corrupted
+    bus = SimulatedBus(
+        {1: SimulatedInverter(1, DailyCurve(), clock=lambda: noon)},
+        latency=0.002,
+        jitter=0.002,
+        baudrate=115200,
+        faults=Faults(drop_rate=0.05, corrupt_rate=0.02),
+        seed=7,
+    )
+    simulator = RtuSimulator(bus)
+    simulator.start()
+
+    def worst_case(client, polls=60):
+        client.connect()
+        latencies = []
+        for _ in range(polls):
+            start = time.perf_counter()
+            Growatt(client, "Growatt", 1).read()
+            latencies.append(time.perf_counter() - start)
+        return max(latencies)
+
+    fixed = pymodbus_client.ModbusSerialClient(
+        method="rtu", port=simulator.path, baudrate=115200, timeout=0.5
+    )
+    adaptive = AdaptiveRtuClient(simulator.path, 115200, timeout=0.5)
+    try:
+        fixed_worst = worst_case(fixed)
+        fixed.close()
+        # the first polls calibrate with the configured timeout
+        worst_case(adaptive, polls=20)
+        adaptive_worst = worst_case(adaptive)
+        assert adaptive_worst < fixed_worst / 2, (adaptive_worst, fixed_worst)
+
+        growatt = Growatt(adaptive, "Growatt", 1)
+        benchmark(growatt.read, min_time=2.0)
+    finally:
+        adaptive.close()
+        simulator.stop()
+
+
+def _write_journal_day(directory, day_start, seconds, registers):
+    """A day of the journal at 1 Hz written with NumPy, every block of every
+    frame differs so nothing is skipped"""
+    from power_plant_monitoring.journal import HEADER, MAGIC, VERSION, frame_dtype
+    from power_plant_monitoring.registers import GROWATT_INPUT_BLOCKS
+
+    day = os.path.join(directory, time.strftime("%Y%m%d", time.gmtime(day_start)))
+    os.makedirs(day)
+    for address, count in GROWATT_INPUT_BLOCKS:
+        frames = np.zeros(len(seconds), frame_dtype(count))
+        frames["time"] = seconds * 1000
+        frames["unit"] = 1
+        frames["registers"] = registers[:, address : address + count]
+        with open(os.path.join(day, f"input_{address}_{count}.bin"), "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, address, count, day_start))
+            frames.tofile(f)
+
+
+def test_daily_report(benchmark, tmp_path):
+    from power_plant_monitoring.journal import JournalReader
+    from power_plant_monitoring.reports import ReportEngine
+
+    # 12 h of daylight at 1 Hz, a year of them is ~16 M rows
+    seconds = np.arange(6 * 3600, 18 * 3600)
+    registers = np.zeros((len(seconds), 64), np.uint16)
+    registers[:, 0] = 1
+    registers[:, 12] = (20000 * np.sin(np.pi * (seconds - seconds[0]) / 43200)).astype(
+        np.uint16
+    )
+    registers[:, 27] = (seconds - seconds[0]) // 100
+    registers[:, 31] = seconds % 65536
+    registers[:, 49] = registers[:, 27] * 6 // 10
+    registers[:, 53] = registers[:, 27] * 4 // 10
+    days = 7
+    start = datetime.date(2024, 6, 1)
+    june_1 = datetime.datetime(2024, 6, 1, tzinfo=datetime.timezone.utc).timestamp()
+    for day in range(days):
+        _write_journal_day(str(tmp_path), int(june_1) + day * 86400, seconds, registers)
+
+    engine = ReportEngine(JournalReader(str(tmp_path)), 10.0, [100.0] * 12)
+    end = start + datetime.timedelta(days=days - 1)
+    assert len(engine.daily(start, end)["date"]) == days
+    # rows per second, a year of ~16 M rows at 2 M/s takes 8 s
+    benchmark(lambda: engine.daily(start, end), items=days * len(seconds))
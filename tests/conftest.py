@@ -1,10 +1,91 @@
 """
-    Dummy conftest.py for power_plant_monitoring.
+    conftest.py for power_plant_monitoring.
 
-    If you don't know what this is for, just leave it empty.
+    Provides the ``--benchmark`` options (the benchmarks in ``tests/benchmarks``
+    are skipped without it) and shared fixtures.
     Read more about conftest.py under:
     - https://docs.pytest.org/en/stable/fixture.html
     - https://docs.pytest.org/en/stable/writing_plugins.html
 """
 
-# import pytest
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmark")
+    group.addoption(
+        "--benchmark",
+        action="store_true",
+        help="run the benchmarks and compare them against the stored baseline",
+    )
+    group.addoption(
+        "--benchmark-save",
+        action="store_true",
+        help="store the benchmark results as the new baseline",
+    )
+    group.addoption(
+        "--benchmark-threshold",
+        type=float,
+        default=0.25,
+        help="fail if a benchmark is this much slower than the baseline (0.25 = 25%%)",
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--benchmark") or config.getoption("--benchmark-save"):
+        return
+
+    skip = pytest.mark.skip(reason="benchmarks only run with --benchmark")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
+class FakeInfluxDB:
+    """A local stand-in for the InfluxDB 2.x HTTP API recording the writes"""
+
+    def __init__(self):
+        self.writes = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path.startswith("/api/v2/write"):
+                    fake.writes.append(body)
+                    self.send_response(204)
+                else:
+                    self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def fake_influxdb():
+    server = FakeInfluxDB()
+    server.start()
+    yield server
+    server.stop()
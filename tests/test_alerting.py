@@ -0,0 +1,202 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from power_plant_monitoring.alerting import (
+    Alert,
+    AlertNotifier,
+    AlertTransport,
+    HealthAlertSource,
+    StatusAlertSource,
+)
+from power_plant_monitoring.anomaly import Severity
+from power_plant_monitoring.samplebus import SampleBus
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+
+class RecordingTransport(AlertTransport):
+    def __init__(self, failures=0):
+        self.messages = []
+        self.failures = failures
+
+    async def send(self, text):
+        if self.failures:
+            self.failures -= 1
+            raise IOError("unreachable")
+        self.messages.append(text)
+
+
+def _notifier(**kwargs):
+    options = dict(debounce_sec=10, repeat_sec=100, digest_window_sec=5)
+    options.update(kwargs)
+    options.setdefault("min_interval_sec", 0)
+    return AlertNotifier(RecordingTransport(), **options)
+
+
+def test_debounce_drops_flapping_alerts():
+    notifier = _notifier()
+
+    notifier.notify(Alert("serial_unavailable", "offline"))
+    assert notifier._process(0) == []
+    notifier.notify(Alert("serial_unavailable", "online", resolved=True))
+    assert notifier._process(5) == []
+    assert notifier._process(100) == []
+    assert notifier.suppressed == 1
+
+
+def test_alerts_are_deduplicated_and_grouped():
+    notifier = _notifier()
+
+    notifier.notify(Alert("fault_26", "PV Isolation Low", Severity.CRITICAL))
+    notifier.notify(Alert("fault_26", "PV Isolation Low", Severity.CRITICAL))
+    notifier.notify(Alert("inverter_status", "Fault", Severity.CRITICAL))
+    assert notifier._process(0) == []
+    assert notifier._process(10) == []
+    digests = notifier._process(15)
+
+    assert digests == [
+        "2 alerts:\n- [CRITICAL] PV Isolation Low\n- [CRITICAL] Fault"
+    ]
+    assert notifier.suppressed == 1
+
+    # resolving reports the recovery, re-raising within repeat_sec is suppressed
+    notifier.notify(Alert("fault_26", "Fault 26 cleared", resolved=True))
+    assert notifier._process(30) == []
+    assert notifier._process(35) == ["[RESOLVED] Fault 26 cleared"]
+    notifier.notify(Alert("fault_26", "PV Isolation Low", Severity.CRITICAL))
+    assert notifier._process(50) == []
+    assert notifier._process(70) == []
+
+
+def test_min_interval_between_messages():
+    notifier = _notifier(debounce_sec=0, digest_window_sec=0, min_interval_sec=60)
+
+    notifier.notify(Alert("a", "a"))
+    assert notifier._process(0) == ["[WARNING] a"]
+    notifier.notify(Alert("b", "b"))
+    assert notifier._process(1) == []
+    assert notifier._process(61) == ["[WARNING] b"]
+
+
+def test_status_and_health_sources():
+    status = StatusAlertSource()
+    assert status.update({"StatusCode": 1, "FaultCode": 0}) == []
+
+    alerts = status.update(
+        {
+            "StatusCode": 3,
+            "Status": "Fault",
+            "FaultCode": 26,
+            "Fault": "PV Isolation Low",
+        }
+    )
+    assert [(a.key, a.resolved) for a in alerts] == [
+        ("inverter_status", False),
+        ("fault_26", False),
+    ]
+    alerts = status.update({"StatusCode": 1, "FaultCode": 0})
+    assert [(a.key, a.resolved) for a in alerts] == [
+        ("inverter_status", True),
+        ("fault_26", True),
+    ]
+
+    health = HealthAlertSource()
+    assert health.update("influxdb", True) == []
+    assert [a.key for a in health.update("influxdb", False, "timeout")] == [
+        "influxdb_unavailable"
+    ]
+    assert health.update("influxdb", False, "timeout") == []
+    assert [a.resolved for a in health.update("influxdb", True)] == [True]
+
+
+def test_backlog_health():
+    bus = SampleBus()
+    subscription = bus.subscribe("influxdb", maxlen=10)
+    health = HealthAlertSource()
+
+    def update():
+        return health.update_backlog("influxdb_backlog", subscription, 60)
+
+    now = time.time()
+    for i in range(5):
+        bus.publish("growatt", now, {"Pac": i})
+    assert update() == []
+
+    # the queue is almost full, samples are about to be dropped
+    for i in range(5):
+        bus.publish("growatt", now, {"Pac": i})
+    (alert,) = update()
+    assert alert.key == "influxdb_backlog_unavailable"
+    assert "10 samples pending" in alert.message
+
+    subscription.drain()
+    assert [a.resolved for a in update()] == [True]
+
+    # a sample waits too long
+    bus.publish("growatt", now - 120, {"Pac": 0})
+    assert "the oldest for 120 s" in update()[0].message
+
+
+def test_delivery_retries_in_background():
+    transport = RecordingTransport(failures=2)
+    notifier = AlertNotifier(
+        transport,
+        debounce_sec=0,
+        digest_window_sec=0,
+        min_interval_sec=0,
+        retry_delay_sec=0.01,
+    )
+    notifier.start()
+    try:
+        notifier.notify(Alert("a", "retried"))
+        deadline = time.monotonic() + 5
+        while not transport.messages and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        notifier.stop()
+
+    assert transport.messages == ["[WARNING] retried"]
+    assert notifier.sent == 1
+
+
+def test_telegram_transport_against_local_stand_in():
+    confuse = pytest.importorskip("confuse")
+    from power_plant_monitoring.alerting import TelegramTransport
+    import asyncio
+
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers["Content-Length"])
+            received.append((self.path, json.loads(self.rfile.read(length))))
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b'{"ok": true}')
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        config = confuse.Configuration("power_plant_monitoring_test", read=False)
+        config.set(
+            {
+                "token": "TOKEN",
+                "developer_chat_id": "42",
+                "url": f"http://127.0.0.1:{server.server_port}",
+            }
+        )
+        asyncio.run(TelegramTransport(config).send("hello"))
+    finally:
+        server.shutdown()
+
+    assert received == [("/botTOKEN/sendMessage", {"chat_id": "42", "text": "hello"})]
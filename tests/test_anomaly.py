@@ -0,0 +1,95 @@
+import random
+import time
+
+import pytest
+
+from power_plant_monitoring.anomaly import (
+    AnomalyDetector,
+    Ewma,
+    RollingStats,
+    Severity,
+)
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+
+def _sample(pv1=1000.0, pv2=1000.0, temp=40.0, fac=50.0, fault=0):
+    return {
+        "PV1Watt": pv1,
+        "PV2Watt": pv2,
+        "Vpv1": 300.0,
+        "Vpv2": 300.0,
+        "Temp": temp,
+        "Fac": fac,
+        "Vac1": 230.0,
+        "FaultCode": fault,
+        "Fault": "None" if fault == 0 else "PV Isolation Low",
+    }
+
+
+def test_rolling_stats_matches_window():
+    stats = RollingStats(5)
+    values = [random.uniform(-10, 10) for _ in range(50)]
+    for value in values:
+        stats.add(value)
+
+    window = values[-5:]
+    mean = sum(window) / 5
+    variance = sum((v - mean) ** 2 for v in window) / 4
+    assert stats.mean == pytest.approx(mean)
+    assert stats.variance == pytest.approx(variance)
+
+
+def test_ewma_converges():
+    ewma = Ewma(0.5)
+    for _ in range(50):
+        ewma.add(3.0)
+    assert ewma.mean == pytest.approx(3.0)
+    assert ewma.std == pytest.approx(0.0)
+
+
+def test_string_imbalance_raised_and_cleared():
+    detector = AnomalyDetector(window=60)
+    received = []
+    detector.subscribe(received.append)
+
+    for i in range(100):
+        assert detector.update(i, _sample(pv1=1000 + random.uniform(-5, 5))) == []
+
+    events = detector.update(100, _sample(pv1=400.0))
+    assert [(e.kind, e.severity, e.active) for e in events] == [
+        ("string_imbalance", Severity.WARNING, True)
+    ]
+    assert received == events
+
+    events = detector.update(101, _sample())
+    assert [(e.kind, e.active) for e in events] == [("string_imbalance", False)]
+
+
+def test_fault_and_grid_events():
+    detector = AnomalyDetector()
+
+    events = detector.update(0, _sample(fault=26, fac=52.0))
+    assert {(e.kind, e.severity) for e in events} == {
+        ("fault", Severity.CRITICAL),
+        ("grid_Fac", Severity.CRITICAL),
+    }
+    assert detector.update(1, _sample(fault=26, fac=52.0)) == []
+
+    events = detector.update(2, _sample(fault=27, fac=52.0))
+    assert [(e.kind, e.active) for e in events] == [("fault", False), ("fault", True)]
+
+
+def test_detection_cost_per_sample():
+    detector = AnomalyDetector()
+    samples = [_sample(pv1=1000 + random.uniform(-5, 5)) for _ in range(2000)]
+
+    start = time.perf_counter()
+    for i, sample in enumerate(samples):
+        detector.update(i, sample)
+    per_sample = (time.perf_counter() - start) / len(samples)
+
+    # a few µs on a desktop CPU, the bound leaves room for slow CI machines
+    assert per_sample < 100e-6
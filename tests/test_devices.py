@@ -0,0 +1,146 @@
+import struct
+
+import pytest
+
+from power_plant_monitoring.base import ConfigError
+from power_plant_monitoring.devices.driver import ModbusDriver
+from power_plant_monitoring.devices.register_map import (
+    MapField,
+    compile_decoder,
+    load_register_map,
+    parse_register_map,
+    plan_blocks,
+)
+from power_plant_monitoring.devices.scheduler import BusScheduler
+from power_plant_monitoring.growatt import Growatt
+from power_plant_monitoring.registers import encode
+from power_plant_monitoring.registry import drivers
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+
+class _Row:
+    def __init__(self, registers):
+        self.registers = registers
+
+    def isError(self):
+        return self.registers is None
+
+
+class _Client:
+    """Serves a register table per unit and counts the transactions"""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.transactions = 0
+
+    def read_input_registers(self, address, count, unit=1):
+        self.transactions += 1
+        table = self.tables.get(unit)
+        return _Row(None if table is None else table[address : address + count])
+
+    read_holding_registers = read_input_registers
+
+
+def test_growatt_map_decodes_like_growatt():
+    fields = {"StatusCode": 1, "Pac": 1250.5, "EnergyTotal": 12345.6, "Temp": 41.2}
+    fields.update({"FaultCode": 26, "Fac": 50.02, "Epv2_total": 99.9})
+    client = _Client({1: encode(fields)})
+
+    expected = Growatt(client, "Growatt", 1).read()
+    assert client.transactions == 4
+
+    driver = drivers.create("modbus", client, "inverter", 1, register_map="growatt")
+    assert driver.read() == expected
+    assert list(driver.read()) == list(expected)
+    # the four blocks are coalesced into one transaction
+    assert client.transactions == 4 + 2
+    assert driver.measurement == "growattd"
+
+    client.tables[1] = encode({"StatusCode": 7, "FaultCode": 99})
+    info = driver.read()
+    assert (info["Status"], info["Fault"]) == ("Unknown (7)", "Unknown (99)")
+
+    assert ModbusDriver(client, "missing", 5).read() is None
+
+
+def test_plan_blocks_and_types():
+    fields = (
+        MapField("a", 0, "s16"),
+        MapField("b", 1, "s32"),
+        MapField("c", 10, "f32"),
+        MapField("d", 30),
+        MapField("e", 0, "u32", scale=10, table="holding"),
+    )
+    blocks = plan_blocks(fields, max_gap=8, max_count=125)
+    assert [(b.table, b.address, b.count) for b in blocks] == [
+        ("input", 0, 12),
+        ("input", 30, 1),
+        ("holding", 0, 2),
+    ]
+    assert len(plan_blocks(fields, max_gap=30, max_count=20)) == 3
+    assert len(plan_blocks(fields, max_gap=30, max_count=31)) == 2
+
+    high, low = struct.unpack(">HH", struct.pack(">f", -1.5))
+    registers = [0xFFFE, 0xFFFF, 0xFFFD] + [0] * 7 + [high, low]
+    assert compile_decoder(blocks[0])(registers) == {"a": -2, "b": -3, "c": -1.5}
+
+    little = compile_decoder(blocks[2], word_order="little")
+    assert little([0x0001, 0x0002]) == {"e": (2 << 16 | 1) / 10}
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"fields": []},
+        {"fields": [{"name": "a"}]},
+        {"fields": [{"name": "a", "address": 0, "type": "u64"}]},
+        {"fields": [{"name": "a", "address": 0, "enum": {0: "off"}}]},
+        {"fields": [{"name": "a", "address": 0}, {"name": "a", "address": 1}]},
+        {"fields": [{"name": "a", "address": 0, "unit": "V"}]},
+        {"fields": [{"name": "a", "address": 0}], "word_order": "middle"},
+    ],
+)
+def test_invalid_maps(data):
+    with pytest.raises(ConfigError):
+        parse_register_map(data)
+
+
+def test_map_lookup():
+    assert load_register_map("sdm630") is load_register_map("sdm630")
+    assert len(load_register_map("sdm630").blocks()) == 1
+    with pytest.raises(ConfigError, match="available: growatt, sdm630"):
+        load_register_map("does_not_exist")
+
+
+def test_scheduler_intervals():
+    now = [0.0]
+
+    class Device:
+        def __init__(self, name, fail=False):
+            self.name = name
+            self.fail = fail
+
+        def read(self):
+            if self.fail:
+                raise IOError("timeout")
+            return {"t": now[0]}
+
+    scheduler = BusScheduler(clock=lambda: now[0])
+    scheduler.add(Device("fast"), 1)
+    scheduler.add(Device("slow", fail=True), 5)
+
+    polled = []
+    for tick in range(11):
+        now[0] = float(tick)
+        polled += [(d.name, info) for d, _, info in scheduler.poll()]
+
+    assert [info["t"] for name, info in polled if name == "fast"] == list(range(11))
+    assert [info for name, info in polled if name == "slow"] == [None] * 3
+
+    # a long busy bus is not caught up
+    now[0] = 30.5
+    assert len(scheduler.poll()) == 2
+    assert scheduler.next_due() == pytest.approx(1)
@@ -0,0 +1,79 @@
+import logging
+
+import pytest
+
+from power_plant_monitoring.energy import EnergyChannel, EnergyIntegrator
+from power_plant_monitoring.logs import RateLimitFilter
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+CHANNELS = (EnergyChannel("Pac", "EnergyToday", "EnergyToday_fine"),)
+
+
+def _sample(pac, energy_today):
+    return {"Pac": pac, "EnergyToday": energy_today}
+
+
+def test_trapezoid_integration():
+    integrator = EnergyIntegrator(CHANNELS, max_gap_sec=3600)
+
+    assert integrator.update(0, _sample(0.0, 1.0)) == {"EnergyToday_fine": 1.0}
+    # ramp 0 W -> 3600 W within one hour: 1.8 kWh
+    result = integrator.update(3600, _sample(3600.0, 2.8))
+    assert result["EnergyToday_fine"] == pytest.approx(2.8)
+    # 10 s at 3600 W = 0.01 kWh, finer than the register resolution
+    result = integrator.update(3610, _sample(3600.0, 2.8))
+    assert result["EnergyToday_fine"] == pytest.approx(2.81)
+    assert integrator.corrections == 0
+
+
+def test_gap_reanchors_to_counter(caplog):
+    integrator = EnergyIntegrator(CHANNELS, max_gap_sec=60)
+
+    integrator.update(0, _sample(1000.0, 5.0))
+    with caplog.at_level(logging.WARNING):
+        result = integrator.update(3600, _sample(1000.0, 6.0))
+    assert result["EnergyToday_fine"] == 6.0
+    # the counter moved on during the gap, that is no inconsistency
+    assert integrator.inconsistencies == 0
+    assert integrator.corrections == 0
+    assert caplog.records == []
+
+
+def test_result_stays_inside_register_window():
+    integrator = EnergyIntegrator(CHANNELS, inconsistency_threshold=0.1)
+
+    integrator.update(0, _sample(10000.0, 1.0))
+    result = integrator.update(100, _sample(10000.0, 1.0))
+    assert result["EnergyToday_fine"] == pytest.approx(1.1)
+    assert integrator.corrections == 1
+    assert integrator.inconsistencies == 1
+
+
+def test_counter_reset():
+    integrator = EnergyIntegrator(CHANNELS)
+
+    integrator.update(0, _sample(0.0, 12.3))
+    result = integrator.update(1, _sample(0.0, 0.0))
+    assert result["EnergyToday_fine"] == 0.0
+    assert integrator.resets == 1
+
+
+def test_missing_fields_are_skipped():
+    integrator = EnergyIntegrator(CHANNELS)
+    assert integrator.update(0, {"Pac": 1.0}) == {}
+
+
+def test_repeated_deviations_are_rate_limited(caplog):
+    integrator = EnergyIntegrator(CHANNELS, inconsistency_threshold=0.1)
+    caplog.handler.addFilter(RateLimitFilter(period=60, burst=2))
+
+    integrator.update(0, _sample(10000.0, 1.0))
+    with caplog.at_level(logging.WARNING):
+        for i in range(1, 6):
+            integrator.update(i * 100, _sample(10000.0, 1.0))
+    assert integrator.inconsistencies == 5
+    # one template, whatever the deviation
+    assert len(caplog.records) == 2
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+pytest.importorskip("pymodbus")
+
+from power_plant_monitoring.events import (  # noqa: E402
+    EventLog,
+    StateEvent,
+    TransitionTracker,
+    add_event_routes,
+)
+from power_plant_monitoring.samplebus import SampleBus  # noqa: E402
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+
+def _sample(status, fault):
+    return {"StatusCode": status, "FaultCode": fault, "Pac": 1000.0}
+
+
+def test_transitions_are_logged_and_queried():
+    log = EventLog(":memory:")
+    bus = SampleBus()
+    tracker = TransitionTracker("/dev/ttyUSB0", 1)
+
+    samples = (
+        [(t, _sample(1, 0)) for t in range(0, 100)]
+        + [(t, _sample(3, 26)) for t in range(100, 160)]
+        + [(t, _sample(1, 0)) for t in range(160, 200)]
+    )
+    events = []
+    for timestamp, info in samples:
+        for event in tracker.update(float(timestamp), info):
+            # the way through the bus to the event log
+            sample = bus.publish(
+                "events",
+                event.timestamp,
+                event.fields(),
+                {"port": "/dev/ttyUSB0", "unit": "1", "kind": event.kind},
+            )
+            assert StateEvent.from_sample(sample) == event
+            log.append(event)
+            events.append(event)
+
+    # the first state of each kind and two transitions each, not 200 samples
+    assert len(events) == 6
+    faults = log.events(0, 1000, kind="fault")
+    assert [(e.from_text, e.to_text) for e in faults] == [
+        (None, "None"),
+        ("None", "PV Isolation Low"),
+        ("PV Isolation Low", "None"),
+    ]
+    assert faults[2].duration == 60.0
+    assert [e.timestamp for e in log.events(kind="status", code=3)] == [100.0]
+
+    assert log.time_in_state("status", 3, 0, 1000) == 60.0
+    assert log.time_in_state("status", 3, 130, 1000) == 30.0
+    # the current state lasts until the end of the range
+    assert log.time_in_state("status", 1, 50, 300) == 50.0 + 140.0
+    assert log.time_in_state("status", 3, 0, 1000, unit=2) == 0.0
+
+    # a restart resumes the logged state instead of recording a transition
+    resumed = TransitionTracker("/dev/ttyUSB0", 1, log.last_states("/dev/ttyUSB0", 1))
+    assert resumed.update(500.0, _sample(1, 0)) == []
+    (event,) = resumed.update(600.0, _sample(0, 0))
+    assert (event.from_text, event.to_text, event.duration) == (
+        "Normal",
+        "Waiting",
+        440.0,
+    )
+
+    class Server:
+        routes = {}
+
+        def add_route(self, path, handler):
+            self.routes[path] = handler
+
+    server = Server()
+    add_event_routes(server, log)
+    status, _, body = server.routes["/events/time_in_state"](
+        {"kind": "status", "code": "3", "start": "0", "end": "1000"}
+    )
+    assert status == 200 and json.loads(body) == {"seconds": 60.0}
+    _, _, body = server.routes["/events"]({"kind": "fault", "code": "26"})
+    assert json.loads(body)[0]["to_text"] == "PV Isolation Low"
+    log.close()
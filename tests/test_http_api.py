@@ -0,0 +1,79 @@
+import json
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from power_plant_monitoring.http_api import HttpApiServer, add_live_routes  # noqa
+from power_plant_monitoring.ringbuffer import SampleRingBuffer  # noqa
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+
+def test_ring_buffer_window_and_wrap_around():
+    buffer = SampleRingBuffer(10)
+    for i in range(25):
+        buffer.append(float(i), {"Pac": i * 10.0, "Status": "Normal"})
+
+    assert buffer.fields == ("Pac",)
+    assert buffer.latest() == {"timestamp": 24.0, "Pac": 240.0}
+
+    timestamps, values = buffer.window("Pac", 3)
+    assert timestamps.tolist() == [21.0, 22.0, 23.0, 24.0]
+    assert values.tolist() == [210.0, 220.0, 230.0, 240.0]
+
+    # older samples were overwritten (the oldest slot is never read)
+    timestamps, _ = buffer.window("Pac", 1000)
+    assert timestamps.tolist() == [float(i) for i in range(16, 25)]
+
+    _, values = buffer.window("Pac", 2, now=20.0)
+    assert values.tolist() == [180.0, 190.0, 200.0]
+
+    assert buffer.aggregate("Pac", 3) == {
+        "count": 4,
+        "mean": 225.0,
+        "min": 210.0,
+        "max": 240.0,
+        "last": 240.0,
+    }
+
+
+def _get(server, path):
+    url = f"http://127.0.0.1:{server.port}{path}"
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as ex:
+        return ex.code, json.loads(ex.read())
+
+
+def test_live_routes():
+    buffer = SampleRingBuffer(100)
+    now = time.time()
+    for i in range(10):
+        buffer.append(now - 9 + i, {"Pac": float(i), "Temp": 40.0})
+
+    server = HttpApiServer(port=0)
+    add_live_routes(server, buffer)
+    server.start()
+    try:
+        status, latest = _get(server, "/latest")
+        assert status == 200
+        assert latest["Pac"] == 9.0
+
+        status, window = _get(server, "/window?field=Pac&seconds=2")
+        assert window["values"] == [7.0, 8.0, 9.0]
+
+        status, aggregate = _get(server, "/aggregate?field=Temp&seconds=600")
+        assert aggregate["count"] == 10
+        assert aggregate["mean"] == 40.0
+
+        assert _get(server, "/window?field=Nope")[0] == 400
+        assert _get(server, "/nope")[0] == 404
+    finally:
+        server.stop()
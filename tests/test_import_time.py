@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import power_plant_monitoring
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+#: maximum cumulative import time of the CLI module (generous for slow gateways)
+IMPORT_TIME_BUDGET_MS = 150
+
+#: modules that must only be imported once they are actually used
+HEAVY_MODULES = ["confuse", "influxdb_client", "pymodbus", "requests", "numpy"]
+
+
+def _run_python(*args):
+    env = dict(os.environ)
+    package_root = str(Path(power_plant_monitoring.__file__).resolve().parents[1])
+    env["PYTHONPATH"] = os.pathsep.join(
+        [package_root] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else [])
+    )
+    return subprocess.run(
+        [sys.executable, *args], env=env, capture_output=True, text=True, check=True
+    )
+
+
+def _cumulative_import_time_us(module):
+    """Parse the output of ``python -X importtime`` for ``module``"""
+    result = _run_python("-X", "importtime", "-c", f"import {module}")
+
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if name.strip() == module:
+            return int(cumulative)
+
+    raise AssertionError(f"{module} not found in importtime output")
+
+
+def test_app_import_time():
+    cumulative_us = _cumulative_import_time_us("power_plant_monitoring.app")
+    assert cumulative_us / 1000 < IMPORT_TIME_BUDGET_MS
+
+
+def test_app_import_is_lazy():
+    result = _run_python(
+        "-c",
+        "import sys, power_plant_monitoring.app, power_plant_monitoring.registry;"
+        "print(' '.join(sorted(sys.modules)))",
+    )
+    loaded = set(result.stdout.split())
+    assert [module for module in HEAVY_MODULES if module in loaded] == []
+
+
+def test_version_does_not_import_dependencies():
+    result = _run_python(
+        "-c",
+        "import sys\n"
+        "from power_plant_monitoring import app\n"
+        "try:\n"
+        "    app.parse_args(['--version'])\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print(' '.join(sorted(sys.modules)))",
+    )
+    loaded = set(result.stdout.split())
+    assert [module for module in HEAVY_MODULES if module in loaded] == []
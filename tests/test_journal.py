@@ -0,0 +1,115 @@
+import os
+
+import numpy as np
+import pytest
+
+from power_plant_monitoring.growatt import Growatt
+from power_plant_monitoring.journal import FrameJournal, JournalReader
+from power_plant_monitoring.registers import RegisterField, encode
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+DAY = 1718928000  # 2024-06-21 00:00 UTC
+
+
+class _Row:
+    def __init__(self, registers):
+        self.registers = registers
+
+    def isError(self):
+        return False
+
+
+class _Client:
+    def __init__(self):
+        self.fields = {}
+
+    def read_input_registers(self, address, count, unit=1):
+        return _Row(encode(self.fields)[address : address + count])
+
+
+def test_growatt_frames_decode_like_read(tmp_path):
+    journal = FrameJournal(str(tmp_path))
+    client = _Client()
+    growatt = Growatt(client, "Growatt", 3, journal=journal)
+
+    samples = []
+    for pac in (1200.0, 1250.5, 1250.5, 980.1):
+        client.fields = {"StatusCode": 1, "Pac": pac, "EnergyTotal": 12345.6}
+        client.fields["Temp"] = 30.0 + pac / 100
+        samples.append(growatt.read())
+    journal.close()
+
+    # only block 0 changes, and not in the third read
+    assert journal.skipped == 3 * 3 + 1
+    columns = JournalReader(str(tmp_path)).decode()
+
+    expected = [samples[0], samples[1], samples[3]]
+    assert list(columns["unit"]) == [3, 3, 3]
+    for name in ("StatusCode", "Pac", "EnergyTotal", "Temp", "FaultCode", "PBusV"):
+        assert list(columns[name]) == [sample[name] for sample in expected], name
+
+
+def test_errors_partial_frames_and_days(tmp_path):
+    journal = FrameJournal(str(tmp_path))
+    for i in range(3):
+        journal.record(DAY + 60 * i, 1, 0, 2, [1, i])
+        journal.record(DAY + 60 * i, 1, 2, 1, None if i == 1 else [i])
+    journal.record(DAY + 86400 + 5, 1, 0, 2, [1, 7])
+    journal.close()
+
+    reader = JournalReader(str(tmp_path))
+    assert reader.days() == ["20240621", "20240622"]
+    assert reader.blocks("20240621") == [(0, 2), (2, 1)]
+
+    path = os.path.join(str(tmp_path), "20240621", "input_0_2.bin")
+    with open(path, "ab") as f:
+        f.write(b"\x01\x02\x03")  # a crash in the middle of a frame
+
+    timestamps, frames = reader.frames("20240621", 2, 1)
+    assert list(timestamps) == [DAY, DAY + 60, DAY + 120]
+    assert list(frames["flags"]) == [0, 1, 0]
+
+    layout = (RegisterField("A", 0, 2, 1), RegisterField("B", 2, 1, 1))
+    columns = reader.decode(end=DAY + 86400, layout=layout)
+    assert list(columns["A"]) == [65536, 65537, 65538]
+    assert np.isnan(columns["B"][1])
+    assert list(columns["B"][[0, 2]]) == [0, 2]
+
+    assert len(reader.decode(start=DAY + 86400, layout=layout)["A"]) == 1
+
+    # appending after the crash drops the partial frame
+    journal = FrameJournal(str(tmp_path))
+    journal.record(DAY + 300, 1, 0, 2, [1, 9])
+    journal.close()
+    assert list(reader.frames("20240621", 0, 2)[1]["registers"][:, 1]) == [
+        0,
+        1,
+        2,
+        9,
+    ]
+
+
+def test_day_size(tmp_path):
+    journal = FrameJournal(str(tmp_path))
+    for second in range(0, 86400, 60):
+        journal.record(DAY + second, 1, 0, 33, [second % 65536] * 33)
+    journal.close()
+
+    size = os.path.getsize(os.path.join(str(tmp_path), "20240621", "input_0_33.bin"))
+    # 72 bytes per frame: a day at 1 s stays at about 6 MB for this block
+    assert size == pytest.approx(1440 * 72, abs=32)
+
+
+def test_unchanged_frames_keepalive(tmp_path):
+    journal = FrameJournal(str(tmp_path), keepalive=60)
+    for second in range(0, 300, 10):
+        journal.record(DAY + second, 1, 0, 33, [7] * 33)
+    journal.close()
+
+    # the first frame and one a minute
+    assert journal.written == 5
+    timestamps, _ = JournalReader(str(tmp_path)).frames("20240621", 0, 33)
+    assert list(timestamps - DAY) == [0, 60, 120, 180, 240]
@@ -0,0 +1,87 @@
+import json
+import logging
+import threading
+
+import pytest
+
+from power_plant_monitoring.logs import (
+    JsonFormatter,
+    RateLimitFilter,
+    configure_logging,
+    stop_listener,
+)
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+
+def _record(msg, *args, level=logging.ERROR):
+    return logging.LogRecord("test", level, __file__, 1, msg, args, None)
+
+
+def test_rate_limit_per_template():
+    now = [0.0]
+    limit = RateLimitFilter(period=60, burst=2, clock=lambda: now[0])
+
+    passed = [limit.filter(_record("Inverter offline: %s", i)) for i in range(5)]
+    assert passed == [True, True, False, False, False]
+    assert limit.filter(_record("Something else"))
+
+    now[0] = 61.0
+    record = _record("Inverter offline: %s", 5)
+    assert limit.filter(record)
+    assert record.suppressed == 3
+
+
+def test_json_formatter():
+    record = _record("Read %s registers", 33)
+    record.suppressed = 2
+    data = json.loads(JsonFormatter().format(record))
+
+    assert data["message"] == "Read 33 registers"
+    assert data["level"] == "ERROR"
+    assert data["suppressed"] == 2
+
+
+@pytest.fixture
+def root_logger():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield root
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_configure_logging_is_lazy_and_asynchronous(root_logger, tmp_path):
+    class Expensive:
+        #: threads which formatted the value
+        threads = []
+
+        def __str__(self):
+            Expensive.threads.append(threading.get_ident())
+            return "expensive"
+
+    filename = str(tmp_path / "app.log")
+    listener = configure_logging(
+        logging.INFO, filename=filename, stdout=False, rate_limit=(60, 1)
+    )
+    logger = logging.getLogger("power_plant_monitoring.test")
+    value = Expensive()
+
+    logger.debug("Not enabled: %s", value)
+    logger.info("Value: %s", value)
+    logger.info("Value: %s", value)
+    stop_listener(listener)
+
+    with open(filename) as f:
+        lines = f.read().splitlines()
+
+    # only the listener thread formats (the file handler possibly twice)
+    assert Expensive.threads
+    assert threading.get_ident() not in Expensive.threads
+    assert len(lines) == 1
+    assert lines[0].endswith("Value: expensive")
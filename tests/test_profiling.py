@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+
+from power_plant_monitoring import profiling
+from power_plant_monitoring.http_api import HttpError
+from power_plant_monitoring.profiling import Profiler, add_profiling_routes, span
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+
+def _wait(profiler):
+    deadline = time.monotonic() + 10
+    while profiler.busy and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def _busy_worker(stop):
+    while not stop.is_set():
+        with span("work"):
+            sum(range(1000))
+
+
+def test_span_is_a_no_op_without_capture():
+    assert span("read") is span("write")
+    assert profiling._recorder is None
+
+
+def test_cpu_capture_samples_all_threads(tmp_path):
+    profiler = Profiler(str(tmp_path), sample_interval=0.001)
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_worker, args=(stop,), name="Worker")
+    worker.start()
+    try:
+        path = profiler.trigger("cpu", 0.2)
+        assert path is not None
+        # only one capture at a time
+        assert profiler.trigger("memory", 0.1) is None
+        _wait(profiler)
+    finally:
+        stop.set()
+        worker.join()
+
+    with open(path) as f:
+        content = f.read()
+    assert "_busy_worker" in content
+    assert "Worker;" in content
+    assert "\nwork " in content
+
+
+def test_memory_capture(tmp_path):
+    profiler = Profiler(str(tmp_path))
+    path = profiler.trigger("memory", 0.1)
+    _wait(profiler)
+
+    with open(path) as f:
+        assert "# top 30 allocators" in f.read()
+
+
+def test_profile_route_rejects_invalid_durations(tmp_path):
+    class Server:
+        routes = {}
+
+        def add_route(self, path, handler):
+            self.routes[path] = handler
+
+    server = Server()
+    profiler = Profiler(str(tmp_path))
+    add_profiling_routes(server, profiler)
+    for seconds in ("inf", "nan", "-1", "0", "3600", "ten"):
+        with pytest.raises(HttpError) as raised:
+            server.routes["/profile"]({"kind": "memory", "seconds": seconds})
+        assert raised.value.status == 400
+    assert not profiler.busy
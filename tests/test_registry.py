@@ -0,0 +1,23 @@
+import pytest
+
+from power_plant_monitoring.base import ConfigError
+from power_plant_monitoring.registry import Registry
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+
+def test_registry_resolves_lazily():
+    registry = Registry("sink")
+    registry.register("ordered_dict", "collections:OrderedDict")
+
+    assert registry.names() == ["ordered_dict"]
+    assert registry.create("ordered_dict", a=1) == {"a": 1}
+    assert isinstance(registry._entries["ordered_dict"], type)
+
+
+def test_registry_unknown_name():
+    registry = Registry("reader")
+    with pytest.raises(ConfigError):
+        registry.get("does_not_exist")
@@ -0,0 +1,201 @@
+import logging
+import time
+
+import pytest
+
+from power_plant_monitoring.reload import ConfigReloader
+
+confuse = pytest.importorskip("confuse")
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+CONFIG = """\
+growatt:
+    interval_sec: 1
+    port: "/dev/ttyUSB0"
+    mode: "single"
+influxdb:
+    url: "http://localhost:8086"
+"""
+
+
+class _Component:
+    def __init__(self, value):
+        self.value = value
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def _load(path):
+    config = confuse.Configuration("power_plant_monitoring_test", read=False)
+    config.set_file(str(path))
+    return config
+
+
+def _reloader(path, watch_interval=None):
+    reloader = ConfigReloader(
+        lambda: _load(path), _load(path), str(path), watch_interval
+    )
+    swapped = []
+
+    def build_port(config, components):
+        return _Component(config["growatt"]["port"].get(str))
+
+    def build_sink(config, components):
+        url = config["influxdb"]["url"].get(str)
+        if not url.startswith("http"):
+            raise ValueError(f"invalid url {url}")
+        return _Component(url)
+
+    reloader.watch(
+        "interval",
+        ("growatt.interval_sec",),
+        lambda config, _: config["growatt"]["interval_sec"].get(int),
+    )
+    reloader.watch("port", ("growatt.port",), build_port)
+    reloader.watch(
+        "sink",
+        ("influxdb",),
+        build_sink,
+        lambda old, new: (swapped.append((old.value, new.value)), old.close()),
+    )
+    return reloader, swapped
+
+
+def test_changed_components_are_replaced(tmp_path, caplog):
+    path = tmp_path / "config.yml"
+    path.write_text(CONFIG)
+    reloader, swapped = _reloader(path)
+    port, sink = reloader.components["port"], reloader.components["sink"]
+
+    path.write_text(
+        CONFIG.replace("interval_sec: 1", "interval_sec: 5").replace(
+            "localhost", "influxdb"
+        )
+    )
+    assert reloader.reload()
+    assert reloader.components["interval"] == 5
+    # the port did not change, its connection is kept
+    assert reloader.components["port"] is port
+    assert reloader.components["sink"].value == "http://influxdb:8086"
+    assert swapped == [("http://localhost:8086", "http://influxdb:8086")]
+    assert sink.closed
+
+    # invalid: nothing is applied, the sink built before the failure is closed
+    path.write_text(
+        CONFIG.replace("interval_sec: 1", "interval_sec: 10").replace(
+            "http://localhost", "localhost"
+        )
+    )
+    with caplog.at_level(logging.ERROR):
+        assert not reloader.reload()
+    assert "invalid url" in caplog.text
+    assert reloader.components["interval"] == 5
+    assert not reloader.components["sink"].closed
+
+    path.write_text("growatt: [")
+    assert not reloader.reload()
+    assert reloader.components["interval"] == 5
+
+    # settings no component is built from are applied on the next start
+    path.write_text(CONFIG.replace('"single"', '"sharded"'))
+    caplog.clear()
+    with caplog.at_level(logging.WARNING):
+        assert reloader.reload()
+    assert "on the next start: growatt.mode" in caplog.text
+    assert reloader.components["interval"] == 1
+
+
+def _wait_for_port(reloader, port):
+    deadline = time.monotonic() + 5.0
+    while reloader.components["port"].value != port:
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+
+@pytest.mark.parametrize("watch_interval", [0.05, None])
+def test_file_watch_and_request(tmp_path, watch_interval):
+    path = tmp_path / "config.yml"
+    path.write_text(CONFIG)
+    reloader, _ = _reloader(path, watch_interval)
+    reloader.start()
+    try:
+        path.write_text(CONFIG.replace("/dev/ttyUSB0", "/dev/ttyUSB1"))
+        if watch_interval is None:
+            # SIGHUP
+            reloader.request()
+        _wait_for_port(reloader, "/dev/ttyUSB1")
+    finally:
+        reloader.stop()
+
+
+PORT_CONFIG = """\
+growatt:
+    port: "tcp://127.0.0.1:1502"
+    offline_interval_sec: 60
+grid_inverter_service:
+    devices:
+        - name: "grid_meter"
+          map: "sdm630"
+          unit: 2
+"""
+
+
+def test_port_change_replaces_the_breakers(tmp_path):
+    pytest.importorskip("pymodbus")
+    from power_plant_monitoring.app import PORT_SETTINGS, PortAcquisition
+    from power_plant_monitoring.resilience import breakers
+
+    path = tmp_path / "config.yml"
+    path.write_text(PORT_CONFIG)
+    reloader = ConfigReloader(lambda: _load(path), _load(path), str(path))
+    # as in the application: registered once live
+    reloader.watch(
+        "acquisition",
+        PORT_SETTINGS,
+        lambda config, _: PortAcquisition(config),
+        lambda old, new: new.register_breakers(),
+    ).register_breakers()
+
+    def validate(config, components):
+        if config["growatt"]["port"].get(str).endswith("1504"):
+            raise ValueError("port reserved")
+
+    reloader.watch("validation", ("growatt.port",), validate)
+
+    def device_breaker(acquisition):
+        (breaker,) = acquisition.devices.breakers
+        return breaker
+
+    def live():
+        return {b.name: b for b in breakers()}
+
+    path.write_text(PORT_CONFIG.replace("1502", "1503"))
+    assert reloader.reload()
+    new = reloader.components["acquisition"]
+    assert new.port == "tcp://127.0.0.1:1503"
+    # the devices are gated by the breaker of the new port
+    assert device_breaker(new).parent is new.serial
+    assert new.inverter.parent is new.serial
+    assert live()["device grid_meter"] is device_breaker(new)
+    assert live()["serial tcp://127.0.0.1:1503"] is new.serial
+
+    # the reset timeout of the breakers
+    path.write_text(PORT_CONFIG.replace("1502", "1503").replace("sec: 60", "sec: 30"))
+    assert reloader.reload()
+    newest = reloader.components["acquisition"]
+    assert newest.serial is not new.serial
+    assert newest.serial._reset_timeout == 30
+    assert device_breaker(newest)._reset_timeout == 30
+    assert device_breaker(newest).parent is newest.serial
+
+    # rejected: the acquisition built for the validation is never registered
+    path.write_text(PORT_CONFIG.replace("1502", "1504"))
+    assert not reloader.reload()
+    assert reloader.components["acquisition"] is newest
+    assert live()["device grid_meter"] is device_breaker(newest)
+    assert "serial tcp://127.0.0.1:1504" not in live()
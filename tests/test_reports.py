@@ -0,0 +1,130 @@
+import calendar
+import csv
+import datetime
+import io
+import json
+import math
+
+import pytest
+
+from power_plant_monitoring.journal import FrameJournal, JournalReader
+from power_plant_monitoring.registers import GROWATT_INPUT_BLOCKS, encode
+from power_plant_monitoring.reports import ReportEngine, write_csv, write_json
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+JUNE_1 = calendar.timegm((2024, 6, 1, 0, 0, 0))
+
+
+def _record_day(journal, day_start, time_total, fault=None):
+    """A day of samples every minute from 04:00 to 20:00 UTC, peak at noon,
+    returns the TimeTotal at the end of the day"""
+    energy = 0.0
+    for minute in range(4 * 60, 20 * 60 + 1):
+        timestamp = day_start + minute * 60
+        pac = 5000.0 * math.sin(math.pi * (minute - 240) / 960) ** 2
+        energy += pac * 60 / 3.6e6
+        faulty = fault is not None and fault[0] <= minute < fault[1]
+        registers = encode(
+            {
+                "StatusCode": 3 if faulty else 1,
+                "FaultCode": 26 if faulty else 0,
+                "Pac": pac,
+                "EnergyToday": energy,
+                "TimeTotal": time_total,
+                "Epv1_today": 0.6 * energy,
+                "Epv2_today": 0.4 * energy,
+            }
+        )
+        for address, count in GROWATT_INPUT_BLOCKS:
+            journal.record(
+                timestamp, 1, address, count, registers[address : address + count]
+            )
+        time_total += 60
+    return time_total
+
+
+@pytest.fixture
+def engine(tmp_path):
+    journal = FrameJournal(str(tmp_path))
+    time_total = _record_day(journal, JUNE_1, 1000.0, fault=(14 * 60, 14 * 60 + 30))
+    _record_day(journal, JUNE_1 + 86400, time_total)
+    journal.close()
+    expected = [30, 50, 90, 120, 140, 150, 150, 130, 100, 60, 30, 20]
+    return ReportEngine(JournalReader(str(tmp_path)), 10.0, expected)
+
+
+def test_daily_report(engine):
+    report = engine.daily(datetime.date(2024, 5, 30), datetime.date(2024, 6, 2))
+
+    assert [str(date) for date in report["date"]] == ["2024-06-01", "2024-06-02"]
+    # 16 h at half the peak, in steps of the 0.1 kWh register
+    assert report["yield_kwh"] == pytest.approx([40.0, 40.0])
+    assert report["peak_pac_w"] == pytest.approx([5000.0, 5000.0])
+    assert report["peak_time"][0] == JUNE_1 + 12 * 3600
+    assert report["epv1_share"] == pytest.approx([0.6, 0.6], abs=0.01)
+    # the second day continues TimeTotal from the last sample of the first
+    assert report["operating_hours"] == pytest.approx([16.0, 16.0 + 1 / 60])
+    assert report["fault_hours"] == pytest.approx([0.5, 0.0])
+    assert list(report["faults"]) == [1, 0]
+    assert report["specific_yield"] == pytest.approx([4.0, 4.0])
+    # 150 kWh/kWp in June are 5 a day
+    assert report["expected_yield"] == pytest.approx([5.0, 5.0])
+    assert report["performance_ratio"] == pytest.approx([0.8, 0.8])
+
+    monthly = engine.monthly(report)
+    assert [str(date) for date in monthly["date"]] == ["2024-06-01"]
+    assert monthly["yield_kwh"] == pytest.approx([80.0])
+    assert monthly["expected_yield"] == pytest.approx([10.0])
+    assert monthly["performance_ratio"] == pytest.approx([0.8])
+    assert monthly["peak_time"][0] == JUNE_1 + 12 * 3600
+
+    out = io.StringIO()
+    write_csv(monthly, out)
+    (row,) = csv.DictReader(io.StringIO(out.getvalue()))
+    assert row["date"] == "2024-06-01" and row["faults"] == "1"
+    assert row["peak_time"] == "2024-06-01T12:00:00+00:00"
+
+    out = io.StringIO()
+    write_json(report, out)
+    rows = json.loads(out.getvalue())
+    assert rows[1]["fault_hours"] == 0.0 and rows[0]["yield_kwh"] == 40.0
+
+
+def test_report_without_baseline(tmp_path):
+    journal = FrameJournal(str(tmp_path))
+    _record_day(journal, JUNE_1, 0.0)
+    journal.close()
+
+    report = ReportEngine(JournalReader(str(tmp_path))).daily(
+        datetime.date(2024, 6, 1), datetime.date(2024, 6, 1)
+    )
+    assert math.isnan(report["specific_yield"][0])
+    out = io.StringIO()
+    write_json(report, out)
+    assert json.loads(out.getvalue())[0]["performance_ratio"] is None
+
+    with pytest.raises(ValueError):
+        ReportEngine(JournalReader(str(tmp_path)), 10.0, [100.0])
+
+
+def test_static_fault_longer_than_max_gap(tmp_path):
+    journal = FrameJournal(str(tmp_path))
+    fault = encode({"StatusCode": 3, "FaultCode": 26, "TimeTotal": 1000.0})
+    normal = encode({"StatusCode": 1, "FaultCode": 0, "TimeTotal": 1000.0})
+    # two hours in a fault with constant registers, polled every 10 s
+    start = JUNE_1 + 10 * 3600
+    for second in range(0, 2 * 3600 + 1, 10):
+        registers = fault if second < 2 * 3600 else normal
+        for address, count in GROWATT_INPUT_BLOCKS:
+            journal.record(
+                start + second, 1, address, count, registers[address : address + count]
+            )
+    journal.close()
+
+    day = datetime.date(2024, 6, 1)
+    report = ReportEngine(JournalReader(str(tmp_path)), max_gap=300).daily(day, day)
+    assert report["fault_hours"] == pytest.approx([2.0])
+    assert list(report["faults"]) == [1]
@@ -0,0 +1,166 @@
+import pytest
+
+from power_plant_monitoring.base import (
+    BadRequest,
+    CircuitOpen,
+    ExchangeNotAvailable,
+    NullResponse,
+    RateLimitExceeded,
+    RequestTimeout,
+)
+from power_plant_monitoring.devices.scheduler import BusScheduler
+from power_plant_monitoring.resilience import CircuitBreaker, State, classify
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+
+def test_classify_library_errors():
+    pymodbus = pytest.importorskip("pymodbus.exceptions")
+    requests = pytest.importorskip("requests")
+
+    assert isinstance(classify(pymodbus.ModbusIOException("x")), RequestTimeout)
+    assert isinstance(
+        classify(pymodbus.ConnectionException("x")), ExchangeNotAvailable
+    )
+    assert isinstance(classify(requests.exceptions.ReadTimeout()), RequestTimeout)
+    assert isinstance(classify(TimeoutError()), RequestTimeout)
+
+    response = requests.models.Response()
+    response.status_code = 429
+    response.headers["Retry-After"] = "120"
+    error = classify(requests.exceptions.HTTPError(response=response))
+    assert isinstance(error, RateLimitExceeded)
+    assert error.retry_after == 120.0
+
+    response.status_code = 404
+    error = classify(requests.exceptions.HTTPError(response=response))
+    assert isinstance(error, BadRequest)
+
+    rest = pytest.importorskip("influxdb_client.rest")
+    error = classify(rest.ApiException(status=503))
+    assert isinstance(error, ExchangeNotAvailable)
+    assert isinstance(error.__cause__, rest.ApiException)
+
+    # programming errors are no endpoint errors
+    assert classify(KeyError("x")) is None
+    assert classify(FileNotFoundError()) is None
+
+
+class _Endpoint:
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+        return "ok"
+
+
+def test_breaker_opens_probes_and_closes():
+    now = [0.0]
+    breaker = CircuitBreaker(
+        "unit", reset_timeout=10, retry_burst=0, clock=lambda: now[0]
+    )
+    endpoint = _Endpoint(*[TimeoutError()] * 4)
+
+    for _ in range(3):
+        with pytest.raises(RequestTimeout):
+            breaker.call(endpoint)
+    assert breaker.state is State.OPEN
+
+    # shed without calling the endpoint
+    with pytest.raises(CircuitOpen):
+        breaker.call(endpoint)
+    assert endpoint.calls == 3
+
+    # a failed probe doubles the open time
+    now[0] = 10
+    with pytest.raises(RequestTimeout):
+        breaker.call(endpoint)
+    now[0] = 29
+    assert not breaker.allow()
+
+    now[0] = 30
+    assert breaker.call(endpoint) == "ok"
+    assert breaker.state is State.CLOSED
+    assert breaker.rejected == 2
+
+    # a rate limit opens at once for the requested time
+    error = RateLimitExceeded("slow down")
+    error.retry_after = 300
+    with pytest.raises(RateLimitExceeded):
+        breaker.call(_Endpoint(error))
+    now[0] = 329
+    assert not breaker.allow()
+
+
+def test_retry_budget():
+    breaker = CircuitBreaker("unit", retry_ratio=0.5, retry_burst=1)
+
+    # the saved up retry, then half a retry is earned per call
+    assert breaker.call(_Endpoint(TimeoutError())) == "ok"
+    with pytest.raises(RequestTimeout):
+        breaker.call(_Endpoint(TimeoutError()))
+    flaky = _Endpoint(TimeoutError())
+    assert breaker.call(flaky) == "ok"
+    assert flaky.calls == 2
+
+    # bad requests are not retried
+    flaky = _Endpoint(BadRequest("x"))
+    with pytest.raises(BadRequest):
+        breaker.call(flaky)
+    assert flaky.calls == 1
+
+
+def test_bus_breaker_sheds_its_units_only_on_bus_errors():
+    now = [0.0]
+    bus = CircuitBreaker(
+        "bus", trips_on=(ExchangeNotAvailable,), clock=lambda: now[0]
+    )
+    units = {
+        name: CircuitBreaker(name, parent=bus, retry_burst=0, clock=lambda: now[0])
+        for name in ("a", "b")
+    }
+
+    class Device:
+        def __init__(self, name):
+            self.name = name
+            self.reads = 0
+            self.failure = None
+
+        def read(self):
+            self.reads += 1
+            if self.failure is not None:
+                raise self.failure
+            return None if self.name == "b" else {"t": now[0]}
+
+    devices = {name: Device(name) for name in units}
+    scheduler = BusScheduler(clock=lambda: now[0])
+    for name, device in devices.items():
+        scheduler.add(device, 1, units[name])
+
+    polled = []
+    for tick in range(10):
+        now[0] = float(tick)
+        polled += [(d.name, info) for d, _, info in scheduler.poll()]
+
+    # the silent unit is shed after three no responses, the other keeps its rate
+    assert [info for name, info in polled if name == "b"] == [None] * 3
+    assert len([name for name, _ in polled if name == "a"]) == 10
+    assert units["b"].state is State.OPEN
+    assert isinstance(units["b"].last_error, NullResponse)
+    assert bus.state is State.CLOSED
+
+    # the port is gone: the bus opens and sheds every unit
+    devices["a"].failure = ConnectionResetError()
+    for tick in range(10, 20):
+        now[0] = float(tick)
+        scheduler.poll()
+    assert bus.state is State.OPEN
+    assert units["a"].state is State.CLOSED
+    assert devices["a"].reads == 13
@@ -0,0 +1,92 @@
+import datetime
+import os
+import time
+
+import pytest
+
+pytest.importorskip("pymodbus")
+
+from power_plant_monitoring.devices.rtu import (  # noqa: E402
+    MIN_FRAME_GAP,
+    AdaptiveRtuClient,
+    LinkTiming,
+)
+from power_plant_monitoring.simulator import (  # noqa: E402
+    DailyCurve,
+    Faults,
+    RtuSimulator,
+    SimulatedBus,
+    SimulatedInverter,
+)
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+
+def test_link_timing():
+    timing = LinkTiming(9600, max_timeout=1.0, min_timeout=0.05, warmup=10)
+    assert timing.timeout(1, "4_0_33") == 1.0
+
+    for i in range(10):
+        timing.observe(1, "4_0_33", 0.1 + i * 0.001)
+    assert timing.timeout(1, "4_0_33") == pytest.approx(3 * 0.109)
+    # never below the transfer time of the frame
+    assert timing.timeout(1, "4_0_33", 300) == pytest.approx(0.05 + 300 * 10 / 9600)
+
+    # a silent block gets more time until it answers again
+    timing.observe_timeout(1, "4_0_33")
+    assert timing.timeout(1, "4_0_33") == pytest.approx(0.654)
+    timing.observe_timeout(1, "4_0_33")
+    assert timing.timeout(1, "4_0_33") == 1.0
+    timing.observe(1, "4_0_33", 0.1)
+    assert timing.timeout(1, "4_0_33") == pytest.approx(3 * 0.109)
+
+    # buffered responses arrive faster than the line, a slow adapter slower
+    assert timing.frame_gap == pytest.approx(3.5 * 10 / 9600)
+    for _ in range(10):
+        timing.observe_stream(60, 0.001)
+    assert timing.char_time == pytest.approx(10 / 9600)
+    for _ in range(11):
+        timing.observe_stream(60, 0.12)
+    assert timing.stats()["measured_baudrate"] == 5000
+    assert LinkTiming(115200).frame_gap == MIN_FRAME_GAP
+
+
+@pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a pseudo-terminal")
+def test_adaptive_client_against_simulator():
+    pytest.importorskip("serial")
+    noon = datetime.datetime(2024, 6, 21, 13).timestamp()
+    faults = Faults()
+    bus = SimulatedBus(
+        {1: SimulatedInverter(1, DailyCurve(), clock=lambda: noon)},
+        latency=0.002,
+        baudrate=115200,
+        faults=faults,
+    )
+    simulator = RtuSimulator(bus)
+    simulator.start()
+    client = AdaptiveRtuClient(simulator.path, 115200, timeout=1.0)
+    client.connect()
+    try:
+        for _ in range(10):
+            assert not client.read_input_registers(0, 33, unit=1).isError()
+        block = client.timing.stats()["blocks"][0]
+        assert block["samples"] == 10 and block["timeout"] < 0.5
+
+        # a lost frame costs the calibrated timeout, not the configured one
+        faults.drop_rate = 1.0
+        start = time.perf_counter()
+        assert client.read_input_registers(0, 33, unit=1).isError()
+        assert time.perf_counter() - start < 0.5
+        assert client.timing.timeouts == 1
+
+        # a corrupted response is retried at once
+        faults.drop_rate, faults.corrupt_rate = 0.0, 1.0
+        requests = bus.stats["requests"]
+        assert client.read_input_registers(0, 33, unit=1).isError()
+        assert bus.stats["requests"] == requests + 2
+        assert client.timing.damaged == 2
+    finally:
+        client.close()
+        simulator.stop()
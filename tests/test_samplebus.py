@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+from power_plant_monitoring.samplebus import Policy, SampleBus, SubscriberThread
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+
+def test_topics_fields_and_shared_samples():
+    bus = SampleBus()
+    inline = []
+    bus.subscribe("inline", "growatt", policy=Policy.INLINE, callback=inline.append)
+    devices = bus.subscribe("devices", "device/*")
+    status = bus.subscribe("status", fields=("StatusCode",))
+
+    fields = {"StatusCode": 1, "Pac": 1200.0}
+    sample = bus.publish("growatt", 1.0, fields, {"unit": "1"})
+    bus.publish("device/grid_meter", 2.0, {"Pac": -300.0})
+
+    assert inline == [sample]
+    assert [s.topic for s in devices.drain()] == ["device/grid_meter"]
+    # the same object for every subscriber, not a copy
+    assert status.get(timeout=0) is sample
+    assert status.get(timeout=0) is None
+
+    with pytest.raises(TypeError):
+        sample.fields["Pac"] = 0.0
+    assert sample.tags["unit"] == "1"
+    assert sample.sequence == 0 and bus.published == 2
+
+
+def test_policies_drops_and_lag():
+    bus = SampleBus()
+    latest = bus.subscribe("latest", policy=Policy.LATEST)
+    queue = bus.subscribe("queue", maxlen=3)
+
+    now = time.time()
+    for i in range(5):
+        bus.publish("growatt", now - 10 + i, {"i": i})
+
+    assert [s.fields["i"] for s in latest.drain()] == [4]
+    assert latest.dropped == 4
+
+    assert queue.pending == 3 and queue.dropped == 2
+    assert queue.lag == pytest.approx(8, abs=1)
+    assert queue.get().fields["i"] == 2
+
+    stats = {entry["name"]: entry for entry in bus.stats()}
+    assert stats["queue"]["pending"] == 2
+    assert stats["queue"]["delivered"] == 1
+    assert stats["latest"]["lag_seconds"] == 0.0
+
+
+def test_inline_errors_do_not_stop_delivery():
+    bus = SampleBus()
+
+    def fail(sample):
+        raise ValueError("broken consumer")
+
+    bus.subscribe("broken", policy=Policy.INLINE, callback=fail)
+    queue = bus.subscribe("queue")
+    bus.publish("growatt", 1.0, {})
+    assert queue.pending == 1
+
+    queue.close()
+    bus.publish("growatt", 2.0, {})
+    assert queue.pending == 1
+    assert len(bus.subscriptions) == 1
+
+
+def test_subscriber_thread_consumes_until_stopped():
+    bus = SampleBus()
+    consumed = []
+    release = threading.Event()
+
+    def slow(sample):
+        release.wait(5)
+        consumed.append(sample.fields["i"])
+
+    thread = SubscriberThread(bus.subscribe("slow"), slow)
+    thread.start()
+    for i in range(3):
+        bus.publish("growatt", time.time(), {"i": i})
+
+    thread.stop()
+    threading.Timer(0.1, release.set).start()
+    assert thread.join(5)
+    # published before the stop: consumed before join returns
+    assert consumed == [0, 1, 2]
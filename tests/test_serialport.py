@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+from power_plant_monitoring.base import CircuitOpen, ExchangeNotAvailable
+from power_plant_monitoring.devices.serialport import (
+    SerialPort,
+    parse_uevent,
+    stable_path,
+)
+from power_plant_monitoring.resilience import CircuitBreaker, State
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+
+class _Client:
+    """Opens ``port`` if the file exists, like a pymodbus serial client"""
+
+    def __init__(self):
+        self.port = None
+        self.socket = None
+
+    def connect(self):
+        if self.socket is None and os.path.exists(self.port):
+            self.socket = os.path.realpath(self.port)
+        return self.socket is not None
+
+    def close(self):
+        self.socket = None
+
+
+class _Device:
+    def read(self):
+        return {"Pac": 1000.0}
+
+
+def _plug(dev, by_id, name):
+    open(dev / name, "w").close()
+    (by_id / "usb-FTDI_FT232R_A10K1234-if00-port0").symlink_to(dev / name)
+
+
+def _unplug(dev, by_id, name):
+    os.remove(dev / name)
+    os.remove(by_id / "usb-FTDI_FT232R_A10K1234-if00-port0")
+
+
+def test_port_follows_the_adapter_through_reenumeration(tmp_path):
+    dev, by_id = tmp_path / "dev", tmp_path / "by-id"
+    dev.mkdir()
+    by_id.mkdir()
+    _plug(dev, by_id, "ttyUSB0")
+    link = str(by_id / "usb-FTDI_FT232R_A10K1234-if00-port0")
+    assert stable_path(str(dev / "ttyUSB0"), str(by_id)) == link
+    assert stable_path(str(dev / "ttyACM0"), str(by_id)) == str(dev / "ttyACM0")
+
+    now = [0.0]
+    bus = CircuitBreaker(
+        "bus", trips_on=(ExchangeNotAvailable,), reset_timeout=300, clock=lambda: now[0]
+    )
+    client = _Client()
+    port = SerialPort(client, str(dev / "ttyUSB0"), bus, by_id=str(by_id))
+    assert client.port == link
+    assert bus.call(port.read, _Device()) == {"Pac": 1000.0}
+
+    # the adapter resets: the open port refers to a device that is gone
+    _unplug(dev, by_id, "ttyUSB0")
+    for _ in range(3):
+        with pytest.raises(ExchangeNotAvailable):
+            bus.call(port.read, _Device())
+    assert port.lost and bus.state is State.OPEN
+    with pytest.raises(CircuitOpen):
+        bus.call(port.read, _Device())
+
+    # it comes back as another tty, the hotplug event cuts the back-off short
+    _plug(dev, by_id, "ttyUSB1")
+    port.hotplug({"ACTION": "add", "DEVNAME": "ttyUSB1", "SUBSYSTEM": "tty"})
+    now[0] = 1.0
+    assert bus.call(port.read, _Device()) == {"Pac": 1000.0}
+    assert client.socket == str(dev / "ttyUSB1")
+    assert not port.lost and bus.state is State.CLOSED
+
+
+def test_parse_uevent():
+    event = parse_uevent(
+        b"add@/devices/pci0000:00/usb1/1-1/1-1:1.0/ttyUSB0/tty/ttyUSB0\0"
+        b"ACTION=add\0DEVPATH=/devices/pci0000:00/usb1/1-1/1-1:1.0/ttyUSB0/tty/"
+        b"ttyUSB0\0SUBSYSTEM=tty\0MAJOR=188\0MINOR=0\0DEVNAME=ttyUSB0\0SEQNUM=4711"
+    )
+    assert event["ACTION"] == "add"
+    assert event["SUBSYSTEM"] == "tty"
+    assert event["DEVNAME"] == "ttyUSB0"
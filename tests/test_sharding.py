@@ -0,0 +1,129 @@
+import datetime
+import time
+
+import pytest
+
+from power_plant_monitoring.sharding import ShardedAcquisition, SharedSampleRing
+from power_plant_monitoring.simulator import (
+    DailyCurve,
+    SimulatedBus,
+    SimulatedInverter,
+    TcpSimulator,
+)
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+
+def test_ring_views_and_overrun():
+    owner = SharedSampleRing.create(4, fields=("Pac", "Temp"))
+    writer = SharedSampleRing.attach(owner.name, 4, fields=("Pac", "Temp"))
+    try:
+        writer.append(1.0, 1, {"Pac": 100.0})
+        writer.append(2.0, 2, None)
+
+        records, first, cursor = owner.read(0)
+        assert (first, cursor) == (0, 2)
+        assert owner.sample(records[0]) == {"Pac": 100.0}
+        assert records[1][1:3].tolist() == [2.0, 0.0]
+        # a view, not a copy
+        assert records.base is not None
+        assert owner.is_valid(first)
+
+        for i in range(3, 9):
+            writer.append(float(i), 1, {"Pac": float(i), "Temp": 20.0})
+        assert not owner.is_valid(first)
+
+        # the oldest slot may be in the middle of a write, it is skipped
+        records, first, cursor = owner.read(cursor)
+        assert first == 8 - 4 + 1
+        assert [r[0] for r in records] == [6.0, 7.0, 8.0]
+        assert len(owner.read(cursor)[0]) == 0
+    finally:
+        writer.close()
+        owner.close()
+
+
+def test_sharded_acquisition_against_simulator():
+    pytest.importorskip("pymodbus")
+    noon = datetime.datetime(2024, 6, 21, 13).timestamp()
+    devices = {
+        unit: SimulatedInverter(unit, DailyCurve(seed=unit), clock=lambda: noon)
+        for unit in (1, 2)
+    }
+    simulator = TcpSimulator(SimulatedBus(devices), port=0)
+    simulator.start()
+
+    sharded = ShardedAcquisition(
+        [
+            {
+                "port": f"tcp://127.0.0.1:{simulator.port}",
+                "units": [1, 2, 3],
+                "interval": 0.05,
+                "offline_interval": 0.05,
+            }
+        ],
+        capacity=64,
+    )
+    sharded.start()
+    try:
+        samples = []
+        deadline = time.monotonic() + 20
+        while len(samples) < 9 and time.monotonic() < deadline:
+            samples.extend(sharded.poll())
+
+        assert len(samples) >= 9
+        by_unit = {unit: info for _, _, unit, info in samples}
+        assert by_unit[1]["Status"] == "Normal"
+        assert by_unit[1]["Pac"] > 1000
+        assert by_unit[2]["StatusCode"] == 1
+        assert by_unit[3] is None  # not simulated, no response
+    finally:
+        sharded.stop()
+        simulator.stop()
+
+    assert sharded.alive == []
+
+
+def test_restart_keeps_the_healthy_processes():
+    pytest.importorskip("pymodbus")
+    noon = datetime.datetime(2024, 6, 21, 13).timestamp()
+    device = SimulatedInverter(1, DailyCurve(seed=1), clock=lambda: noon)
+    simulator = TcpSimulator(SimulatedBus({1: device}), port=0)
+    simulator.start()
+
+    # the second process dies at once, its gateway address is invalid
+    sharded = ShardedAcquisition(
+        [
+            {"port": f"tcp://127.0.0.1:{simulator.port}", "interval": 0.05},
+            {"port": "tcp://127.0.0.1:invalid"},
+        ],
+        capacity=64,
+    )
+    sharded.start()
+
+    def samples(timeout=20):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            polled = sharded.poll()
+            if polled:
+                return polled
+        return []
+
+    try:
+        assert samples()
+        healthy = sharded._processes[0]
+        deadline = time.monotonic() + 20
+        while sharded.alive[1] and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert sharded.alive == [True, False]
+
+        assert sharded.restart() == ["tcp://127.0.0.1:invalid"]
+        assert sharded._processes[0] is healthy
+        # the healthy port was read on
+        assert samples()
+        assert sharded.alive[0]
+    finally:
+        sharded.stop()
+        simulator.stop()
@@ -0,0 +1,125 @@
+import datetime
+import json
+import os
+import socketserver
+
+import pytest
+
+from power_plant_monitoring.growatt import Growatt
+from power_plant_monitoring.registers import encode
+from power_plant_monitoring.simulator import (
+    DailyCurve,
+    Faults,
+    RtuSimulator,
+    SimulatedBus,
+    SimulatedInverter,
+    TcpSimulator,
+    TraceReplay,
+    crc16,
+    parse_units,
+)
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+NOON = datetime.datetime(2024, 6, 21, 13, 0).timestamp()
+
+
+def _bus(units=(1,), **kwargs):
+    devices = {
+        unit: SimulatedInverter(unit, DailyCurve(seed=unit), clock=lambda: NOON)
+        for unit in units
+    }
+    return SimulatedBus(devices, **kwargs)
+
+
+def test_crc16():
+    assert crc16(bytes.fromhex("01030000000a")) == 0xCDC5
+
+
+def test_parse_units():
+    assert parse_units("1-3,10") == [1, 2, 3, 10]
+    with pytest.raises(ValueError):
+        parse_units("0-2")
+
+
+def test_bus_errors():
+    bus = _bus()
+    assert bus.handle(1, bytes.fromhex("0400000021"))[:2] == bytes((4, 66))
+    assert bus.handle(1, bytes.fromhex("0400700021")) == bytes((0x84, 2))
+    assert bus.handle(1, bytes.fromhex("0600000001")) == bytes((0x86, 1))
+    assert bus.handle(2, bytes.fromhex("0400000021")) is None
+
+    assert _bus(faults=Faults(drop_rate=1)).handle(1, b"\x04\x00\x00\x00\x21") is None
+    failing = _bus(faults=Faults(exception_rate=1))
+    assert failing.handle(1, bytes.fromhex("0400000021")) == bytes((0x84, 4))
+
+
+def test_trace_replay(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    samples = [
+        {"timestamp": 1000 + i * 10, "StatusCode": 1, "Pac": 100.0 * i}
+        for i in range(3)
+    ]
+    path.write_text("\n".join(json.dumps(sample) for sample in samples))
+
+    trace = TraceReplay(str(path))
+    assert len(trace) == 3
+    assert trace.sample(1015)["Pac"] == 100.0
+    assert trace.sample(1030)["Pac"] == 0.0  # starts again
+
+    registers = encode(trace.sample(1025))
+    assert registers[11:13] == [0, 2000]
+
+
+@pytest.fixture
+def tcp_simulator():
+    simulator = TcpSimulator(_bus(units=range(1, 25)), port=0)
+    simulator.start()
+    yield simulator
+    simulator.stop()
+
+
+def test_tcp_growatt_read(tcp_simulator):
+    from pymodbus.client.sync import ModbusTcpClient
+
+    client = ModbusTcpClient("127.0.0.1", tcp_simulator.port, timeout=1)
+    client.connect()
+    try:
+        for unit in (1, 24):
+            growatt = Growatt(client, "Growatt", unit)
+            info = growatt.read()
+            assert info["Status"] == "Normal"
+            assert 1000 < info["Pac"] < 4000
+            assert info["Pac"] == pytest.approx(info["Ppv"] * 0.97, abs=0.2)
+            assert info["EnergyTotal"] >= 10000
+
+            growatt.read_info()
+            assert growatt.modbusVersion == 304
+
+        assert client.read_input_registers(0, 1, unit=30).isError()
+    finally:
+        client.close()
+    # the other servers of the process keep the defaults
+    assert not socketserver.ThreadingTCPServer.allow_reuse_address
+
+
+@pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a pseudo-terminal")
+def test_rtu_growatt_read():
+    pytest.importorskip("serial")
+    from pymodbus.client.sync import ModbusSerialClient
+
+    simulator = RtuSimulator(_bus(units=(1, 2), baudrate=115200))
+    simulator.start()
+    client = ModbusSerialClient(
+        method="rtu", port=simulator.path, baudrate=115200, timeout=1
+    )
+    client.connect()
+    try:
+        info = Growatt(client, "Growatt", 2).read()
+        assert info["StatusCode"] == 1
+        assert info["Fac"] == pytest.approx(50.0, abs=0.05)
+    finally:
+        client.close()
+        simulator.stop()
@@ -0,0 +1,70 @@
+import datetime
+import math
+
+import pytest
+
+from power_plant_monitoring import solar
+from power_plant_monitoring.solar import (
+    AcquisitionCalendar,
+    solar_elevation,
+    sun_times,
+)
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+LATITUDE, LONGITUDE = 53.639656, 9.594956
+
+
+def _utc(*args):
+    return datetime.datetime(*args, tzinfo=datetime.timezone.utc).timestamp()
+
+
+def test_sun_times():
+    # published: sunrise 02:51, sunset 19:55 UTC
+    sunrise, sunset = sun_times(datetime.date(2024, 6, 21), LATITUDE, LONGITUDE)
+    assert sunrise == pytest.approx(_utc(2024, 6, 21, 2, 51, 30), abs=60)
+    assert sunset == pytest.approx(_utc(2024, 6, 21, 19, 55, 30), abs=60)
+    elevation = solar_elevation(sunrise, LATITUDE, LONGITUDE)
+    assert elevation == pytest.approx(-0.833, abs=0.01)
+    assert solar_elevation(_utc(2024, 6, 21, 11, 30), LATITUDE, LONGITUDE) > 59
+
+    # Svalbard: midnight sun and polar night
+    assert sun_times(datetime.date(2024, 6, 21), 78.2, 15.6) == (-math.inf, math.inf)
+    assert sun_times(datetime.date(2024, 12, 21), 78.2, 15.6) == (None, None)
+
+
+def test_calendar_windows_and_delays(monkeypatch):
+    calls = []
+
+    def counting_sun_times(*args):
+        calls.append(args[0])
+        return sun_times(*args)
+
+    monkeypatch.setattr(solar, "sun_times", counting_sun_times)
+    calendar = AcquisitionCalendar(LATITUDE, LONGITUDE, lead=1800, lag=900)
+    start, end = calendar.window(_utc(2024, 6, 21, 12))
+
+    for second in range(0, 86400, 10):
+        calendar.is_active(_utc(2024, 6, 21) + second)
+    # computed once per solar day, not per tick
+    assert len(set(calls)) == len(calls) <= 3
+
+    assert not calendar.is_active(start - 1)
+    assert calendar.is_active(start)
+    assert calendar.is_active(end - 1)
+    assert not calendar.is_active(end)
+
+    assert calendar.delay(start + 60, 1, 600) == 1
+    # the night probe does not overshoot the start of the window
+    assert calendar.delay(start - 100, 1, 600) == pytest.approx(100)
+    assert calendar.delay(start - 3600, 1, 600) == 600
+    # after sunset the next window is tomorrow's
+    tomorrow = calendar.window(end + 86400)[0]
+    assert calendar.delay(tomorrow - 30, 1, 600) == pytest.approx(30)
+    assert calendar.delay(end + 10, 1, 600) == 600
+
+    polar = AcquisitionCalendar(78.2, 15.6)
+    assert polar.is_active(_utc(2024, 6, 21, 0, 30))
+    assert polar.delay(_utc(2024, 12, 21, 12), 1, 600) == 600
@@ -0,0 +1,119 @@
+import datetime
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("pymodbus")
+
+from pymodbus.exceptions import ConnectionException  # noqa: E402
+
+from power_plant_monitoring.devices.tcp import ModbusTcpGateway  # noqa: E402
+from power_plant_monitoring.growatt import Growatt  # noqa: E402
+from power_plant_monitoring.resilience import CircuitBreaker  # noqa: E402
+from power_plant_monitoring.sharding import poll_units  # noqa: E402
+from power_plant_monitoring.simulator import (  # noqa: E402
+    DailyCurve,
+    SimulatedBus,
+    SimulatedInverter,
+    TcpSimulator,
+)
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+NOON = datetime.datetime(2024, 6, 21, 13).timestamp()
+
+
+def _bus(units, latency=0.0):
+    return SimulatedBus(
+        {
+            unit: SimulatedInverter(unit, DailyCurve(seed=unit), clock=lambda: NOON)
+            for unit in units
+        },
+        latency=latency,
+    )
+
+
+def test_pipelined_units_overlap_their_round_trips():
+    units = range(1, 9)
+    simulator = TcpSimulator(_bus(units, latency=0.05), port=0, pipelined=True)
+    simulator.start()
+    gateway = ModbusTcpGateway("127.0.0.1", simulator.port, max_in_flight=8)
+    devices = [
+        (Growatt(gateway, f"Growatt-{unit}", unit), CircuitBreaker(f"unit {unit}"))
+        for unit in units
+    ]
+    try:
+        assert gateway.connect()
+        with ThreadPoolExecutor(gateway.concurrency) as executor:
+            start = time.perf_counter()
+            polled = poll_units(devices, executor)
+            elapsed = time.perf_counter() - start
+
+        # four blocks of 50 ms per unit: 1.6 s one unit after the other
+        assert elapsed < 0.6
+        assert [device.unit for device, _, _ in polled] == list(units)
+        assert all(info["Status"] == "Normal" for _, _, info in polled)
+        assert gateway.stats()["connections"][0]["opened"] == 1
+
+        # exception responses of the gateway are errors, not lost transactions
+        assert gateway.read_input_registers(0, 33, unit=20).exception_code == 0x0B
+    finally:
+        gateway.close()
+        simulator.stop()
+
+
+def test_gateway_reconnects():
+    simulator = TcpSimulator(_bus([1]), port=0)
+    simulator.start()
+    port = simulator.port
+    gateway = ModbusTcpGateway("127.0.0.1", port, timeout=0.5)
+    try:
+        assert len(gateway.read_input_registers(0, 33, unit=1).registers) == 33
+
+        # the gateway closes the connection, the next read opens a new one
+        simulator.stop()
+        deadline = time.monotonic() + 5
+        while gateway.stats()["connections"][0]["connected"]:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        simulator = TcpSimulator(_bus([1]), port=port)
+        simulator.start()
+
+        assert not gateway.read_input_registers(0, 33, unit=1).isError()
+        assert gateway.stats()["connections"][0]["opened"] == 2
+    finally:
+        gateway.close()
+        simulator.stop()
+
+
+def test_malformed_header_drops_the_connection():
+    server = socket.create_server(("127.0.0.1", 0))
+    accepted = []
+
+    def answer():
+        conn, _ = server.accept()
+        accepted.append(conn)
+        conn.recv(260)
+        # length 0 would make the reader wait for the end of the stream
+        conn.sendall(struct.pack(">HHHB", 1, 0, 0, 1))
+
+    threading.Thread(target=answer, daemon=True).start()
+    gateway = ModbusTcpGateway("127.0.0.1", server.getsockname()[1], timeout=5.0)
+    try:
+        start = time.monotonic()
+        # the connection is lost at once instead of the read timing out
+        with pytest.raises(ConnectionException):
+            gateway.read_input_registers(0, 33, unit=1)
+        assert time.monotonic() - start < 2.0
+        assert not gateway.stats()["connections"][0]["connected"]
+    finally:
+        gateway.close()
+        for conn in accepted:
+            conn.close()
+        server.close()
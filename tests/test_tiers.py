@@ -0,0 +1,135 @@
+import itertools
+import re
+
+import pytest
+
+from power_plant_monitoring.base import ConfigError
+from power_plant_monitoring.tiers import (
+    downsampling_flux,
+    parse_tiers,
+    provision,
+    routes,
+    verify,
+)
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+TIERS = [
+    {"bucket": "raw", "retention_days": 30},
+    {"bucket": "1m", "every": "1m", "retention_days": 365},
+    {"bucket": "1h", "every": "1h", "measurements": ["events"]},
+]
+
+
+class _Bucket:
+    def __init__(self, name, retention_rules):
+        self.id = f"bucket-{name}"
+        self.name = name
+        self.retention_rules = retention_rules
+        self.description = None
+
+
+class _Task:
+    def __init__(self, id, flux, status):
+        self.id = id
+        self.name = re.search(r'name: "([^"]+)"', flux).group(1)
+        self.flux = flux
+        self.status = status
+
+
+class _InfluxDB:
+    """Stand-in of the bucket and task APIs of an InfluxDBClient"""
+
+    def __init__(self):
+        self.buckets = {}
+        self.tasks = {}
+        self._ids = itertools.count()
+
+    def buckets_api(self):
+        return self
+
+    def tasks_api(self):
+        return self
+
+    def find_bucket_by_name(self, name):
+        return self.buckets.get(name)
+
+    def create_bucket(self, bucket_name, retention_rules, description, org):
+        self.buckets[bucket_name] = _Bucket(bucket_name, retention_rules)
+
+    def update_bucket(self, bucket):
+        self.buckets[bucket.name] = bucket
+
+    def find_tasks(self, name=None):
+        return [t for t in self.tasks.values() if name in (None, t.name)]
+
+    def create_task(self, task_create_request):
+        task = _Task(
+            next(self._ids), task_create_request.flux, task_create_request.status
+        )
+        self.tasks[task.id] = task
+
+    def update_task_request(self, task_id, request):
+        self.tasks[task_id].flux = request.flux
+        self.tasks[task_id].status = request.status
+
+
+def test_parse_tiers():
+    tiers = parse_tiers(TIERS)
+    assert [(t.bucket, t.source) for t in tiers] == [
+        ("raw", None),
+        ("1m", "raw"),
+        ("1h", "1m"),
+    ]
+    assert tiers[0].retention_seconds == 30 * 86400
+    assert tiers[2].retention_seconds == 0
+    assert routes(tiers) == {"events": "1h"}
+
+    flux = downsampling_flux(tiers[2], "home")
+    assert 'from(bucket: "1m")' in flux
+    assert "every: 1h" in flux and 'to(bucket: "1h", org: "home")' in flux
+
+    for broken in (
+        [],
+        [{"bucket": "raw", "every": "1m"}],
+        [{"bucket": "raw"}, {"bucket": "1m"}],
+        [{"bucket": "raw"}, {"bucket": "1m", "every": "1 minute"}],
+        [{"bucket": "raw"}, {"bucket": "raw", "every": "1m"}],
+        [{"retention_days": 30}],
+    ):
+        with pytest.raises(ConfigError):
+            parse_tiers(broken)
+
+
+def test_provision_and_verify():
+    pytest.importorskip("influxdb_client")
+    influxdb = _InfluxDB()
+    tiers = parse_tiers(TIERS)
+
+    assert verify(influxdb, "home", tiers) == [
+        "bucket raw: missing",
+        "bucket 1m: missing",
+        "task downsample 1m: missing",
+        "bucket 1h: missing",
+        "task downsample 1h: missing",
+    ]
+    provision(influxdb, "home", tiers)
+    assert verify(influxdb, "home", tiers) == []
+    assert influxdb.buckets["1h"].retention_rules == []
+
+    # drift: retention changed by hand, an old script, a removed tier
+    influxdb.buckets["raw"].retention_rules[0].every_seconds = 7 * 86400
+    (task,) = influxdb.find_tasks("downsample 1m")
+    task.flux = task.flux.replace("mean", "max")
+    influxdb.tasks["old"] = _Task("old", 'option task = {name: "downsample 5m"}', "")
+    assert verify(influxdb, "home", tiers) == [
+        f"bucket raw: retention {7 * 86400} s, configured {30 * 86400} s",
+        "task downsample 1m: script differs",
+        "task downsample 5m: not configured",
+    ]
+
+    # corrected, but nothing is deleted
+    provision(influxdb, "home", tiers)
+    assert verify(influxdb, "home", tiers) == ["task downsample 5m: not configured"]
@@ -0,0 +1,107 @@
+from power_plant_monitoring.devices.register_map import MapField, load_register_map
+from power_plant_monitoring.growatt import Growatt
+from power_plant_monitoring.registers import encode
+from power_plant_monitoring.samplebus import Policy, SampleBus
+from power_plant_monitoring.validation import SampleValidator, ValidationStage
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+FIELDS = (
+    MapField("Pac", 11, "u32", 10, min=0, max=10000, max_rate=1000),
+    MapField("EnergyTotal", 28, "u32", 10, counter=True),
+    MapField("Temp", 32, scale=10, min=-40, max=120),
+    MapField("Vpv1", 3, scale=10),
+)
+
+
+def _reasons(violations):
+    return [(v.field, v.reason) for v in violations]
+
+
+def test_range_spike_and_counter():
+    validator = SampleValidator(FIELDS, overrides={"Temp": {"max": 80}})
+    sample = {"Pac": 500.0, "EnergyTotal": 100.0, "Temp": 30.0, "Vpv1": 9999.0}
+    assert validator.check(0, sample) == []
+    assert validator.checked_fields == ("Pac", "EnergyTotal", "Temp")
+
+    bad = {"Pac": 9000.0, "EnergyTotal": 99.9, "Temp": 95.0}
+    assert _reasons(validator.check(1, bad)) == [
+        ("Pac", "spike"),
+        ("EnergyTotal", "counter"),
+        ("Temp", "range"),
+    ]
+    # the reference stays the last accepted value
+    assert validator.check(2, {"Pac": 1400.0, "EnergyTotal": 100.1}) == []
+
+    # a change that persists is accepted as the new level
+    levels = [validator.check(3 + i, {"Pac": 9000.0}) for i in range(3)]
+    assert [len(v) for v in levels] == [1, 1, 0]
+    assert validator.check(6, {"Pac": 9100.0}) == []
+
+    # after a gap the rate is not checked
+    assert validator.check(1000, {"Pac": 100.0}) == []
+
+
+def test_stage_quarantines_fields_and_garbage():
+    bus = SampleBus()
+    stage = ValidationStage(bus)
+    stage.add("growatt", FIELDS)
+    bus.subscribe("validation", "raw/*", policy=Policy.INLINE, callback=stage)
+    valid = bus.subscribe("valid", "valid/*")
+    quarantine = bus.subscribe("quarantine", "quarantine/*")
+
+    tags = {"unit": "1"}
+    for timestamp, pac, energy, temp in (
+        (0, 500.0, 10.0, 30.0),
+        (1, 9500.0, 10.0, 30.0),
+        (2, 65535.0, 0.0, 999.0),
+    ):
+        fields = {"Pac": pac, "EnergyTotal": energy, "Temp": temp}
+        bus.publish("raw/growatt", timestamp, fields, tags)
+    bus.publish("raw/other", 3, {"Pac": -1.0})
+
+    samples = valid.drain()
+    assert [dict(s.fields) for s in samples] == [
+        {"Pac": 500.0, "EnergyTotal": 10.0, "Temp": 30.0},
+        {"EnergyTotal": 10.0, "Temp": 30.0},
+        {"Pac": -1.0},
+    ]
+    assert samples[1].tags == tags
+
+    rejected = [dict(s.fields) for s in quarantine.drain()]
+    assert rejected[0] == {"Pac": 9500.0, "reasons": "Pac:spike"}
+    # most fields rejected: the whole frame is garbage
+    assert rejected[1]["Temp"] == 999.0
+    assert rejected[1]["reasons"] == "Pac:range,EnergyTotal:counter,Temp:range"
+
+
+class _Row:
+    def __init__(self, registers):
+        self.registers = registers
+
+    def isError(self):
+        return False
+
+
+class _Client:
+    def __init__(self, registers):
+        self.registers = registers
+
+    def read_input_registers(self, address, count, unit=1):
+        return _Row(self.registers[address : address + count])
+
+
+def test_unknown_codes_do_not_break_the_read():
+    client = _Client(encode({"StatusCode": 2, "FaultCode": 77, "Pac": 100.0}))
+    info = Growatt(client, "Growatt", 1).read()
+
+    assert info["Status"] == "Unknown (2)"
+    assert info["Fault"] == "Unknown (77)"
+    assert info["Pac"] == 100.0
+
+    validator = SampleValidator(load_register_map("growatt").fields)
+    assert validator.check(0, info) == []
+    assert validator.check(1, dict(info, Fac=655.35))[0].reason == "range"
+    assert validator.check(2, dict(info, Pac=24000.0))[0].reason == "spike"
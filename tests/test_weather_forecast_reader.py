@@ -0,0 +1,67 @@
+import json
+import os
+
+import pytest
+
+confuse = pytest.importorskip("confuse")
+
+from power_plant_monitoring.weather_forecast.weather_forecast_reader import (  # noqa
+    JsonReader,
+)
+
+__author__ = "dennis-off"
+__copyright__ = "dennis-off"
+__license__ = "MIT"
+
+
+def _write(path, records):
+    with open(path, "w") as f:
+        json.dump(records, f)
+
+
+def _create_reader(path):
+    config = confuse.Configuration("power_plant_monitoring_test", read=False)
+    config.set({"filename": str(path)})
+    return JsonReader(config)
+
+
+def test_json_reader_range_query(tmp_path):
+    path = tmp_path / "forecast.json"
+    _write(
+        path,
+        [
+            {"releaseDate": 300, "id": 3, "title": "c"},
+            {"releaseDate": 100, "id": 1, "title": "a"},
+            {"releaseDate": 200, "id": 2, "title": "b"},
+        ],
+    )
+    reader = _create_reader(path)
+
+    assert [r.id for r in reader._get_announcements_internal(2)] == [3, 1]
+    assert [r.id for r in reader.get_range(100, 300)] == [1, 2]
+    assert [r.id for r in reader.get_range(150, 1000)] == [2, 3]
+    assert reader.get_range(400, 500) == []
+
+
+def test_json_reader_reparses_only_on_change(tmp_path):
+    path = tmp_path / "forecast.json"
+    _write(path, [{"releaseDate": 100, "id": 1, "title": "a"}])
+    reader = _create_reader(path)
+
+    first = reader._get_announcements_internal(10)
+    records = reader._records
+    reader._get_announcements_internal(10)
+    assert reader._records is records
+
+    _write(
+        path,
+        [
+            {"releaseDate": 100, "id": 1, "title": "a"},
+            {"releaseDate": 200, "id": 2, "title": "b"},
+        ],
+    )
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert len(first) == 1
+    assert len(reader._get_announcements_internal(10)) == 2